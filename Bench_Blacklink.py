@@ -0,0 +1,1095 @@
+import re
+import os
+import time
+import random
+import argparse
+import io
+import sys
+import tempfile
+import contextlib
+import json
+import shutil
+import subprocess
+import platform
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import Scan_Blacklink as sb
+
+
+# ===================== 旧版实现（仅作为基准与一致性对照） =====================
+
+def build_legacy_domain_regex(tlds):
+    """旧版的疑似域名正则：所有 TLD 拼成一个大分支"""
+    return re.compile(
+        r'\b((?:[a-z0-9-]+\.)+(?:' + '|'.join(tlds) + r'))\b',
+        re.IGNORECASE
+    )
+
+
+LEGACY_DOMAIN_REGEX = build_legacy_domain_regex(sb._BUILTIN_TLDS)
+
+
+def legacy_extract_links(source_code, base_domain=None, black_patterns=None):
+    """
+    融合扫描引擎之前的 extract_links：逐个模式 re.findall，共约 21 次全文扫描
+    """
+    all_links = set()
+    domain_tokens = set()
+    suspicious_set = set()
+
+    if black_patterns:
+        black_patterns = [p.lower() for p in black_patterns]
+
+    def check_suspicious(candidate):
+        if not candidate or not black_patterns:
+            return
+        c = candidate.lower()
+        for p in black_patterns:
+            if p in c:
+                suspicious_set.add(candidate.strip())
+                break
+
+    for pattern in sb.URL_PATTERNS:
+        matches = re.findall(pattern, source_code, re.IGNORECASE)
+        for match in matches:
+            if isinstance(match, tuple) and len(match) > 0:
+                match = match[0]
+            if match:
+                all_links.add(match.strip())
+
+    for m in LEGACY_DOMAIN_REGEX.findall(source_code):
+        if m:
+            domain_tokens.add(m.strip().lower())
+
+    results = {
+        'external_links': [],
+        'possible_hidden_links': [],
+        'internal_links': [],
+        'other_links': [],
+        'domain_tokens': [],
+        'suspicious_links': []
+    }
+
+    hidden_links = set()
+    for pattern in sb.HIDDEN_LINK_PATTERNS:
+        matches = re.findall(pattern, source_code, re.IGNORECASE)
+        for match in matches:
+            if isinstance(match, tuple) and len(match) > 0:
+                match = match[0]
+            if match:
+                hidden_links.add(match.strip())
+
+    base_host = None
+    if base_domain:
+        try:
+            parsed_base = sb.urlparse(base_domain)
+            base_host = parsed_base.netloc.lower()
+        except Exception:
+            base_host = None
+
+    for link in all_links:
+        is_hidden = link in hidden_links
+
+        full_link = link
+        if link.startswith('//'):
+            full_link = 'https:' + link
+        elif link.startswith('/') and base_domain:
+            full_link = base_domain.rstrip('/') + link
+
+        check_suspicious(full_link or link)
+
+        is_external = False
+        if base_host and full_link.startswith(('http://', 'https://')):
+            try:
+                parsed_link = sb.urlparse(full_link)
+                if parsed_link.netloc:
+                    is_external = parsed_link.netloc.lower() != base_host
+            except Exception:
+                pass
+
+        if is_hidden:
+            results['possible_hidden_links'].append(link)
+        elif is_external:
+            results['external_links'].append(link)
+        elif link.startswith(('http://', 'https://', '//')):
+            results['internal_links'].append(link)
+        else:
+            results['other_links'].append(link)
+
+    for domain in domain_tokens:
+        results['domain_tokens'].append(domain)
+        check_suspicious(domain)
+
+    results['external_links'] = sorted(set(results['external_links']))
+    results['possible_hidden_links'] = sorted(set(results['possible_hidden_links']))
+    results['internal_links'] = sorted(set(results['internal_links']))
+    results['other_links'] = sorted(set(results['other_links']))
+    results['domain_tokens'] = sorted(set(results['domain_tokens']))
+    results['suspicious_links'] = sorted(suspicious_set)
+
+    return results
+
+
+# ===================== 测试语料 =====================
+
+SAMPLE_SNIPPETS = [
+    '<a href="https://www.example.com/index.html">首页</a>\n',
+    '<div style="display:none"><a href="http://bet365-casino.xyz/">博彩</a></div>\n',
+    "<img src='/static/img/logo.png' width=0 height=0>\n",
+    '<link rel="stylesheet" href="//cdn.jsdelivr.net/npm/bootstrap.min.css">\n',
+    '<script src=https://cdnjs.cloudflare.com/ajax/libs/jquery/3.6.0/jquery.min.js></script>\n',
+    'window.location = "https://evil-redirect.top/landing";\n',
+    "window.open('http://ads.tracker.cn/pop?id=1');\n",
+    '$.ajax({type: "POST", url: "/api/v1/report"});\n',
+    "fetch('https://api.example.com/data.json').then(r => r.json());\n",
+    'background: url("/images/bg.jpg") no-repeat; width:0;height:0\n',
+    '<form action="/login.php" method="post"></form>\n',
+    '<span data-src="https://lazy.example.org/a.webp"></span>\n',
+    'var host = "stats.hm.baidu.com", cfg = {"api": "pay.alipay.com"};\n',
+    '<p style="visibility:hidden;opacity:0"><a href="http://sp.vip8.cc">链接</a></p>\n',
+    'function a(b){return b.split("/").map(function(c){return c.trim()})}\n',
+    '/* minified */var e=function(t){return t&&t.__esModule?t:{default:t}};\n',
+    'location: "http://mirror.download.net/file.zip"\n',
+]
+
+
+def build_sample_text(size, seed=0):
+    """按给定种子拼接示例片段，生成约 size 字节的测试文本"""
+    rnd = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        s = rnd.choice(SAMPLE_SNIPPETS)
+        parts.append(s)
+        total += len(s)
+    return ''.join(parts)
+
+
+def build_minified_js(size, seed=0):
+    """生成约 size 字节、没有换行的压缩 JS 文本：大量 a.b.c 形式的属性访问，夹杂少量域名字符串"""
+    rnd = random.Random(seed)
+    idents = ['e', 't', 'n', 'r', 'i', 'o', 'a', 'u', 'prototype', 'exports', 'default',
+              'length', 'call', 'apply', 'push', 'document', 'window', 'style', 'map']
+    hosts = ['cdn.jsdelivr.net', 'api.example.com', 'bet365-casino.xyz', 'hm.baidu.com',
+             'static.cloudflareinsights.com', 'sp.vip8.cc']
+    parts = []
+    total = 0
+    while total < size:
+        if rnd.random() < 0.02:
+            s = '"https://' + rnd.choice(hosts) + '/' + rnd.choice(idents) + '.js",'
+        else:
+            s = '.'.join(rnd.choice(idents) for _ in range(rnd.randint(1, 4)))
+            s += rnd.choice(['(', ')', '=', ';', ',', '&&', '||', '?', ':', '{', '}'])
+        parts.append(s)
+        total += len(s)
+    return ''.join(parts)
+
+
+def load_directory_texts(directory, limit=None):
+    texts = []
+    for path in sb.collect_files(directory, recursive=True, scan_all=True):
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            texts.append(f.read())
+        if limit and len(texts) >= limit:
+            break
+    return texts
+
+
+# ===================== 基准 =====================
+
+def time_call(func, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for t in texts:
+            func(t)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_extract(texts, base_domain, black_patterns, repeat):
+    """对比旧版逐模式扫描与融合单遍扫描，并校验结果逐字节一致"""
+    # 旧版只有正则暗链检测，一致性校验与计时都使用 regex 检测方式
+    regex = sb.HIDDEN_DETECTOR_REGEX
+    for t in texts:
+        old = legacy_extract_links(t, base_domain, black_patterns)
+        new = sb.extract_links(t, base_domain, black_patterns, regex)
+        if old != new:
+            raise SystemExit("[!] 融合扫描结果与旧版实现不一致")
+
+    total_bytes = sum(len(t.encode('utf-8')) for t in texts)
+    legacy = time_call(lambda t: legacy_extract_links(t, base_domain, black_patterns), texts, repeat)
+    fused = time_call(lambda t: sb.extract_links(t, base_domain, black_patterns, regex), texts, repeat)
+
+    print(f"语料: {len(texts)} 个文本, 共 {total_bytes / 1024 / 1024:.2f} MB")
+    print(f"旧版 extract_links : {legacy:.3f}s  ({total_bytes / legacy / 1024 / 1024:.2f} MB/s)")
+    print(f"融合 extract_links : {fused:.3f}s  ({total_bytes / fused / 1024 / 1024:.2f} MB/s)")
+    print(f"加速比: {legacy / fused:.2f}x")
+
+    # 只对比链接/暗链模式阶段（不含域名提取与分类）
+    def legacy_link_stage(t):
+        for pattern in sb.URL_PATTERNS + sb.HIDDEN_LINK_PATTERNS:
+            re.findall(pattern, t, re.IGNORECASE)
+
+    legacy = time_call(legacy_link_stage, texts, repeat)
+    fused = time_call(lambda t: sb.scan_link_candidates(t), texts, repeat)
+    print(f"链接模式阶段: 旧版 {len(sb.URL_PATTERNS) + len(sb.HIDDEN_LINK_PATTERNS)} 次 findall {legacy:.3f}s"
+          f" / 融合扫描 {fused:.3f}s  加速比: {legacy / fused:.2f}x")
+
+
+def bench_domains(texts, repeat):
+    """对比旧版 TLD 大分支正则与候选 + TLD 哈希表查找的域名提取，并校验结果一致"""
+    for t in texts:
+        old = {m.strip().lower() for m in LEGACY_DOMAIN_REGEX.findall(t) if m}
+        if old != sb.scan_domain_tokens(t)[0]:
+            raise SystemExit("[!] 域名提取结果与旧版 DOMAIN_REGEX 不一致")
+
+    total_bytes = sum(len(t.encode('utf-8')) for t in texts)
+    legacy = time_call(LEGACY_DOMAIN_REGEX.findall, texts, repeat)
+    hashed = time_call(sb.scan_domain_tokens, texts, repeat)
+    print(f"域名提取（{total_bytes / 1024 / 1024:.2f} MB 压缩JS）: 旧版 DOMAIN_REGEX {legacy:.3f}s"
+          f" / TLD 哈希查找 {hashed:.3f}s  加速比: {legacy / hashed:.2f}x")
+
+
+# 暗链检测的对抗性输入：每项为 (说明, 重复单元)。
+# 前几项针对 HIDDEN_LINK_PATTERNS 的 [^>]* 回溯：关键字反复出现却没有 '>' 或 href，每个起点都要扫到文本末尾
+HIDDEN_ADVERSARIAL_INPUTS = [
+    ('重复 display:none、无 >', 'display:none;'),
+    ('重复 width:0、无 height', 'width:0;'),
+    ('重复 opacity:0、无 href', 'opacity:0 '),
+    ('深层嵌套的隐藏元素', '<div style="display:none"><span>'),
+    ('大量未闭合注释起始', '<!--<a '),
+    ('大量空属性的超长标签', '<a x '),
+]
+
+
+def regex_hidden_links(text):
+    """旧版暗链检测：逐个 HIDDEN_LINK_PATTERNS 做 re.findall"""
+    found = set()
+    for pattern in sb.HIDDEN_LINK_PATTERNS:
+        for match in re.findall(pattern, text, re.IGNORECASE):
+            if match:
+                found.add(match.strip())
+    return found
+
+
+def bench_hidden(sizes, repeat):
+    """
+    对比正则暗链检测与 HTML 词法分析检测器：
+    对抗性输入下前者随长度平方增长，后者保持线性；并给出示例语料上两者各自发现的暗链
+    """
+    for title, unit in HIDDEN_ADVERSARIAL_INPUTS:
+        cells = []
+        for size in sizes:
+            text = unit * (size // len(unit))
+            legacy = time_call(regex_hidden_links, [text], repeat)
+            html = time_call(sb.find_hidden_links, [text], repeat)
+            cells.append(f"{size // 1024}KB 正则 {legacy:.3f}s / HTML {html:.3f}s")
+        print(f"暗链检测 [{title}]: " + "; ".join(cells))
+
+    sample = ''.join(SAMPLE_SNIPPETS)
+    legacy = regex_hidden_links(sample)
+    html = sb.find_hidden_links(sample)
+    print(f"示例片段暗链: 正则 {sorted(legacy)} / HTML {sorted(html)}")
+    text = build_sample_text(max(sizes), 0)
+    legacy = time_call(regex_hidden_links, [text], repeat)
+    html = time_call(sb.find_hidden_links, [text], repeat)
+    print(f"普通语料 {max(sizes) // 1024}KB: 正则 {legacy:.3f}s / HTML {html:.3f}s")
+
+
+def build_blacklist(count, seed=0):
+    """生成 count 个随机的黑名单域名片段"""
+    rnd = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    suffixes = ['.xyz', '.top', '.cc', '.vip', '.com', '.cn']
+    return [''.join(rnd.choice(letters) for _ in range(rnd.randint(4, 10))) + rnd.choice(suffixes)
+            for _ in range(count)]
+
+
+def bench_blacklist(candidates, body, blacklist_sizes, repeat):
+    """对比逐个关键字子串查找与 BlackPatternMatcher 在不同黑名单规模下的开销"""
+    for size in blacklist_sizes:
+        patterns = list(sb.BLACKLINK_KEYWORDS) + build_blacklist(size)
+        lower = [p.lower() for p in patterns]
+        matcher = sb.BlackPatternMatcher(patterns)
+
+        def legacy_links(cands):
+            for c in cands:
+                c = c.lower()
+                for p in lower:
+                    if p in c:
+                        break
+
+        def matcher_links(cands):
+            for c in cands:
+                matcher.search(c)
+
+        def legacy_body(b):
+            b = b.lower()
+            return [p for p in lower if p and p in b]
+
+        if sorted(set(legacy_body(body))) != matcher.find_all(body):
+            raise SystemExit("[!] 黑名单匹配结果与逐个子串查找不一致")
+
+        legacy = time_call(legacy_links, [candidates], repeat)
+        fast = time_call(matcher_links, [candidates], repeat)
+        legacy_b = time_call(legacy_body, [body], repeat)
+        fast_b = time_call(matcher.find_all, [body], repeat)
+        print(f"黑名单 {len(patterns)} 条: {len(candidates)} 个链接 逐个查找 {legacy:.3f}s / 自动机 {fast:.3f}s;"
+              f" {len(body) // 1024}KB 响应体 逐个查找 {legacy_b:.3f}s / 自动机 {fast_b:.3f}s")
+
+
+def write_sample_corpus(directory, files, file_size, seed=0):
+    """在 directory 下写入 files 个合成源码文件（html/js 交替），用于引擎吞吐对比"""
+    for i in range(files):
+        if i % 2:
+            text = build_minified_js(file_size, seed + i)
+            name = f'static_{i}.min.js'
+        else:
+            text = build_sample_text(file_size, seed + i)
+            name = f'page_{i}.html'
+        sub = os.path.join(directory, f'dir{i % 10}')
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def bench_engines(directory, workers, black_patterns):
+    """同一语料上对比 thread / process 两种扫描引擎的吞吐"""
+    files = sb.collect_files(directory, recursive=True, scan_all=True)
+    total_bytes = sum(os.path.getsize(p) for p in files)
+    matcher = sb.BlackPatternMatcher(black_patterns)
+    for engine in ('thread', 'process'):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = sb.process_directory(
+                directory, recursive=True, scan_all=True, max_workers=workers,
+                black_patterns=matcher, progress_file=None, engine=engine
+            )
+        elapsed = time.perf_counter() - start
+        file_count = len(results)
+        results.close()
+        print(f"引擎 {engine:<7}: {file_count} 个文件 {total_bytes / 1024 / 1024:.2f} MB, "
+              f"{elapsed:.3f}s, {file_count / elapsed:.1f} 文件/s, "
+              f"{total_bytes / elapsed / 1024 / 1024:.2f} MB/s（{workers} 个 worker, CPU 核数 {os.cpu_count()}）")
+
+
+# ===================== 合成站点语料（带标注） =====================
+
+# 合成站点中各类文件的占比：(类型, 扩展名, 权重)；.min 类型去掉换行与缩进，binary 为随机二进制噪声
+WEBROOT_KINDS = [
+    ('html', '.html', 20),
+    ('html.min', '.html', 10),
+    ('php', '.php', 15),
+    ('js', '.js', 15),
+    ('js.min', '.min.js', 15),
+    ('css', '.css', 10),
+    ('css.min', '.min.css', 5),
+    ('binary', None, 10),
+]
+
+# 二进制噪声文件：(扩展名, 文件头)，文件头与 Scan_Blacklink.BINARY_MAGIC 中的类型对应，空文件头为高 NUL 占比的数据
+BINARY_NOISE = [
+    ('.png', b'\x89PNG\r\n\x1a\n'),
+    ('.gz', b'\x1f\x8b\x08'),
+    ('.woff2', b'wOF2'),
+    ('.dat', b''),
+]
+
+# 填充内容里使用的正常主机与词汇（不含任何黑名单关键字，填充内容不应产生可疑链接）
+BENIGN_HOSTS = ['www.example.com', 'cdn.example.net', 'static.example.org', 'img.example.com', 'api.example.com']
+FILLER_WORDS = ['新闻', '公司', '产品', '服务', '关于我们', '联系方式', '首页', '文档', '下载', '帮助',
+                'lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'tempor']
+PLANTED_TLDS = ['xyz', 'top', 'cc', 'vip', 'com', 'cn', 'net']
+
+# 暗链的几种写法：(写法, 模板, 旧的正则检测方式能否识别)
+HIDDEN_FORMS = [
+    ('inline-display', '<a style="display:none" href="{url}">{word}</a>', True),
+    ('inline-opacity', '<a style="opacity:0" href="{url}">{word}</a>', True),
+    ('parent-visibility', '<span style="visibility: hidden"><a href="{url}">{word}</a></span>', False),
+    ('parent-offscreen', '<div style="position:absolute;left:-9999px"><a href="{url}">{word}</a></div>', False),
+    ('hidden-attribute', '<p hidden><a href="{url}">{word}</a></p>', False),
+    ('zero-iframe', '<iframe src="{url}" width="0" height="0"></iframe>', False),
+]
+
+# 各类文件中植入黑链 / 纯域名字符串的写法（黑链在 html/php 中写成 HTML 标签，php 还会写在代码块里）
+BLACKLINK_FORMS = {
+    'html': ['<a href="{url}">{word}</a>', '<script src="{url}"></script>', '<iframe src="{url}"></iframe>'],
+    'php': ['<a href="{url}">{word}</a>', "<?php header('Location: {url}'); ?>"],
+    'js': ['window.location="{url}";', 'fetch("{url}").then(function(r){{return r.text()}});'],
+    'css': ['@import url("{url}");', '.bg{n}{{background:url({url})}}'],
+}
+DOMAIN_FORMS = {
+    'html': ['<meta name="mirror" content="{token}">'],
+    'php': ["<?php $mirror = '{token}'; ?>", '<meta name="mirror" content="{token}">'],
+    'js': ['var mirrorHost{n}="{token}";'],
+    'css': ['/* mirror: {token} */'],
+}
+
+
+def _base_kind(kind):
+    return kind.split('.')[0]
+
+
+def _filler_block(kind, rnd):
+    """生成一段不含黑链的正常内容"""
+    n = rnd.randint(1, 9999)
+    word = rnd.choice(FILLER_WORDS)
+    words = ' '.join(rnd.choice(FILLER_WORDS) for _ in range(rnd.randint(5, 30)))
+    host = rnd.choice(BENIGN_HOSTS)
+    base = _base_kind(kind)
+    if base in ('html', 'php'):
+        blocks = [
+            f'<p>{words} <a href="https://{host}/{word}/{n}.html">{word}</a></p>',
+            f'<img src="/static/img/{n}.png" alt="{word}">',
+            f'<ul><li><a href="/{word}/{n}">{word}</a></li><li>{words}</li></ul>',
+            f'<div class="c{n}">{words}</div>',
+            f'<script src="/static/js/app{n}.js"></script>',
+        ]
+        if base == 'php':
+            blocks.append(f'<?php $items = get_items({n}); foreach ($items as $it) {{ echo htmlspecialchars($it); }} ?>')
+        return rnd.choice(blocks)
+    if base == 'js':
+        return rnd.choice([
+            f'function f{n}(a,b){{return a.map(function(x){{return x*b+{n}}})}}',
+            f'var cfg{n}={{url:"/api/v1/{word}",retry:{n % 5},cdn:"https://{host}/js/"}};',
+            f'document.getElementById("el{n}").addEventListener("click",function(e){{e.preventDefault()}});',
+            f'e.exports.default=t.prototype.call(n,r.length,{n});',
+        ])
+    return rnd.choice([
+        f'.c{n}{{color:#{n:04x};margin:{n % 40}px}}',
+        f'.bg{n}{{background:url("/static/img/bg{n}.png") no-repeat}}',
+        f'@media (max-width:{n % 1200}px){{.c{n}{{display:block}}}}',
+    ])
+
+
+def _join_blocks(kind, blocks):
+    """非压缩文件每段一行（html/php 带缩进），压缩文件直接拼接"""
+    if kind.endswith('.min'):
+        return ''.join(blocks)
+    if _base_kind(kind) in ('html', 'php'):
+        return '<!DOCTYPE html>\n<html>\n<body>\n' + ''.join('  ' + b + '\n' for b in blocks) + '</body>\n</html>\n'
+    return '\n'.join(blocks) + '\n'
+
+
+def _unique_host(rnd, seen):
+    letters = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    while True:
+        host = ''.join(rnd.choice(letters) for _ in range(10)) + '.' + rnd.choice(PLANTED_TLDS)
+        if host not in seen:
+            seen.add(host)
+            return host
+
+
+def generate_webroot(directory, files=300, file_size=16 * 1024, blacklinks=200, hidden=100, domains=200, seed=0):
+    """
+    在 directory 下生成带标注的合成站点：html/php/js/css（压缩与非压缩）与二进制噪声文件，
+    按给定数量植入黑链、暗链与纯域名字符串。相同的参数与 seed 生成完全相同的内容。
+    返回清单（manifest）：
+      {'seed', 'blacklist': 黑名单（内置关键字 + 黑链主机）, 'files': {相对路径: {'kind', 'bytes',
+       'blacklinks': [url], 'hidden': [url], 'hidden_regex': [旧正则方式能识别的 url], 'domains': [token]}}}
+    """
+    rnd = random.Random(seed)
+    kinds = [k for k, _, _ in WEBROOT_KINDS]
+    weights = [w for _, _, w in WEBROOT_KINDS]
+    file_kinds = rnd.choices(kinds, weights, k=files)
+    planted = [{'blacklinks': [], 'hidden': [], 'hidden_regex': [], 'domains': []} for _ in range(files)]
+    text_files = [i for i, k in enumerate(file_kinds) if k != 'binary']
+    markup_files = [i for i in text_files if _base_kind(file_kinds[i]) in ('html', 'php')]
+
+    seen = set()
+    blacklist_hosts = []
+    if text_files:
+        for _ in range(blacklinks):
+            host = _unique_host(rnd, seen)
+            blacklist_hosts.append(host)
+            url = f'https://{host}/{rnd.choice(FILLER_WORDS)}/{rnd.randint(1, 9999)}'
+            planted[rnd.choice(text_files)]['blacklinks'].append(url)
+        for _ in range(domains):
+            planted[rnd.choice(text_files)]['domains'].append(_unique_host(rnd, seen))
+    if markup_files:
+        for _ in range(hidden):
+            url = f'https://{_unique_host(rnd, seen)}/{rnd.randint(1, 9999)}.html'
+            planted[rnd.choice(markup_files)]['hidden'].append(url)
+
+    manifest = {'seed': seed, 'blacklist': list(sb.BLACKLINK_KEYWORDS) + blacklist_hosts, 'files': {}}
+    for i, kind in enumerate(file_kinds):
+        size = min(int(rnd.expovariate(1 / file_size)) + 256, file_size * 20)
+        sub = f'dir{i % 10}/sub{i % 3}'
+        os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        if kind == 'binary':
+            ext, magic = rnd.choice(BINARY_NOISE)
+            if magic:
+                data = magic + rnd.randbytes(size)
+            else:
+                data = bytes(b if rnd.random() < 0.3 else 0 for b in rnd.randbytes(size))
+            rel = f'{sub}/asset_{i}{ext}'
+        else:
+            base = _base_kind(kind)
+            ext = dict((k, e) for k, e, _ in WEBROOT_KINDS)[kind]
+            blocks = []
+            total = 0
+            while total < size:
+                blocks.append(_filler_block(kind, rnd))
+                total += len(blocks[-1])
+            inserts = []
+            item = planted[i]
+            for url in item['blacklinks']:
+                form = rnd.choice(BLACKLINK_FORMS[base])
+                inserts.append(form.format(url=url, word=rnd.choice(FILLER_WORDS), n=rnd.randint(1, 9999)))
+            for token in item['domains']:
+                inserts.append(rnd.choice(DOMAIN_FORMS[base]).format(token=token, n=rnd.randint(1, 9999)))
+            for url in item['hidden']:
+                _, template, regex_visible = rnd.choice(HIDDEN_FORMS)
+                inserts.append(template.format(url=url, word=rnd.choice(FILLER_WORDS)))
+                if regex_visible:
+                    item['hidden_regex'].append(url)
+            for snippet in inserts:
+                blocks.insert(rnd.randint(0, len(blocks)), snippet)
+            data = _join_blocks(kind, blocks).encode('utf-8')
+            rel = f'{sub}/{"page" if base in ("html", "php") else "static"}_{i}{ext}'
+        with open(os.path.join(directory, rel), 'wb') as f:
+            f.write(data)
+        manifest['files'][rel] = dict(planted[i], kind=kind, bytes=len(data))
+    return manifest
+
+
+def corpus_summary(manifest):
+    """清单的统计：文件数、字节数、各类型文件数与植入数量"""
+    by_kind = {}
+    planted = {'blacklinks': 0, 'hidden': 0, 'hidden_regex': 0, 'domains': 0}
+    for info in manifest['files'].values():
+        by_kind[info['kind']] = by_kind.get(info['kind'], 0) + 1
+        for key in planted:
+            planted[key] += len(info[key])
+    return {
+        'files': len(manifest['files']),
+        'bytes': sum(info['bytes'] for info in manifest['files'].values()),
+        'by_kind': dict(sorted(by_kind.items())),
+        'planted': planted,
+    }
+
+
+def score_results(results, manifest, directory, hidden_detector=sb.DEFAULT_HIDDEN_DETECTOR):
+    """
+    按清单核对扫描结果（{绝对路径: links}）：各类植入项被找到的数量，
+    以及不属于任何黑链主机的可疑链接数（填充内容不含黑名单关键字，应为 0）
+    """
+    hidden_key = 'hidden' if hidden_detector == sb.HIDDEN_DETECTOR_HTML else 'hidden_regex'
+    found = {'blacklinks': 0, 'hidden': 0, 'domains': 0}
+    planted = {'blacklinks': 0, 'hidden': 0, 'domains': 0}
+    blacklist_hosts = manifest['blacklist'][len(sb.BLACKLINK_KEYWORDS):]
+    unexpected = 0
+    for rel, info in manifest['files'].items():
+        if info['kind'] == 'binary':
+            continue
+        links = results.get(os.path.join(directory, rel)) or {}
+        for key, field, expected in (('blacklinks', 'suspicious_links', info['blacklinks']),
+                                     ('hidden', 'possible_hidden_links', info[hidden_key]),
+                                     ('domains', 'domain_tokens', info['domains'])):
+            values = set(links.get(field, []))
+            planted[key] += len(expected)
+            found[key] += sum(1 for v in expected if v in values)
+        unexpected += sum(1 for s in links.get('suspicious_links', [])
+                          if not any(h in s.lower() for h in blacklist_hosts))
+    return {'planted': planted, 'found': found, 'unexpected_suspicious': unexpected}
+
+
+# ===================== 本地 HTTP 测试服务 =====================
+
+# 测试服务的应答方式（由请求路径的第一段决定）：
+#   ok 正常页面（含黑名单关键字）/ slow 额外延迟 / error 500 / notfound 404 / reset 不应答直接断开 /
+#   hang 挂起超过探测超时 / big 超大正文 / binary 图片 / redirect 302 跳转到 ok
+STANDIN_MODES = ('ok', 'slow', 'error', 'notfound', 'reset', 'hang', 'big', 'binary', 'redirect')
+DEFAULT_PROBE_MIX = 'ok=0.55,slow=0.1,error=0.05,notfound=0.05,reset=0.05,hang=0.05,big=0.05,binary=0.05,redirect=0.05'
+
+
+def parse_probe_mix(spec):
+    """解析 'ok=0.6,hang=0.1,...' 形式的应答方式占比"""
+    mix = {}
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        mode, _, weight = part.partition('=')
+        mode = mode.strip()
+        if mode not in STANDIN_MODES:
+            raise ValueError(f"未知的应答方式: {mode}（可选 {', '.join(STANDIN_MODES)}）")
+        mix[mode] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('应答方式占比不能为空')
+    return mix
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.lstrip('/').split('/')
+        mode = parts[0] if parts[0] in STANDIN_MODES else 'ok'
+        # 延迟按路径取值，同一目标每次运行的延迟相同
+        rnd = random.Random(self.path)
+        delay = server.latency + rnd.uniform(0, server.jitter)
+        if mode == 'slow':
+            delay += server.latency * 10
+        elif mode == 'hang':
+            delay += server.hang
+        time.sleep(delay)
+
+        if mode == 'reset':
+            self.close_connection = True
+            return
+        if mode == 'redirect':
+            self.send_response(302)
+            self.send_header('Location', '/ok/' + '/'.join(parts[1:]))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        status = {'error': 500, 'notfound': 404}.get(mode, 200)
+        if mode == 'binary':
+            content_type = 'image/png'
+            body = b'\x89PNG\r\n\x1a\n' + rnd.randbytes(32 * 1024)
+        else:
+            content_type = 'text/html; charset=utf-8'
+            text = f'<html><body>{" ".join(rnd.choice(FILLER_WORDS) for _ in range(50))} 博彩 {self.path}</body></html>'
+            if mode == 'big':
+                text = text * (server.big_size // len(text) + 1)
+            body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # socketserver 默认的 listen 队列只有 5，高并发探测时连接会被丢弃并在 1 秒后重传，与真实站点不符
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # 探测端超时 / 赛跑取消时会直接断开连接，属于预期情况，不输出异常栈
+        if not isinstance(sys.exc_info()[1], OSError):
+            super().handle_error(request, client_address)
+
+
+def start_standin_server(latency=0.02, jitter=0.01, hang=10.0, big_size=4 * 1024 * 1024, host='127.0.0.1', port=0):
+    """
+    在后台线程启动本地 HTTP 测试服务，返回 server（server.server_address 为实际地址，结束时 shutdown()）：
+    每个请求先等待 latency + [0, jitter) 秒，再按路径第一段（见 STANDIN_MODES）应答
+    """
+    server = StandInServer((host, port), StandInHandler)
+    server.latency = latency
+    server.jitter = jitter
+    server.hang = hang
+    server.big_size = big_size
+    threading.Thread(target=server.serve_forever, name='standin-server', daemon=True).start()
+    return server
+
+
+def build_probe_targets(base_url, count, mix, seed=0):
+    """按占比为每个目标选定应答方式，返回 [(url, mode), ...]"""
+    rnd = random.Random(seed)
+    modes = rnd.choices(list(mix), list(mix.values()), k=count)
+    return [(f'{base_url}/{mode}/{i}', mode) for i, mode in enumerate(modes)]
+
+
+# ===================== 基准套件（JSON 输出） =====================
+
+# JSON 结果格式的版本号，结构不兼容地变化时递增
+SUITE_FORMAT_VERSION = 1
+
+
+def git_revision():
+    """当前代码的 git 提交号（工作区有改动时加 -dirty），取不到时返回 None"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=here, capture_output=True,
+                             text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if not rev:
+        return None
+    return rev + ('-dirty' if dirty else '')
+
+
+def best_of(repeat, func):
+    """运行 repeat 次取最短耗时，返回 (秒, 最后一次的返回值)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def throughput(seconds, files=None, nbytes=None):
+    entry = {'seconds': round(seconds, 6)}
+    if files is not None:
+        entry['files'] = files
+        entry['files_per_s'] = round(files / seconds, 2) if seconds else None
+    if nbytes is not None:
+        entry['bytes'] = nbytes
+        entry['mb_per_s'] = round(nbytes / seconds / 1024 / 1024, 3) if seconds else None
+    return entry
+
+
+def suite_extract(directory, manifest, matcher, repeat, log):
+    """
+    extract_links 与字节级的 extract_links_bytes：按文件类型分别计时（整体读入内存后只计提取本身，
+    文本版本不含解码，字节版本本来就不解码）
+    """
+    by_kind = {}
+    for rel, info in manifest['files'].items():
+        if info['kind'] != 'binary':
+            with open(os.path.join(directory, rel), 'rb') as f:
+                by_kind.setdefault(info['kind'], []).append(f.read())
+    results = {}
+    for kind, blobs in sorted(by_kind.items()):
+        nbytes = sum(len(b) for b in blobs)
+        texts = [b.decode('utf-8') for b in blobs]
+        for name, extract, inputs in (('extract_links', sb.extract_links, texts),
+                                      ('extract_links_bytes', sb.extract_links_bytes, blobs)):
+            seconds, _ = best_of(repeat, lambda: [extract(t, None, matcher) for t in inputs])
+            results[f'{name}.{kind}'] = entry = throughput(seconds, len(inputs), nbytes)
+            log(f"{name:<19} [{kind:<8}] {len(inputs):4d} 个文件 {nbytes / 1024:9.1f} KB  "
+                f"{seconds:.3f}s  {entry['mb_per_s']} MB/s")
+    return results
+
+
+def suite_process_directory(directory, manifest, matcher, workers, engines, log):
+    """
+    process_directory：各引擎冷启动扫描一次（临时进度库），thread 引擎再用同一进度库做一次增量扫描；
+    同时按清单核对召回。返回 (结果, 进度库所在的临时目录, thread 引擎的进度库路径（供报告基准使用）)
+    """
+    results = {}
+    corpus = corpus_summary(manifest)
+    progress_dir = tempfile.mkdtemp(prefix='bench_progress_')
+    kept_progress = None
+    for engine in engines:
+        progress_file = os.path.join(progress_dir, f'{engine}.sqlite3')
+        for run in ('cold', 'incremental') if engine == 'thread' else ('cold',):
+            skip_stats = {}
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                scan = sb.process_directory(directory, recursive=True, scan_all=True, max_workers=workers,
+                                            black_patterns=matcher, progress_file=progress_file, engine=engine,
+                                            skip_binary=True, skip_stats=skip_stats)
+            seconds = time.perf_counter() - start
+            key = f'process_directory.{engine}' + ('.incremental' if run == 'incremental' else '')
+            entry = throughput(seconds, corpus['files'], corpus['bytes'])
+            entry['workers'] = workers
+            entry['scanned'] = len(scan)
+            entry['skipped'] = sum(skip_stats.values())
+            if run == 'cold':
+                entry['score'] = score_results(scan, manifest, directory)
+            scan.close()
+            results[key] = entry
+            log(f"process_directory [{engine}{'，增量' if run == 'incremental' else ''}] "
+                f"{seconds:.3f}s  {entry['files_per_s']} 文件/s  {entry['mb_per_s']} MB/s  跳过 {entry['skipped']}"
+                + (f"  召回 {entry['score']['found']} / {entry['score']['planted']}" if 'score' in entry else ''))
+        if engine == 'thread':
+            kept_progress = progress_file
+    return results, progress_dir, kept_progress
+
+
+def suite_report(progress_file, formats, repeat, log):
+    """报告生成：format_results 与各格式的 save_reports（结果来自 process_directory 写出的进度库）"""
+    results = {}
+    store = sb.ProgressStore(progress_file)
+    scan = sb.ScanResults(store)
+    out_dir = tempfile.mkdtemp(prefix='bench_report_')
+    try:
+        seconds, text = best_of(repeat, lambda: sb.format_results(scan))
+        results['report.format_results'] = {'seconds': round(seconds, 6), 'bytes': len(text.encode('utf-8'))}
+        log(f"format_results {seconds:.3f}s  {len(text.encode('utf-8')) / 1024:.1f} KB")
+        for fmt in formats:
+            path = os.path.join(out_dir, 'report' + sb.REPORT_FORMATS[fmt])
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds, _ = best_of(repeat, lambda: sb.save_reports(scan, {fmt: path}, console=False))
+            results[f'report.{fmt}'] = {'seconds': round(seconds, 6), 'bytes': os.path.getsize(path)}
+            log(f"save_reports [{fmt}] {seconds:.3f}s  {os.path.getsize(path) / 1024:.1f} KB")
+    finally:
+        scan.close()
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+
+def suite_probe(targets, engines, timeout, workers, concurrency, log):
+    """
+    probe_suspicious_links：对本地测试服务的目标探测，统计各应答方式的成功 / 失败 / 命中关键词数。
+    所有目标都在同一个主机上，async 引擎的单主机并发上限放宽到全局并发数，
+    否则排队等待连接的时间也计入超时，结果会随调度顺序变化
+    """
+    results = {}
+    all_results = {'bench': {'suspicious_links': [url for url, _ in targets], 'domain_tokens': []}}
+    mode_of = dict(targets)
+    for engine in engines:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            probed = sb.probe_suspicious_links(all_results, list(sb.BLACKLINK_KEYWORDS), max_workers=workers,
+                                               timeout=timeout, engine=engine, concurrency=concurrency,
+                                               per_host=concurrency, dns_precheck=False)
+        seconds = time.perf_counter() - start
+        if probed is None:
+            log(f"probe [{engine}] 跳过（缺少依赖库）")
+            continue
+        outcomes = {}
+        for url, info in probed.items():
+            counts = outcomes.setdefault(mode_of.get(url, 'other'), {'ok': 0, 'error': 0, 'hits': 0})
+            counts['error' if 'error' in info else 'ok'] += 1
+            if info.get('body_keyword_hits'):
+                counts['hits'] += 1
+        entry = {'seconds': round(seconds, 6), 'targets': len(targets),
+                 'targets_per_s': round(len(targets) / seconds, 2) if seconds else None,
+                 'outcomes': dict(sorted(outcomes.items()))}
+        results[f'probe.{engine}'] = entry
+        log(f"probe [{engine}] {len(targets)} 个目标 {seconds:.3f}s  {entry['targets_per_s']} 个/s")
+    return results
+
+
+def run_suite(args, log):
+    """生成合成站点并依次运行各项基准，返回 JSON 结果"""
+    report = {
+        'format': SUITE_FORMAT_VERSION,
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'ahocorasick': sb.ahocorasick is not None,
+        },
+        'params': {
+            'seed': args.seed, 'files': args.files, 'file_size': args.file_size, 'blacklinks': args.blacklinks,
+            'hidden_links': args.hidden_links, 'domain_tokens': args.domain_tokens, 'repeat': args.repeat,
+            'workers': args.threads, 'probe_targets': args.probe_targets, 'probe_mix': args.probe_mix,
+            'probe_latency': args.probe_latency, 'probe_timeout': args.probe_timeout,
+        },
+        'benchmarks': {},
+    }
+    benchmarks = report['benchmarks']
+    root = tempfile.mkdtemp(prefix='bench_webroot_')
+    progress_dir = None
+    try:
+        webroot = os.path.join(root, 'www')
+        manifest = generate_webroot(webroot, args.files, args.file_size, args.blacklinks, args.hidden_links,
+                                    args.domain_tokens, args.seed)
+        report['corpus'] = corpus_summary(manifest)
+        log(f"合成站点: {report['corpus']['files']} 个文件 {report['corpus']['bytes'] / 1024 / 1024:.2f} MB，"
+            f"植入 {report['corpus']['planted']}")
+        matcher = sb.BlackPatternMatcher(manifest['blacklist'])
+
+        benchmarks.update(suite_extract(webroot, manifest, matcher, args.repeat, log))
+        scan_results, progress_dir, progress_file = suite_process_directory(
+            webroot, manifest, matcher, args.threads, ['thread', 'process'], log)
+        benchmarks.update(scan_results)
+        if progress_file:
+            benchmarks.update(suite_report(progress_file, list(sb.REPORT_FORMATS), args.repeat, log))
+
+        if args.probe_targets:
+            server = start_standin_server(args.probe_latency / 1000, args.probe_latency / 2000,
+                                          hang=args.probe_timeout * 2)
+            try:
+                host, port = server.server_address[:2]
+                targets = build_probe_targets(f'http://{host}:{port}', args.probe_targets,
+                                              parse_probe_mix(args.probe_mix), args.seed)
+                benchmarks.update(suite_probe(targets, ['thread', 'async'], args.probe_timeout,
+                                              args.probe_workers, args.probe_concurrency, log))
+            finally:
+                server.shutdown()
+                server.server_close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        if progress_dir:
+            shutil.rmtree(progress_dir, ignore_errors=True)
+    return report
+
+
+def compare_reports(base, current, threshold):
+    """
+    对比两份基准 JSON 中同名基准的耗时，返回 (输出行, 是否有退化)：
+    耗时超过基线 (1 + threshold) 倍记为退化；召回 / 探测结果与基线不同时也记为退化
+    """
+    lines = [f"基线 {base['meta'].get('revision')} ({base['meta'].get('timestamp')}) -> "
+             f"当前 {current['meta'].get('revision')} ({current['meta'].get('timestamp')})"]
+    if base.get('params') != current.get('params'):
+        lines.append('[!] 两次运行的参数不同，耗时对比仅供参考')
+    regressed = False
+    for name, entry in current['benchmarks'].items():
+        old = base['benchmarks'].get(name)
+        if old is None:
+            lines.append(f"  {name:<40} {entry['seconds']:.3f}s（新增）")
+            continue
+        ratio = entry['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  <-- 变慢'
+            regressed = True
+        for key in ('score', 'outcomes'):
+            if key in entry and entry[key] != old.get(key):
+                flag += f'  <-- {key} 与基线不同'
+                regressed = True
+        lines.append(f"  {name:<40} {old['seconds']:.3f}s -> {entry['seconds']:.3f}s  x{ratio:.2f}{flag}")
+    for name in base['benchmarks']:
+        if name not in current['benchmarks']:
+            lines.append(f"  {name:<40}（当前结果中缺失）")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scan_Blacklink 性能基准')
+    parser.add_argument('-d', '--directory',
+                        help='使用真实目录中的文件作为语料（默认使用内置合成语料）')
+    parser.add_argument('--size', type=int, default=2 * 1024 * 1024,
+                        help='合成语料大小（字节），默认 2MB')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='合成语料随机种子')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='每项基准重复次数（取最优），默认3')
+    parser.add_argument('-b', '--base-domain', default='https://www.example.com',
+                        help='基础域名')
+    parser.add_argument('--engines', action='store_true',
+                        help='对比 thread / process 扫描引擎的吞吐（使用 -d 指定的目录，否则生成临时语料）')
+    parser.add_argument('-t', '--threads', type=int, default=os.cpu_count() or 4,
+                        help='引擎对比时的 worker 数，默认 CPU 核数')
+    parser.add_argument('--hidden', action='store_true',
+                        help='只对比正则与 HTML 词法分析两种暗链检测方式（含对抗性输入）')
+    parser.add_argument('--hidden-sizes', default='8,32,64',
+                        help='暗链检测对抗性输入的长度（KB），逗号分隔，默认 8,32,64（正则检测的耗时随长度平方增长）')
+
+    # 基准套件：合成站点 + 本地 HTTP 测试服务，结果输出为 JSON，便于在提交之间对比
+    suite = parser.add_argument_group('基准套件')
+    suite.add_argument('--suite', action='store_true',
+                       help='运行完整基准套件：extract_links（按文件类型）、process_directory（thread/process，含增量扫描）、'
+                            '报告生成（各格式）与 probe_suspicious_links（thread/async，本地测试服务），结果输出为 JSON')
+    suite.add_argument('--json',
+                       help='套件结果写入的 JSON 文件；不指定时 JSON 输出到标准输出，过程信息输出到标准错误')
+    suite.add_argument('--compare', nargs='+', metavar='JSON',
+                       help='与基线 JSON 对比：和 --suite 一起使用时对比本次结果，否则对比指定的两个文件（基线 当前）；'
+                            '有退化时退出码为 1')
+    suite.add_argument('--max-regression', type=float, default=0.1,
+                       help='对比时耗时超过基线多少比例记为退化，默认 0.1（10%%）')
+    suite.add_argument('--generate', metavar='DIR',
+                       help='只生成合成站点：文件写到 DIR/www，植入项清单写到 DIR/manifest.json')
+    suite.add_argument('--serve', metavar='[HOST:]PORT',
+                       help='只在前台运行本地 HTTP 测试服务（按路径第一段应答：' + '/'.join(STANDIN_MODES) + '）')
+    suite.add_argument('--files', type=int, default=300,
+                       help='合成站点的文件数，默认300')
+    suite.add_argument('--file-size', type=int, default=16 * 1024,
+                       help='合成站点文件的平均大小（字节，指数分布），默认16KB')
+    suite.add_argument('--blacklinks', type=int, default=200,
+                       help='植入的黑链数量，默认200')
+    suite.add_argument('--hidden-links', type=int, default=100,
+                       help='植入的暗链数量（只放在 html/php 中），默认100')
+    suite.add_argument('--domain-tokens', type=int, default=200,
+                       help='植入的纯域名字符串数量，默认200')
+    suite.add_argument('--probe-targets', type=int, default=200,
+                       help='探测基准的目标数，0 为不运行探测基准，默认200')
+    suite.add_argument('--probe-mix', default=DEFAULT_PROBE_MIX,
+                       help=f'测试服务各应答方式的占比，默认 {DEFAULT_PROBE_MIX}')
+    suite.add_argument('--probe-latency', type=float, default=20,
+                       help='测试服务每个请求的基础延迟（毫秒，另加至多一半的随机抖动），默认20')
+    suite.add_argument('--probe-timeout', type=float, default=1.0,
+                       help='探测超时（秒），hang 方式的目标会挂起 2 倍该时长，默认1')
+    suite.add_argument('--probe-workers', type=int, default=16,
+                       help='thread 探测引擎的线程数，默认16')
+    suite.add_argument('--probe-concurrency', type=int, default=100,
+                       help='async 探测引擎的并发数，默认100')
+    args = parser.parse_args()
+
+    if args.generate:
+        manifest = generate_webroot(os.path.join(args.generate, 'www'), args.files, args.file_size,
+                                    args.blacklinks, args.hidden_links, args.domain_tokens, args.seed)
+        with open(os.path.join(args.generate, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        print(json.dumps(corpus_summary(manifest), ensure_ascii=False))
+        return
+
+    if args.serve:
+        host, port = sb.parse_listen_address(args.serve)
+        server = start_standin_server(args.probe_latency / 1000, args.probe_latency / 2000,
+                                      hang=args.probe_timeout * 2, host=host, port=port)
+        host, port = server.server_address[:2]
+        print(f"测试服务: http://{host}:{port}/<{'|'.join(STANDIN_MODES)}>/<任意路径>（Ctrl-C 结束）")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    if args.suite or args.compare:
+        try:
+            parse_probe_mix(args.probe_mix)
+        except ValueError as e:
+            parser.error(f"--probe-mix 格式错误: {e}")
+        if args.compare and len(args.compare) != (1 if args.suite else 2):
+            parser.error('--compare 和 --suite 一起使用时只接受一个基线文件，单独使用时需要两个文件（基线 当前）')
+        log_stream = sys.stdout if args.json else sys.stderr
+        if args.suite:
+            report = run_suite(args, lambda line: print(line, file=log_stream, flush=True))
+            text = json.dumps(report, ensure_ascii=False, indent=2)
+            if args.json:
+                with open(args.json, 'w', encoding='utf-8') as f:
+                    f.write(text + '\n')
+                print(f"基准结果已保存到: {os.path.abspath(args.json)}")
+            else:
+                print(text)
+        else:
+            with open(args.compare[1], 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        if args.compare:
+            with open(args.compare[0], 'r', encoding='utf-8') as f:
+                base = json.load(f)
+            lines, regressed = compare_reports(base, report, args.max_regression)
+            for line in lines:
+                print(line, file=log_stream)
+            if regressed:
+                sys.exit(1)
+        return
+
+    hidden_sizes = [int(s) * 1024 for s in args.hidden_sizes.split(',') if s.strip()]
+    if args.hidden:
+        bench_hidden(hidden_sizes, args.repeat)
+        return
+
+    if args.engines:
+        if args.directory:
+            bench_engines(args.directory, args.threads, list(sb.BLACKLINK_KEYWORDS))
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                write_sample_corpus(tmp, 200, max(args.size // 200, 1024), args.seed)
+                bench_engines(tmp, args.threads, list(sb.BLACKLINK_KEYWORDS))
+        return
+
+    if args.directory:
+        texts = load_directory_texts(args.directory)
+    else:
+        texts = [build_sample_text(args.size, args.seed)]
+
+    bench_extract(texts, args.base_domain, list(sb.BLACKLINK_KEYWORDS), args.repeat)
+    bench_domains([build_minified_js(args.size, args.seed)], args.repeat)
+
+    candidates = sorted(sb.scan_domain_tokens(build_minified_js(args.size, args.seed + 1))[0])
+    candidates += ['https://%s/%d/index.html' % (c, i) for i, c in enumerate(candidates)]
+    bench_blacklist(candidates, build_sample_text(200000, args.seed), [0, 1000, 20000], args.repeat)
+    bench_hidden(hidden_sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
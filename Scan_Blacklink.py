@@ -1,11 +1,51 @@
 import re
 import argparse
 import os
+import io
 import json
-from urllib.parse import urlparse, urlunparse
+import hashlib
+import sqlite3
+import time
+import asyncio
+import socket
+import struct
+import random
+import ipaddress
+import codecs
+import csv
+import sys
+import pathlib
+import bisect
+import heapq
+import contextlib
+import calendar
+import zipfile
+import tarfile
+import stat
+import errno
+import select
+import ctypes
+import base64
+import binascii
+import socketserver
+from urllib.parse import urlparse, urlunparse, parse_qs
+from urllib.request import getproxies
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import threading
+import queue
+import fnmatch
+import shutil
+import tempfile
+from collections.abc import Mapping
+from functools import lru_cache
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 尝试导入 pyahocorasick（可选），黑名单规模很大时用作 C 实现的多模式匹配自动机
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # 尝试导入 requests，用于 HTTP 探测
 try:
@@ -15,6 +55,12 @@ try:
 except ImportError:
     requests = None
 
+# 尝试导入 aiohttp，用于异步 HTTP 探测引擎（--probe-engine async）
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 # 黑链关键词（常见的黑链相关词汇）——默认就会参与“命中黑名单关键字”判断
 BLACKLINK_KEYWORDS = [
     '博彩', '赌博', '色情', '成人', '贷款', '办证', '发票', '代开',
@@ -23,70 +69,1547 @@ BLACKLINK_KEYWORDS = [
     '黑产', '黑客', '破解', '木马', '病毒', '钓鱼', '诈骗'
 ]
 
-# 在任意位置匹配“疑似域名”的正则（不要求 http:// 前缀）
-DOMAIN_REGEX = re.compile(
-    r'\b((?:[a-z0-9-]+\.)+(?:AAA|AARP|ABB|ABBOTT|ABBVIE|ABC|ABLE|ABOGADO|ABUDHABI|AC|ACADEMY|ACCENTURE|ACCOUNTANT|ACCOUNTANTS|ACO|ACTOR|AD|ADS|ADULT|AE|AEG|AERO|AETNA|AF|AFL|AFRICA|AG|AGAKHAN|AGENCY|AI|AIG|AIRBUS|AIRFORCE|AIRTEL|AKDN|AL|ALIBABA|ALIPAY|ALLFINANZ|ALLSTATE|ALLY|ALSACE|ALSTOM|AM|AMAZON|AMERICANEXPRESS|AMERICANFAMILY|AMEX|AMFAM|AMICA|AMSTERDAM|ANALYTICS|ANDROID|ANQUAN|ANZ|AO|AOL|APARTMENTS|APP|APPLE|AQ|AQUARELLE|AR|ARAB|ARAMCO|ARCHI|ARMY|ARPA|ART|ARTE|AS|ASDA|ASIA|ASSOCIATES|AT|ATHLETA|ATTORNEY|AU|AUCTION|AUDI|AUDIBLE|AUDIO|AUSPOST|AUTHOR|AUTO|AUTOS|AW|AWS|AX|AXA|AZ|AZURE|BA|BABY|BAIDU|BANAMEX|BAND|BANK|BAR|BARCELONA|BARCLAYCARD|BARCLAYS|BAREFOOT|BARGAINS|BASEBALL|BASKETBALL|BAUHAUS|BAYERN|BB|BBC|BBT|BBVA|BCG|BCN|BD|BE|BEATS|BEAUTY|BEER|BERLIN|BEST|BESTBUY|BET|BF|BG|BH|BHARTI|BI|BIBLE|BID|BIKE|BING|BINGO|BIO|BIZ|BJ|BLACK|BLACKFRIDAY|BLOCKBUSTER|BLOG|BLOOMBERG|BLUE|BM|BMS|BMW|BN|BNPPARIBAS|BO|BOATS|BOEHRINGER|BOFA|BOM|BOND|BOO|BOOK|BOOKING|BOSCH|BOSTIK|BOSTON|BOT|BOUTIQUE|BOX|BR|BRADESCO|BRIDGESTONE|BROADWAY|BROKER|BROTHER|BRUSSELS|BS|BT|BUILD|BUILDERS|BUSINESS|BUY|BUZZ|BV|BW|BY|BZ|BZH|CA|CAB|CAFE|CAL|CALL|CALVINKLEIN|CAM|CAMERA|CAMP|CANON|CAPETOWN|CAPITAL|CAPITALONE|CAR|CARAVAN|CARDS|CARE|CAREER|CAREERS|CARS|CASA|CASE|CASH|CASINO|CAT|CATERING|CATHOLIC|CBA|CBN|CBRE|CC|CD|CENTER|CEO|CERN|CF|CFA|CFD|CG|CH|CHANEL|CHANNEL|CHARITY|CHASE|CHAT|CHEAP|CHINTAI|CHRISTMAS|CHROME|CHURCH|CI|CIPRIANI|CIRCLE|CISCO|CITADEL|CITI|CITIC|CITY|CK|CL|CLAIMS|CLEANING|CLICK|CLINIC|CLINIQUE|CLOTHING|CLOUD|CLUB|CLUBMED|CM|CN|CO|COACH|CODES|COFFEE|COLLEGE|COLOGNE|COM|COMMBANK|COMMUNITY|COMPANY|COMPARE|COMPUTER|COMSEC|CONDOS|CONSTRUCTION|CONSULTING|CONTACT|CONTRACTORS|COOKING|COOL|COOP|CORSICA|COUNTRY|COUPON|COUPONS|COURSES|CPA|CR|CREDIT|CREDITCARD|CREDITUNION|CRICKET|CROWN|CRS|CRUISE|CRUISES|CU|CUISINELLA|CV|CW|CX|CY|CYMRU|CYOU|CZ|DAD|DANCE|DATA|DATE|DATING|DATSUN|DAY|DCLK|DDS|DE|DEAL|DEALER|DEALS|DEGREE|DELIVERY|DELL|DELOITTE|DELTA|DEMOCRAT|DENTAL|DENTIST|DESI|DESIGN|DEV|DHL|DIAMONDS|DIET|DIGITAL|DIRECT|DIRECTORY|DISCOUNT|DISCOVER|DISH|DIY|DJ|DK|DM|DNP|DO|DOCS|DOCTOR|DOG|DOMAINS|DOT|DOWNLOAD|DRIVE|DTV|DUBAI|DUPONT|DURBAN|DVAG|DVR|DZ|EARTH|EAT|EC|ECO|EDEKA|EDU|EDUCATION|EE|EG|EMAIL|EMERCK|ENERGY|ENGINEER|ENGINEERING|ENTERPRISES|EPSON|EQUIPMENT|ER|ERICSSON|ERNI|ES|ESQ|ESTATE|ET|EU|EUROVISION|EUS|EVENTS|EXCHANGE|EXPERT|EXPOSED|EXPRESS|EXTRASPACE|FAGE|FAIL|FAIRWINDS|FAITH|FAMILY|FAN|FANS|FARM|FARMERS|FASHION|FAST|FEDEX|FEEDBACK|FERRARI|FERRERO|FI|FIDELITY|FIDO|FILM|FINAL|FINANCE|FINANCIAL|FIRE|FIRESTONE|FIRMDALE|FISH|FISHING|FIT|FITNESS|FJ|FK|FLICKR|FLIGHTS|FLIR|FLORIST|FLOWERS|FLY|FM|FO|FOO|FOOD|FOOTBALL|FORD|FOREX|FORSALE|FORUM|FOUNDATION|FOX|FR|FREE|FRESENIUS|FRL|FROGANS|FRONTIER|FTR|FUJITSU|FUN|FUND|FURNITURE|FUTBOL|FYI|GA|GAL|GALLERY|GALLO|GALLUP|GAME|GAMES|GAP|GARDEN|GAY|GB|GBIZ|GD|GDN|GE|GEA|GENT|GENTING|GEORGE|GF|GG|GGEE|GH|GI|GIFT|GIFTS|GIVES|GIVING|GL|GLASS|GLE|GLOBAL|GLOBO|GM|GMAIL|GMBH|GMO|GMX|GN|GODADDY|GOLD|GOLDPOINT|GOLF|GOO|GOODYEAR|GOOG|GOOGLE|GOP|GOT|GOV|GP|GQ|GR|GRAINGER|GRAPHICS|GRATIS|GREEN|GRIPE|GROCERY|GROUP|GS|GT|GU|GUCCI|GUGE|GUIDE|GUITARS|GURU|GW|GY|HAIR|HAMBURG|HANGOUT|HAUS|HBO|HDFC|HDFCBANK|HEALTH|HEALTHCARE|HELP|HELSINKI|HERE|HERMES|HIPHOP|HISAMITSU|HITACHI|HIV|HK|HKT|HM|HN|HOCKEY|HOLDINGS|HOLIDAY|HOMEDEPOT|HOMEGOODS|HOMES|HOMESENSE|HONDA|HORSE|HOSPITAL|HOST|HOSTING|HOT|HOTELS|HOTMAIL|HOUSE|HOW|HR|HSBC|HT|HU|HUGHES|HYATT|HYUNDAI|IBM|ICBC|ICE|ICU|ID|IE|IEEE|IFM|IKANO|IL|IM|IMAMAT|IMDB|IMMO|IMMOBILIEN|IN|INC|INDUSTRIES|INFINITI|INFO|ING|INK|INSTITUTE|INSURANCE|INSURE|INT|INTERNATIONAL|INTUIT|INVESTMENTS|IO|IPIRANGA|IQ|IR|IRISH|IS|ISMAILI|IST|ISTANBUL|IT|ITAU|ITV|JAGUAR|JAVA|JCB|JE|JEEP|JETZT|JEWELRY|JIO|JLL|JM|JMP|JNJ|JO|JOBS|JOBURG|JOT|JOY|JP|JPMORGAN|JPRS|JUEGOS|JUNIPER|KAUFEN|KDDI|KE|KERRYHOTELS|KERRYPROPERTIES|KFH|KG|KH|KI|KIA|KIDS|KIM|KINDLE|KITCHEN|KIWI|KM|KN|KOELN|KOMATSU|KOSHER|KP|KPMG|KPN|KR|KRD|KRED|KUOKGROUP|KW|KY|KYOTO|KZ|LA|LACAIXA|LAMBORGHINI|LAMER|LAND|LANDROVER|LANXESS|LASALLE|LAT|LATINO|LATROBE|LAW|LAWYER|LB|LC|LDS|LEASE|LECLERC|LEFRAK|LEGAL|LEGO|LEXUS|LGBT|LI|LIDL|LIFE|LIFEINSURANCE|LIFESTYLE|LIGHTING|LIKE|LILLY|LIMITED|LIMO|LINCOLN|LINK|LIVE|LIVING|LK|LLC|LLP|LOAN|LOANS|LOCKER|LOCUS|LOL|LONDON|LOTTE|LOTTO|LOVE|LPL|LPLFINANCIAL|LR|LS|LT|LTD|LTDA|LU|LUNDBECK|LUXE|LUXURY|LV|LY|MA|MADRID|MAIF|MAISON|MAKEUP|MAN|MANAGEMENT|MANGO|MAP|MARKET|MARKETING|MARKETS|MARRIOTT|MARSHALLS|MATTEL|MBA|MC|MCKINSEY|MD|ME|MED|MEDIA|MEET|MELBOURNE|MEME|MEMORIAL|MEN|MENU|MERCKMSD|MG|MH|MIAMI|MICROSOFT|MIL|MINI|MINT|MIT|MITSUBISHI|MK|ML|MLB|MLS|MM|MMA|MN|MO|MOBI|MOBILE|MODA|MOE|MOI|MOM|MONASH|MONEY|MONSTER|MORMON|MORTGAGE|MOSCOW|MOTO|MOTORCYCLES|MOV|MOVIE|MP|MQ|MR|MS|MSD|MT|MTN|MTR|MU|MUSEUM|MUSIC|MV|MW|MX|MY|MZ|NA|NAB|NAGOYA|NAME|NAVY|NBA|NC|NE|NEC|NET|NETBANK|NETFLIX|NETWORK|NEUSTAR|NEW|NEWS|NEXT|NEXTDIRECT|NEXUS|NF|NFL|NG|NGO|NHK|NI|NICO|NIKE|NIKON|NINJA|NISSAN|NISSAY|NL|NO|NOKIA|NORTON|NOW|NOWRUZ|NOWTV|NP|NR|NRA|NRW|NTT|NU|NYC|NZ|OBI|OBSERVER|OFFICE|OKINAWA|OLAYAN|OLAYANGROUP|OLLO|OM|OMEGA|ONE|ONG|ONL|ONLINE|OOO|OPEN|ORACLE|ORANGE|ORG|ORGANIC|ORIGINS|OSAKA|OTSUKA|OTT|OVH|PA|PAGE|PANASONIC|PARIS|PARS|PARTNERS|PARTS|PARTY|PAY|PCCW|PE|PET|PF|PFIZER|PG|PH|PHARMACY|PHD|PHILIPS|PHONE|PHOTO|PHOTOGRAPHY|PHOTOS|PHYSIO|PICS|PICTET|PICTURES|PID|PIN|PING|PINK|PIONEER|PIZZA|PK|PL|PLACE|PLAY|PLAYSTATION|PLUMBING|PLUS|PM|PN|PNC|POHL|POKER|POLITIE|PORN|POST|PR|PRAXI|PRESS|PRIME|PRO|PROD|PRODUCTIONS|PROF|PROGRESSIVE|PROMO|PROPERTIES|PROPERTY|PROTECTION|PRU|PRUDENTIAL|PS|PT|PUB|PW|PWC|PY|QA|QPON|QUEBEC|QUEST|RACING|RADIO|RE|READ|REALESTATE|REALTOR|REALTY|RECIPES|RED|REDUMBRELLA|REHAB|REISE|REISEN|REIT|RELIANCE|REN|RENT|RENTALS|REPAIR|REPORT|REPUBLICAN|REST|RESTAURANT|REVIEW|REVIEWS|REXROTH|RICH|RICHARDLI|RICOH|RIL|RIO|RIP|RO|ROCKS|RODEO|ROGERS|ROOM|RS|RSVP|RU|RUGBY|RUHR|RUN|RW|RWE|RYUKYU|SA|SAARLAND|SAFE|SAFETY|SAKURA|SALE|SALON|SAMSCLUB|SAMSUNG|SANDVIK|SANDVIKCOROMANT|SANOFI|SAP|SARL|SAS|SAVE|SAXO|SB|SBI|SBS|SC|SCB|SCHAEFFLER|SCHMIDT|SCHOLARSHIPS|SCHOOL|SCHULE|SCHWARZ|SCIENCE|SCOT|SD|SE|SEARCH|SEAT|SECURE|SECURITY|SEEK|SELECT|SENER|SERVICES|SEVEN|SEW|SEX|SEXY|SFR|SG|SH|SHANGRILA|SHARP|SHELL|SHIA|SHIKSHA|SHOES|SHOP|SHOPPING|SHOUJI|SHOW|SI|SILK|SINA|SINGLES|SITE|SJ|SK|SKI|SKIN|SKY|SKYPE|SL|SLING|SM|SMART|SMILE|SN|SNCF|SO|SOCCER|SOCIAL|SOFTBANK|SOFTWARE|SOHU|SOLAR|SOLUTIONS|SONG|SONY|SOY|SPA|SPACE|SPORT|SPOT|SR|SRL|SS|ST|STADA|STAPLES|STAR|STATEBANK|STATEFARM|STC|STCGROUP|STOCKHOLM|STORAGE|STORE|STREAM|STUDIO|STUDY|STYLE|SU|SUCKS|SUPPLIES|SUPPLY|SUPPORT|SURF|SURGERY|SUZUKI|SV|SWATCH|SWISS|SX|SY|SYDNEY|SYSTEMS|SZ|TAB|TAIPEI|TALK|TAOBAO|TARGET|TATAMOTORS|TATAR|TATTOO|TAX|TAXI|TC|TCI|TD|TDK|TEAM|TECH|TECHNOLOGY|TEL|TEMASEK|TENNIS|TEVA|TF|TG|TH|THD|THEATER|THEATRE|TIAA|TICKETS|TIENDA|TIPS|TIRES|TIROL|TJ|TJMAXX|TJX|TK|TKMAXX|TL|TM|TMALL|TN|TO|TODAY|TOKYO|TOOLS|TOP|TORAY|TOSHIBA|TOTAL|TOURS|TOWN|TOYOTA|TOYS|TR|TRADE|TRADING|TRAINING|TRAVEL|TRAVELERS|TRAVELERSINSURANCE|TRUST|TRV|TT|TUBE|TUI|TUNES|TUSHU|TV|TVS|TW|TZ|UA|UBANK|UBS|UG|UK|UNICOM|UNIVERSITY|UNO|UOL|UPS|US|UY|UZ|VA|VACATIONS|VANA|VANGUARD|VC|VE|VEGAS|VENTURES|VERISIGN|VERSICHERUNG|VET|VG|VI|VIAJES|VIDEO|VIG|VIKING|VILLAS|VIN|VIP|VIRGIN|VISA|VISION|VIVA|VIVO|VLAANDEREN|VN|VODKA|VOLVO|VOTE|VOTING|VOTO|VOYAGE|VU|WALES|WALMART|WALTER|WANG|WANGGOU|WATCH|WATCHES|WEATHER|WEATHERCHANNEL|WEBCAM|WEBER|WEBSITE|WED|WEDDING|WEIBO|WEIR|WF|WHOSWHO|WIEN|WIKI|WILLIAMHILL|WIN|WINDOWS|WINE|WINNERS|WME|WOLTERSKLUWER|WOODSIDE|WORK|WORKS|WORLD|WOW|WS|WTC|WTF|XBOX|XEROX|XIHUAN|XIN|XXX|XYZ|YACHTS|YAHOO|YAMAXUN|YANDEX|YE|YODOBASHI|YOGA|YOKOHAMA|YOU|YOUTUBE|YT|YUN|ZA|ZAPPOS|ZARA|ZERO|ZIP|ZM|ZONE|ZUERICH|ZW))\b',
-    re.IGNORECASE
-)
+# IANA 根区顶级域名列表（与 tlds-alpha-by-domain.txt 顺序一致），可通过 --tld-file 刷新
+_BUILTIN_TLDS = """
+AAA AARP ABB ABBOTT ABBVIE ABC ABLE ABOGADO ABUDHABI AC ACADEMY ACCENTURE ACCOUNTANT ACCOUNTANTS
+ACO ACTOR AD ADS ADULT AE AEG AERO AETNA AF AFL AFRICA AG AGAKHAN AGENCY AI AIG AIRBUS AIRFORCE
+AIRTEL AKDN AL ALIBABA ALIPAY ALLFINANZ ALLSTATE ALLY ALSACE ALSTOM AM AMAZON AMERICANEXPRESS
+AMERICANFAMILY AMEX AMFAM AMICA AMSTERDAM ANALYTICS ANDROID ANQUAN ANZ AO AOL APARTMENTS APP
+APPLE AQ AQUARELLE AR ARAB ARAMCO ARCHI ARMY ARPA ART ARTE AS ASDA ASIA ASSOCIATES AT ATHLETA
+ATTORNEY AU AUCTION AUDI AUDIBLE AUDIO AUSPOST AUTHOR AUTO AUTOS AW AWS AX AXA AZ AZURE BA BABY
+BAIDU BANAMEX BAND BANK BAR BARCELONA BARCLAYCARD BARCLAYS BAREFOOT BARGAINS BASEBALL BASKETBALL
+BAUHAUS BAYERN BB BBC BBT BBVA BCG BCN BD BE BEATS BEAUTY BEER BERLIN BEST BESTBUY BET BF BG BH
+BHARTI BI BIBLE BID BIKE BING BINGO BIO BIZ BJ BLACK BLACKFRIDAY BLOCKBUSTER BLOG BLOOMBERG BLUE
+BM BMS BMW BN BNPPARIBAS BO BOATS BOEHRINGER BOFA BOM BOND BOO BOOK BOOKING BOSCH BOSTIK BOSTON
+BOT BOUTIQUE BOX BR BRADESCO BRIDGESTONE BROADWAY BROKER BROTHER BRUSSELS BS BT BUILD BUILDERS
+BUSINESS BUY BUZZ BV BW BY BZ BZH CA CAB CAFE CAL CALL CALVINKLEIN CAM CAMERA CAMP CANON
+CAPETOWN CAPITAL CAPITALONE CAR CARAVAN CARDS CARE CAREER CAREERS CARS CASA CASE CASH CASINO CAT
+CATERING CATHOLIC CBA CBN CBRE CC CD CENTER CEO CERN CF CFA CFD CG CH CHANEL CHANNEL CHARITY
+CHASE CHAT CHEAP CHINTAI CHRISTMAS CHROME CHURCH CI CIPRIANI CIRCLE CISCO CITADEL CITI CITIC
+CITY CK CL CLAIMS CLEANING CLICK CLINIC CLINIQUE CLOTHING CLOUD CLUB CLUBMED CM CN CO COACH
+CODES COFFEE COLLEGE COLOGNE COM COMMBANK COMMUNITY COMPANY COMPARE COMPUTER COMSEC CONDOS
+CONSTRUCTION CONSULTING CONTACT CONTRACTORS COOKING COOL COOP CORSICA COUNTRY COUPON COUPONS
+COURSES CPA CR CREDIT CREDITCARD CREDITUNION CRICKET CROWN CRS CRUISE CRUISES CU CUISINELLA CV
+CW CX CY CYMRU CYOU CZ DAD DANCE DATA DATE DATING DATSUN DAY DCLK DDS DE DEAL DEALER DEALS
+DEGREE DELIVERY DELL DELOITTE DELTA DEMOCRAT DENTAL DENTIST DESI DESIGN DEV DHL DIAMONDS DIET
+DIGITAL DIRECT DIRECTORY DISCOUNT DISCOVER DISH DIY DJ DK DM DNP DO DOCS DOCTOR DOG DOMAINS DOT
+DOWNLOAD DRIVE DTV DUBAI DUPONT DURBAN DVAG DVR DZ EARTH EAT EC ECO EDEKA EDU EDUCATION EE EG
+EMAIL EMERCK ENERGY ENGINEER ENGINEERING ENTERPRISES EPSON EQUIPMENT ER ERICSSON ERNI ES ESQ
+ESTATE ET EU EUROVISION EUS EVENTS EXCHANGE EXPERT EXPOSED EXPRESS EXTRASPACE FAGE FAIL
+FAIRWINDS FAITH FAMILY FAN FANS FARM FARMERS FASHION FAST FEDEX FEEDBACK FERRARI FERRERO FI
+FIDELITY FIDO FILM FINAL FINANCE FINANCIAL FIRE FIRESTONE FIRMDALE FISH FISHING FIT FITNESS FJ
+FK FLICKR FLIGHTS FLIR FLORIST FLOWERS FLY FM FO FOO FOOD FOOTBALL FORD FOREX FORSALE FORUM
+FOUNDATION FOX FR FREE FRESENIUS FRL FROGANS FRONTIER FTR FUJITSU FUN FUND FURNITURE FUTBOL FYI
+GA GAL GALLERY GALLO GALLUP GAME GAMES GAP GARDEN GAY GB GBIZ GD GDN GE GEA GENT GENTING GEORGE
+GF GG GGEE GH GI GIFT GIFTS GIVES GIVING GL GLASS GLE GLOBAL GLOBO GM GMAIL GMBH GMO GMX GN
+GODADDY GOLD GOLDPOINT GOLF GOO GOODYEAR GOOG GOOGLE GOP GOT GOV GP GQ GR GRAINGER GRAPHICS
+GRATIS GREEN GRIPE GROCERY GROUP GS GT GU GUCCI GUGE GUIDE GUITARS GURU GW GY HAIR HAMBURG
+HANGOUT HAUS HBO HDFC HDFCBANK HEALTH HEALTHCARE HELP HELSINKI HERE HERMES HIPHOP HISAMITSU
+HITACHI HIV HK HKT HM HN HOCKEY HOLDINGS HOLIDAY HOMEDEPOT HOMEGOODS HOMES HOMESENSE HONDA HORSE
+HOSPITAL HOST HOSTING HOT HOTELS HOTMAIL HOUSE HOW HR HSBC HT HU HUGHES HYATT HYUNDAI IBM ICBC
+ICE ICU ID IE IEEE IFM IKANO IL IM IMAMAT IMDB IMMO IMMOBILIEN IN INC INDUSTRIES INFINITI INFO
+ING INK INSTITUTE INSURANCE INSURE INT INTERNATIONAL INTUIT INVESTMENTS IO IPIRANGA IQ IR IRISH
+IS ISMAILI IST ISTANBUL IT ITAU ITV JAGUAR JAVA JCB JE JEEP JETZT JEWELRY JIO JLL JM JMP JNJ JO
+JOBS JOBURG JOT JOY JP JPMORGAN JPRS JUEGOS JUNIPER KAUFEN KDDI KE KERRYHOTELS KERRYPROPERTIES
+KFH KG KH KI KIA KIDS KIM KINDLE KITCHEN KIWI KM KN KOELN KOMATSU KOSHER KP KPMG KPN KR KRD KRED
+KUOKGROUP KW KY KYOTO KZ LA LACAIXA LAMBORGHINI LAMER LAND LANDROVER LANXESS LASALLE LAT LATINO
+LATROBE LAW LAWYER LB LC LDS LEASE LECLERC LEFRAK LEGAL LEGO LEXUS LGBT LI LIDL LIFE
+LIFEINSURANCE LIFESTYLE LIGHTING LIKE LILLY LIMITED LIMO LINCOLN LINK LIVE LIVING LK LLC LLP
+LOAN LOANS LOCKER LOCUS LOL LONDON LOTTE LOTTO LOVE LPL LPLFINANCIAL LR LS LT LTD LTDA LU
+LUNDBECK LUXE LUXURY LV LY MA MADRID MAIF MAISON MAKEUP MAN MANAGEMENT MANGO MAP MARKET
+MARKETING MARKETS MARRIOTT MARSHALLS MATTEL MBA MC MCKINSEY MD ME MED MEDIA MEET MELBOURNE MEME
+MEMORIAL MEN MENU MERCKMSD MG MH MIAMI MICROSOFT MIL MINI MINT MIT MITSUBISHI MK ML MLB MLS MM
+MMA MN MO MOBI MOBILE MODA MOE MOI MOM MONASH MONEY MONSTER MORMON MORTGAGE MOSCOW MOTO
+MOTORCYCLES MOV MOVIE MP MQ MR MS MSD MT MTN MTR MU MUSEUM MUSIC MV MW MX MY MZ NA NAB NAGOYA
+NAME NAVY NBA NC NE NEC NET NETBANK NETFLIX NETWORK NEUSTAR NEW NEWS NEXT NEXTDIRECT NEXUS NF
+NFL NG NGO NHK NI NICO NIKE NIKON NINJA NISSAN NISSAY NL NO NOKIA NORTON NOW NOWRUZ NOWTV NP NR
+NRA NRW NTT NU NYC NZ OBI OBSERVER OFFICE OKINAWA OLAYAN OLAYANGROUP OLLO OM OMEGA ONE ONG ONL
+ONLINE OOO OPEN ORACLE ORANGE ORG ORGANIC ORIGINS OSAKA OTSUKA OTT OVH PA PAGE PANASONIC PARIS
+PARS PARTNERS PARTS PARTY PAY PCCW PE PET PF PFIZER PG PH PHARMACY PHD PHILIPS PHONE PHOTO
+PHOTOGRAPHY PHOTOS PHYSIO PICS PICTET PICTURES PID PIN PING PINK PIONEER PIZZA PK PL PLACE PLAY
+PLAYSTATION PLUMBING PLUS PM PN PNC POHL POKER POLITIE PORN POST PR PRAXI PRESS PRIME PRO PROD
+PRODUCTIONS PROF PROGRESSIVE PROMO PROPERTIES PROPERTY PROTECTION PRU PRUDENTIAL PS PT PUB PW
+PWC PY QA QPON QUEBEC QUEST RACING RADIO RE READ REALESTATE REALTOR REALTY RECIPES RED
+REDUMBRELLA REHAB REISE REISEN REIT RELIANCE REN RENT RENTALS REPAIR REPORT REPUBLICAN REST
+RESTAURANT REVIEW REVIEWS REXROTH RICH RICHARDLI RICOH RIL RIO RIP RO ROCKS RODEO ROGERS ROOM RS
+RSVP RU RUGBY RUHR RUN RW RWE RYUKYU SA SAARLAND SAFE SAFETY SAKURA SALE SALON SAMSCLUB SAMSUNG
+SANDVIK SANDVIKCOROMANT SANOFI SAP SARL SAS SAVE SAXO SB SBI SBS SC SCB SCHAEFFLER SCHMIDT
+SCHOLARSHIPS SCHOOL SCHULE SCHWARZ SCIENCE SCOT SD SE SEARCH SEAT SECURE SECURITY SEEK SELECT
+SENER SERVICES SEVEN SEW SEX SEXY SFR SG SH SHANGRILA SHARP SHELL SHIA SHIKSHA SHOES SHOP
+SHOPPING SHOUJI SHOW SI SILK SINA SINGLES SITE SJ SK SKI SKIN SKY SKYPE SL SLING SM SMART SMILE
+SN SNCF SO SOCCER SOCIAL SOFTBANK SOFTWARE SOHU SOLAR SOLUTIONS SONG SONY SOY SPA SPACE SPORT
+SPOT SR SRL SS ST STADA STAPLES STAR STATEBANK STATEFARM STC STCGROUP STOCKHOLM STORAGE STORE
+STREAM STUDIO STUDY STYLE SU SUCKS SUPPLIES SUPPLY SUPPORT SURF SURGERY SUZUKI SV SWATCH SWISS
+SX SY SYDNEY SYSTEMS SZ TAB TAIPEI TALK TAOBAO TARGET TATAMOTORS TATAR TATTOO TAX TAXI TC TCI TD
+TDK TEAM TECH TECHNOLOGY TEL TEMASEK TENNIS TEVA TF TG TH THD THEATER THEATRE TIAA TICKETS
+TIENDA TIPS TIRES TIROL TJ TJMAXX TJX TK TKMAXX TL TM TMALL TN TO TODAY TOKYO TOOLS TOP TORAY
+TOSHIBA TOTAL TOURS TOWN TOYOTA TOYS TR TRADE TRADING TRAINING TRAVEL TRAVELERS
+TRAVELERSINSURANCE TRUST TRV TT TUBE TUI TUNES TUSHU TV TVS TW TZ UA UBANK UBS UG UK UNICOM
+UNIVERSITY UNO UOL UPS US UY UZ VA VACATIONS VANA VANGUARD VC VE VEGAS VENTURES VERISIGN
+VERSICHERUNG VET VG VI VIAJES VIDEO VIG VIKING VILLAS VIN VIP VIRGIN VISA VISION VIVA VIVO
+VLAANDEREN VN VODKA VOLVO VOTE VOTING VOTO VOYAGE VU WALES WALMART WALTER WANG WANGGOU WATCH
+WATCHES WEATHER WEATHERCHANNEL WEBCAM WEBER WEBSITE WED WEDDING WEIBO WEIR WF WHOSWHO WIEN WIKI
+WILLIAMHILL WIN WINDOWS WINE WINNERS WME WOLTERSKLUWER WOODSIDE WORK WORKS WORLD WOW WS WTC WTF
+XBOX XEROX XIHUAN XIN XXX XYZ YACHTS YAHOO YAMAXUN YANDEX YE YODOBASHI YOGA YOKOHAMA YOU YOUTUBE
+YT YUN ZA ZAPPOS ZARA ZERO ZIP ZM ZONE ZUERICH ZW
+""".split()
+
+# 疑似域名候选：若干 "label." 加最后一段 label（在归一化的小写文本上匹配），
+# 最后一段（或其 '-' 之前的前缀）再到 TLD 哈希表中查找，取代原来 1500 个分支的正则
+_DOMAIN_CANDIDATE = re.compile(r'\b(?:[a-z0-9-]+\.)+[a-z0-9-]+')
+
+# 小写 TLD -> 在列表中的序号；序号用于复现原正则分支按列表顺序尝试的语义
+_TLD_RANK = {}
 
 # 线程锁
 print_lock = threading.Lock()
-progress_lock = threading.Lock()
-
-
-def extract_links(source_code, base_domain=None, black_patterns=None):
-    """
-    从源代码中提取所有链接，并区分外链和可能的暗链，同时提取纯域名字符串并做黑名单匹配
-    """
-    # 匹配URL的正则表达式模式
-    url_patterns = [
-        r'https?://[^\s"\'<>\)]+',             # 完整URL (http://, https://)
-        r'href=["\']([^"\']+)["\']',           # a标签中的href
-        r'href=([^\s>]+)',
-        r'src=["\']([^"\']+)["\']',            # iframe、img、script等标签中的src
-        r'src=([^\s>]+)',
-        r'<link[^>]*href=["\']([^"\']+)["\']', # link标签中的href
-        r'location\s*[=:]\s*["\']([^"\']+)["\']',
-        r'window\.open\(["\']([^"\']+)["\']',
-        r'window\.location\s*=\s*["\']([^"\']+)["\']',
-        r'//[^\s"\'<>\)]+',                    # 带协议的URL (//开头)
-        r'action=["\']([^"\']+)["\']',         # form action
-        r'data-[a-z-]+=["\']https?://[^"\']+["\']',
-        r'url\(["\']?([^"\'()]+)["\']?\)',     # CSS url()
-        r'fetch\(["\']([^"\']+)["\']',
-        r'ajax\([^)]*url\s*:\s*["\']([^"\']+)["\']',
-        r'(?<![:/])/[a-zA-Z0-9][^\s"\'<>]*'    # 相对路径URL
-    ]
 
+
+# 匹配URL的正则表达式模式（模块级只编译一次，由融合扫描引擎统一调度）
+URL_PATTERNS = [
+    r'https?://[^\s"\'<>\)]+',             # 完整URL (http://, https://)
+    r'href=["\']([^"\']+)["\']',           # a标签中的href
+    r'href=([^\s>]+)',
+    r'src=["\']([^"\']+)["\']',            # iframe、img、script等标签中的src
+    r'src=([^\s>]+)',
+    r'<link[^>]*href=["\']([^"\']+)["\']', # link标签中的href
+    r'location\s*[=:]\s*["\']([^"\']+)["\']',
+    r'window\.open\(["\']([^"\']+)["\']',
+    r'window\.location\s*=\s*["\']([^"\']+)["\']',
+    r'//[^\s"\'<>\)]+',                    # 带协议的URL (//开头)
+    r'action=["\']([^"\']+)["\']',         # form action
+    r'data-[a-z-]+=["\']https?://[^"\']+["\']',
+    r'url\(["\']?([^"\'()]+)["\']?\)',     # CSS url()
+    r'fetch\(["\']([^"\']+)["\']',
+    r'ajax\([^)]*url\s*:\s*["\']([^"\']+)["\']',
+    r'(?<![:/])/[a-zA-Z0-9][^\s"\'<>]*'    # 相对路径URL
+]
+
+# 可能的暗链模式
+HIDDEN_LINK_PATTERNS = [
+    r'display\s*:\s*none[^>]*href=["\']([^"\']+)["\']',
+    r'visibility\s*:\s*hidden[^>]*href=["\']([^"\']+)["\']',
+    r'width\s*:\s*0[^>]*height\s*:\s*0[^>]*href=["\']([^"\']+)["\']',
+    r'opacity\s*:\s*0[^>]*href=["\']([^"\']+)["\']'
+]
+
+# 与 re.IGNORECASE 语义不一致的少数字符：IGNORECASE 会把它们当作 ASCII 字母匹配，
+# 但 str.lower() 不会（或会改变字符串长度），归一化时先单独替换掉
+_CASE_FOLD_FIXES = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+# 融合扫描引擎：所有模式在模块加载时按小写形式编译一次（不带 IGNORECASE），
+# 每个文件只做一次大小写归一化，之后各模式都能利用字面量前缀直接跳到候选位置，
+# 不再对原文逐字符做 IGNORECASE 比较。
+# 元素为 (是否为暗链模式, 编译后的正则, 取值分组号)，分组号与 re.findall 的返回值保持一致
+_SCAN_PATTERNS = []
+for _pattern, _is_hidden in ([(p, False) for p in URL_PATTERNS] +
+                             [(p, True) for p in HIDDEN_LINK_PATTERNS]):
+    # 相对路径模式的后顾断言挪到 '/' 之后（语义等价），让正则拥有字面量前缀
+    _pattern = _pattern.replace(r'(?<![:/])/', r'/(?<![:/]/)')
+    _regex = re.compile(_pattern)
+    _SCAN_PATTERNS.append((_is_hidden, _regex, 1 if _regex.groups else 0))
+del _pattern, _is_hidden, _regex
+
+# 字节级扫描（--byte-scan）：同一组模式的 bytes 版本，直接在未解码的文件内容上匹配（\s、\b 按 ASCII 语义），
+# 只把命中的片段解码后写入报告
+_BYTE_SCAN_PATTERNS = [(is_hidden, re.compile(regex.pattern.encode('ascii')), group)
+                       for is_hidden, regex, group in _SCAN_PATTERNS]
+_DOMAIN_CANDIDATE_BYTES = re.compile(_DOMAIN_CANDIDATE.pattern.encode('ascii'))
+
+# 字节级扫描时黑名单关键字预先编码成的字节串所用的编码：
+# 除 UTF-8 外覆盖国内站点常见的 GBK/GB2312 页面与繁体 Big5 页面
+BYTE_SCAN_ENCODINGS = ('utf-8', 'gbk', 'big5')
+
+
+# ===================== 性能剖析 =====================
+
+# 直方图分桶（秒）：单个文件的扫描耗时、进度库每批提交耗时、单个目标的 HTTP 探测耗时
+FILE_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+STORE_COMMIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+PROBE_SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 剖析报告中列出的最慢文件 / 探测失败最多的主机数量
+DEFAULT_PROFILE_TOP = 10
+# 指标导出中按主机统计探测失败的主机数上限，其余主机合并为 host="_other"
+METRICS_MAX_HOSTS = 1000
+METRICS_PREFIX = 'scan_blacklink_'
+
+# 文件处理结果与探测失败的分类
+FILE_STATUSES = ('ok', 'unchanged', 'skipped', 'error')
+PROBE_ERROR_DNS = 'dns'
+PROBE_ERROR_TIMEOUT = 'timeout'
+PROBE_ERROR_HTTP = 'error'
+
+# 融合扫描各模式的名称（url:N / hidden:N 分别对应 URL_PATTERNS / HIDDEN_LINK_PATTERNS 中的序号）与原始正则
+_SCAN_PATTERN_NAMES = ([f'url:{i}' for i in range(len(URL_PATTERNS))]
+                       + [f'hidden:{i}' for i in range(len(HIDDEN_LINK_PATTERNS))])
+_SCAN_PATTERN_SOURCES = URL_PATTERNS + HIDDEN_LINK_PATTERNS
+
+# 当前进程的剖析器：未开启剖析时为 None，各埋点只多一次 is None 判断
+_profiler = None
+
+
+class Histogram:
+    """固定分桶的直方图（与 Prometheus histogram 语义一致：每个桶统计 <= 上界的观测值）"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """按分桶估算分位数：返回第 q 分位观测值所在桶的上界（落在最后一个桶时返回最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels) + '}'
+
+
+class ScanProfiler:
+    """
+    扫描与探测过程的性能剖析数据（--profile / --metrics-file / --metrics-listen 时开启）：
+      - 文件：按结果分类的文件数与字节数、单个文件耗时直方图、最慢的 top 个文件
+      - 提取：各阶段（读取/归一化/链接模式/暗链/域名/分类/哈希/缓存）与融合扫描各模式的累计耗时
+      - 进度库：每批提交的耗时直方图与记录数
+      - HTTP 探测：按成败分的耗时直方图、按主机与失败类别的计数
+      - 各阶段（扫描/探测/报告）的墙钟时间
+    线程安全；多进程引擎下每个工作进程各有一个实例，每批结束时 drain() 交回父进程 merge()。
+    阶段与模式耗时是各工作线程/进程的累计值，并发时可能超过墙钟时间
+    """
+
+    def __init__(self, top=DEFAULT_PROFILE_TOP):
+        self.top = top
+        self._lock = threading.Lock()
+        self._running = {}
+        self.phase_seconds = {}
+        self._reset()
+
+    def _reset(self):
+        self.files = dict.fromkeys(FILE_STATUSES, 0)
+        self.bytes = 0
+        self.file_seconds = Histogram(FILE_SECONDS_BUCKETS)
+        self.slowest = []
+        self.stage_seconds = {}
+        self.pattern_seconds = [0.0] * len(_SCAN_PATTERN_NAMES)
+        self.store_commits = Histogram(STORE_COMMIT_BUCKETS)
+        self.store_rows = 0
+        self.probe_seconds = {'ok': Histogram(PROBE_SECONDS_BUCKETS), 'error': Histogram(PROBE_SECONDS_BUCKETS)}
+        self.host_errors = {}
+
+    # ---------- 埋点 ----------
+
+    def stage(self, name, started):
+        """累计一个提取阶段从 started（perf_counter）到现在的耗时，返回当前时间供下一阶段使用"""
+        now = time.perf_counter()
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + now - started
+        return now
+
+    def add_pattern(self, idx, seconds):
+        with self._lock:
+            self.pattern_seconds[idx] += seconds
+
+    def record_file(self, file_path, size, seconds, status):
+        with self._lock:
+            self.files[status] += 1
+            self.bytes += size
+            self.file_seconds.observe(seconds)
+            if len(self.slowest) < self.top:
+                heapq.heappush(self.slowest, (seconds, file_path, size))
+            elif self.slowest and seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, file_path, size))
+
+    def record_store_commit(self, rows, seconds):
+        with self._lock:
+            self.store_commits.observe(seconds)
+            self.store_rows += rows
+
+    def record_probe(self, url, info, seconds):
+        """记录一次 HTTP 探测的耗时；失败时按主机与失败类别（超时 / 其他错误）计数"""
+        error = info.get('error')
+        with self._lock:
+            self.probe_seconds['error' if error else 'ok'].observe(seconds)
+        if error:
+            lowered = error.lower()
+            timed_out = 'timeout' in lowered or 'timed out' in lowered
+            self.record_host_error(url, PROBE_ERROR_TIMEOUT if timed_out else PROBE_ERROR_HTTP)
+
+    def record_host_error(self, url, kind):
+        try:
+            host = urlparse(url).hostname or url
+        except ValueError:
+            host = url
+        with self._lock:
+            key = (host, kind)
+            self.host_errors[key] = self.host_errors.get(key, 0) + 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """统计一个运行阶段（扫描 / 探测 / 报告）的墙钟时间；进行中的阶段在导出时按已用时间计算"""
+        started = time.perf_counter()
+        self._running[name] = started
+        try:
+            yield
+        finally:
+            del self._running[name]
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + time.perf_counter() - started
+
+    # ---------- 跨进程汇总 ----------
+
+    def drain(self):
+        """取出并清空目前的统计（工作进程每批结束时调用，结果交回父进程 merge）"""
+        with self._lock:
+            state = (self.files, self.bytes, self.file_seconds, self.slowest, self.stage_seconds,
+                     self.pattern_seconds, self.store_commits, self.store_rows, self.probe_seconds,
+                     self.host_errors)
+            self._reset()
+        return state
+
+    def merge(self, state):
+        (files, nbytes, file_seconds, slowest, stage_seconds, pattern_seconds,
+         store_commits, store_rows, probe_seconds, host_errors) = state
+        with self._lock:
+            for status, n in files.items():
+                self.files[status] += n
+            self.bytes += nbytes
+            self.file_seconds.merge(file_seconds)
+            for item in slowest:
+                if len(self.slowest) < self.top:
+                    heapq.heappush(self.slowest, item)
+                elif item[0] > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, item)
+            for name, seconds in stage_seconds.items():
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            for idx, seconds in enumerate(pattern_seconds):
+                self.pattern_seconds[idx] += seconds
+            self.store_commits.merge(store_commits)
+            self.store_rows += store_rows
+            for outcome, hist in probe_seconds.items():
+                self.probe_seconds[outcome].merge(hist)
+            for key, n in host_errors.items():
+                self.host_errors[key] = self.host_errors.get(key, 0) + n
+
+    # ---------- 输出 ----------
+
+    def elapsed(self, name):
+        """阶段的墙钟时间（含正在进行的部分）"""
+        seconds = self.phase_seconds.get(name, 0.0)
+        started = self._running.get(name)
+        if started is not None:
+            seconds += time.perf_counter() - started
+        return seconds
+
+    def rates(self):
+        """扫描阶段的 (文件/秒, 字节/秒)"""
+        seconds = self.elapsed('scan')
+        if seconds <= 0:
+            return 0.0, 0.0
+        return sum(self.files.values()) / seconds, self.bytes / seconds
+
+    def iter_host_errors(self, limit=None):
+        """按失败次数从多到少产出 (host, {kind: count}, total)"""
+        per_host = {}
+        for (host, kind), n in self.host_errors.items():
+            per_host.setdefault(host, {})[kind] = n
+        ranked = sorted(per_host.items(), key=lambda item: (-sum(item[1].values()), item[0]))
+        for host, kinds in ranked[:limit]:
+            yield host, kinds, sum(kinds.values())
+
+    def iter_metrics_lines(self):
+        """Prometheus 文本格式（text exposition format 0.0.4）的指标"""
+        with self._lock:
+            yield from self._iter_metrics_lines()
+
+    def _iter_metrics_lines(self):
+        def header(name, kind, help_text):
+            yield f'# HELP {METRICS_PREFIX}{name} {help_text}'
+            yield f'# TYPE {METRICS_PREFIX}{name} {kind}'
+
+        def sample(name, value, labels=()):
+            text = f'{value:.6g}' if isinstance(value, float) else str(value)
+            return f'{METRICS_PREFIX}{name}{_format_labels(labels)} {text}'
+
+        def histogram(name, hist, labels=()):
+            cumulative = 0
+            bounds = [f'{bound:g}' for bound in hist.buckets] + ['+Inf']
+            for bound, n in zip(bounds, hist.counts):
+                cumulative += n
+                yield sample(f'{name}_bucket', cumulative, labels + (('le', bound),))
+            yield sample(f'{name}_sum', float(hist.sum), labels)
+            yield sample(f'{name}_count', hist.count, labels)
+
+        yield from header('phase_seconds', 'gauge', 'Wall-clock seconds spent in each run phase.')
+        for name in sorted(set(self.phase_seconds) | set(self._running)):
+            yield sample('phase_seconds', float(self.elapsed(name)), (('phase', name),))
+
+        yield from header('files_total', 'counter', 'Files handled by the scan stage, by outcome.')
+        for status in FILE_STATUSES:
+            yield sample('files_total', self.files[status], (('status', status),))
+        yield from header('bytes_total', 'counter', 'Bytes of files that were scanned or hashed.')
+        yield sample('bytes_total', self.bytes)
+        files_rate, bytes_rate = self.rates()
+        yield from header('files_per_second', 'gauge', 'Files handled per second of the scan phase.')
+        yield sample('files_per_second', float(files_rate))
+        yield from header('bytes_per_second', 'gauge', 'Bytes handled per second of the scan phase.')
+        yield sample('bytes_per_second', float(bytes_rate))
+
+        yield from header('file_seconds', 'histogram', 'Seconds spent on a single file.')
+        yield from histogram('file_seconds', self.file_seconds)
+        yield from header('slowest_file_seconds', 'gauge', 'Seconds spent on the slowest files of this run.')
+        for seconds, file_path, _ in sorted(self.slowest, reverse=True):
+            yield sample('slowest_file_seconds', float(seconds), (('path', file_path),))
+
+        yield from header('stage_seconds_total', 'counter',
+                          'Seconds spent in each extraction stage, summed over workers.')
+        for name, seconds in sorted(self.stage_seconds.items()):
+            yield sample('stage_seconds_total', float(seconds), (('stage', name),))
+        yield from header('pattern_seconds_total', 'counter',
+                          'Seconds spent in each link pattern of the fused scanner, summed over workers.')
+        for idx, seconds in enumerate(self.pattern_seconds):
+            yield sample('pattern_seconds_total', float(seconds),
+                         (('pattern', _SCAN_PATTERN_NAMES[idx]), ('regex', _SCAN_PATTERN_SOURCES[idx])))
+
+        yield from header('progress_commit_seconds', 'histogram', 'Seconds per progress store batch commit.')
+        yield from histogram('progress_commit_seconds', self.store_commits)
+        yield from header('progress_rows_total', 'counter', 'Rows written to the progress store.')
+        yield sample('progress_rows_total', self.store_rows)
+
+        yield from header('probe_seconds', 'histogram', 'Seconds per HTTP probe, by outcome.')
+        for outcome, hist in self.probe_seconds.items():
+            yield from histogram('probe_seconds', hist, (('outcome', outcome),))
+        yield from header('probe_host_errors_total', 'counter', 'Failed probes per host and failure kind.')
+        other = {}
+        for i, (host, kinds, _) in enumerate(self.iter_host_errors()):
+            if i >= METRICS_MAX_HOSTS:
+                for kind, n in kinds.items():
+                    other[kind] = other.get(kind, 0) + n
+                continue
+            for kind, n in sorted(kinds.items()):
+                yield sample('probe_host_errors_total', n, (('host', host), ('kind', kind)))
+        for kind, n in sorted(other.items()):
+            yield sample('probe_host_errors_total', n, (('host', '_other'), ('kind', kind)))
+
+    def metrics_text(self):
+        return '\n'.join(self.iter_metrics_lines()) + '\n'
+
+    def write_textfile(self, path):
+        """
+        写出 Prometheus textfile（node_exporter textfile collector 格式）：
+        先写同目录下的临时文件再原子替换，采集端不会读到写了一半的文件
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(prefix='.metrics_', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.metrics_text())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def iter_summary_lines(self):
+        """剖析报告（中文，运行结束时输出到控制台）"""
+        yield '=' * 60
+        yield '性能剖析'
+        yield '=' * 60
+        for name, seconds in self.phase_seconds.items():
+            yield f"阶段 {name}: {seconds:.2f} 秒"
+
+        files_rate, bytes_rate = self.rates()
+        total_files = sum(self.files.values())
+        yield (f"扫描文件 {total_files} 个（提取 {self.files['ok']}，未变化 {self.files['unchanged']}，"
+               f"跳过 {self.files['skipped']}，出错 {self.files['error']}），{self.bytes / 1024 / 1024:.1f} MB，"
+               f"{files_rate:.1f} 文件/秒，{bytes_rate / 1024 / 1024:.2f} MB/秒")
+        if self.file_seconds.count:
+            yield (f"单个文件耗时: 平均 {self.file_seconds.sum / self.file_seconds.count * 1000:.2f} ms，"
+                   f"p50 ≤ {self.file_seconds.quantile(0.5) * 1000:g} ms，"
+                   f"p99 ≤ {self.file_seconds.quantile(0.99) * 1000:g} ms，最长 {self.file_seconds.max * 1000:.1f} ms")
+
+        stage_total = sum(self.stage_seconds.values())
+        if stage_total:
+            yield '提取各阶段耗时（各工作线程/进程累计）:'
+            for name, seconds in sorted(self.stage_seconds.items(), key=lambda item: -item[1]):
+                yield f"  {name:<10}{seconds:10.3f} 秒  {seconds / stage_total * 100:5.1f}%"
+        if any(self.pattern_seconds):
+            yield '链接模式耗时（融合扫描，各工作线程/进程累计）:'
+            ranked = sorted(range(len(self.pattern_seconds)), key=lambda idx: -self.pattern_seconds[idx])
+            for idx in ranked[:self.top]:
+                if self.pattern_seconds[idx]:
+                    yield (f"  {_SCAN_PATTERN_NAMES[idx]:<10}{self.pattern_seconds[idx]:10.3f} 秒  "
+                           f"{_SCAN_PATTERN_SOURCES[idx]}")
+        if self.slowest:
+            yield f'最慢的 {len(self.slowest)} 个文件:'
+            for seconds, file_path, size in sorted(self.slowest, reverse=True):
+                yield f"  {seconds * 1000:10.1f} ms  {size / 1024:10.1f} KB  {file_path}"
+
+        commits = self.store_commits
+        if commits.count:
+            yield (f"进度库提交: {commits.count} 批 / {self.store_rows} 条，"
+                   f"平均 {commits.sum / commits.count * 1000:.2f} ms，p50 ≤ {commits.quantile(0.5) * 1000:g} ms，"
+                   f"p99 ≤ {commits.quantile(0.99) * 1000:g} ms，最长 {commits.max * 1000:.1f} ms")
+
+        for outcome, label in (('ok', '成功'), ('error', '失败')):
+            hist = self.probe_seconds[outcome]
+            if hist.count:
+                yield (f"HTTP探测（{label}）: {hist.count} 个，平均 {hist.sum / hist.count:.3f} 秒，"
+                       f"p50 ≤ {hist.quantile(0.5):g} 秒，p90 ≤ {hist.quantile(0.9):g} 秒，"
+                       f"p99 ≤ {hist.quantile(0.99):g} 秒，最长 {hist.max:.3f} 秒")
+        if self.host_errors:
+            yield '探测失败最多的主机:'
+            for host, kinds, total in self.iter_host_errors(self.top):
+                detail = '，'.join(f"{kind} {n}" for kind, n in sorted(kinds.items()))
+                yield f"  {host}: {total} 次（{detail}）"
+
+
+def enable_profiler(top=DEFAULT_PROFILE_TOP):
+    """在当前进程开启性能剖析，返回剖析器"""
+    global _profiler
+    _profiler = ScanProfiler(top)
+    return _profiler
+
+
+def profile_phase(name):
+    """统计运行阶段耗时的上下文管理器；未开启剖析时什么也不做"""
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.phase(name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.profiler.metrics_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_listen_address(text):
+    """解析 [HOST:]PORT，HOST 默认为 127.0.0.1"""
+    host, sep, port = text.rpartition(':')
+    if not sep:
+        host = ''
+    host = host.strip('[]') or '127.0.0.1'
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"无效的端口: {text}")
+    if not 0 <= port <= 65535:
+        raise ValueError(f"无效的端口: {text}")
+    return host, port
+
+
+def serve_metrics(profiler, host, port):
+    """在后台线程中以 HTTP 提供 /metrics（Prometheus 抓取端点），返回 server，结束时调用 shutdown()"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.profiler = profiler
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+# ===================== HTML 暗链检测 =====================
+
+# 暗链检测方式：regex 为 HIDDEN_LINK_PATTERNS 正则（默认，结果与旧版本一致），html 为单遍 HTML 词法分析
+HIDDEN_DETECTOR_HTML = 'html'
+HIDDEN_DETECTOR_REGEX = 'regex'
+HIDDEN_DETECTORS = (HIDDEN_DETECTOR_HTML, HIDDEN_DETECTOR_REGEX)
+DEFAULT_HIDDEN_DETECTOR = HIDDEN_DETECTOR_REGEX
+
+# 单个文档的暗链检测时间上限（秒），超时后停止分析该文档的剩余部分（已找到的暗链保留）
+DEFAULT_HIDDEN_TIMEOUT = 5.0
+
+# 流式分析时未闭合标签的最大长度，超过后当作畸形标签跳到下一个 '>'，避免缓冲区无限增长
+MAX_TAG_LENGTH = 64 * 1024
+
+# 每处理多少个标签检查一次是否超时
+_HIDDEN_CHECK_EVERY = 512
+
+# 没有结束标签的空元素，不入栈
+_VOID_ELEMENTS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'meta',
+    'param', 'source', 'track', 'wbr',
+))
+# 内容按纯文本处理、直到对应结束标签的元素；script 的内容（document.write 拼出的 HTML）仍会按 HTML 分析
+_RAW_TEXT_ELEMENTS = frozenset(('script', 'style', 'textarea', 'title', 'xmp', 'noembed', 'noframes'))
+# 同名元素未闭合时由下一个同名开始标签隐式结束
+_IMPLIED_END_ELEMENTS = frozenset(('p', 'li', 'option', 'dt', 'dd', 'tr', 'td', 'th'))
+# 会隐式结束未闭合 <p> 的块级开始标签
+_CLOSES_P_ELEMENTS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'div', 'dl', 'fieldset', 'footer', 'form',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'ul',
+))
+# 隐藏状态下需要收集的链接属性：任意元素的 href，以及 iframe/frame 的 src
+_HIDDEN_SRC_ELEMENTS = frozenset(('iframe', 'frame'))
+
+_TAG_NAME = re.compile(r'[^\s/>]+')
+_TAG_SEPARATOR = re.compile(r'[\s/]*')
+_ATTR_NAME = re.compile(r'[^\s/>][^\s/>=]*')
+_SPACES = re.compile(r'\s*')
+_UNQUOTED_VALUE = re.compile(r'[^\s>]*')
+_STYLE_DECLARATION = re.compile(r'([a-z-]+)\s*:\s*([^;]*)')
+_CSS_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)')
+_RAW_TEXT_END = {}
+
+# 离屏隐藏：left/top/text-indent 小于该值（px）时视为移出可视区域
+_OFFSCREEN_PX = -999
+
+
+def _css_number(value):
+    m = _CSS_NUMBER.match(value)
+    return float(m.group()) if m else None
+
+
+def style_hides_element(style):
+    """
+    判断内联样式是否让元素不可见：display:none、visibility:hidden/collapse、opacity:0、
+    宽高均为 0、高度为 0 且 overflow:hidden、font-size:0，以及 left/top/text-indent 移出可视区域
+    """
+    decls = {}
+    for prop, value in _STYLE_DECLARATION.findall(style.lower()):
+        decls[prop] = value.replace('!important', '').strip()
+    if not decls:
+        return False
+    if decls.get('display', '').startswith('none'):
+        return True
+    if decls.get('visibility', '').startswith(('hidden', 'collapse')):
+        return True
+    if _css_number(decls.get('opacity', '')) == 0:
+        return True
+    width = _css_number(decls.get('width', ''))
+    height = _css_number(decls.get('height', ''))
+    if height == 0 and (width == 0 or decls.get('overflow', '').startswith('hidden')):
+        return True
+    if _css_number(decls.get('font-size', '')) == 0:
+        return True
+    indent = _css_number(decls.get('text-indent', ''))
+    if indent is not None and indent <= _OFFSCREEN_PX:
+        return True
+    if decls.get('position', '').startswith(('absolute', 'fixed')):
+        for prop in ('left', 'top'):
+            offset = _css_number(decls.get(prop, ''))
+            if offset is not None and offset <= _OFFSCREEN_PX:
+                return True
+    return False
+
+
+def _clean_attr_value(value):
+    # JS 字符串里拼出的 HTML 常带转义引号（href=\"...\"），一并去掉
+    return value.strip().strip('\\"\'').strip()
+
+
+class HiddenLinkScanner:
+    """
+    流式 HTML 词法分析的暗链检测器：逐块 feed 文本，单遍线性扫描，记录元素栈及每层是否可见。
+    元素自身（内联样式、hidden 属性、宽高为 0 的 width/height 属性）或任一祖先不可见时，
+    收集其中的 href（以及 iframe/frame 的 src）作为可能的暗链。
+    script 内容交给子分析器继续按 HTML 分析，可发现 document.write 写出的隐藏链接。
+    超过 timeout 秒后停止分析（timed_out 置位），已发现的链接保留
+    """
+
+    def __init__(self, timeout=DEFAULT_HIDDEN_TIMEOUT, links=None, hidden=False, deadline=None):
+        self.links = set() if links is None else links
+        self.timed_out = False
+        if deadline is None and timeout:
+            deadline = time.monotonic() + timeout
+        self._deadline = deadline
+        self._base_hidden = hidden
+        self._stack = []
+        self._open = {}
+        self._buffer = ''
+        # 当前状态：None 为普通文本；'comment' 为注释内；'skip' 为跳过畸形长标签；其余为纯文本元素名
+        self._mode = None
+        self._child = None
+        self._tags = 0
+
+    @property
+    def hidden(self):
+        return self._stack[-1][1] if self._stack else self._base_hidden
+
+    def feed(self, text):
+        if self.timed_out:
+            return
+        self._buffer += text
+        self._parse(final=False)
+
+    def close(self):
+        """输入结束，处理剩余的缓冲内容并返回收集到的链接"""
+        if not self.timed_out:
+            self._parse(final=True)
+        self._buffer = ''
+        return self.links
+
+    def _check_deadline(self):
+        self._tags += 1
+        if self._deadline is not None and self._tags % _HIDDEN_CHECK_EVERY == 0 \
+                and time.monotonic() > self._deadline:
+            self.timed_out = True
+            return False
+        return True
+
+    def _parse(self, final):
+        text = self._buffer
+        pos = 0
+        n = len(text)
+        while pos < n and not self.timed_out:
+            mode = self._mode
+            if mode == 'comment':
+                end = text.find('-->', pos)
+                if end == -1:
+                    pos = n if final else max(pos, n - 2)
+                    break
+                pos = end + 3
+                self._mode = None
+                continue
+            if mode == 'skip':
+                end = text.find('>', pos)
+                if end == -1:
+                    pos = n
+                    break
+                pos = end + 1
+                self._mode = None
+                continue
+            if mode is not None:
+                pos = self._raw_text(text, pos, final)
+                if self._mode is not None:
+                    break
+                continue
+
+            lt = text.find('<', pos)
+            if lt == -1 or lt + 1 >= n:
+                pos = n if lt == -1 or final else lt
+                break
+            nxt = text[lt + 1]
+            if nxt == '!' and text.startswith('<!--', lt):
+                self._mode = 'comment'
+                pos = lt + 4
+                continue
+            if nxt == '!' or nxt == '?':
+                end = text.find('>', lt)
+                if end == -1:
+                    if final or n - lt > MAX_TAG_LENGTH:
+                        self._mode = 'skip'
+                        pos = lt
+                        continue
+                    pos = lt
+                    break
+                pos = end + 1
+                continue
+            closing = nxt == '/'
+            name_start = lt + 2 if closing else lt + 1
+            if name_start >= n:
+                pos = n if final else lt
+                break
+            if not text[name_start].isalpha():
+                pos = lt + 1
+                continue
+            tag_end = self._tag(text, lt, name_start, closing)
+            if tag_end is None:
+                if final:
+                    pos = n
+                    break
+                if n - lt > MAX_TAG_LENGTH:
+                    self._mode = 'skip'
+                    pos = lt + 1
+                    continue
+                pos = lt
+                break
+            pos = tag_end
+            if not self._check_deadline():
+                break
+        self._buffer = text[pos:]
+        if final and self._child is not None:
+            self._child.close()
+
+    def _raw_text(self, text, pos, final):
+        """纯文本元素内：找到结束标签之前的内容（script 的内容交给子分析器）"""
+        name = self._mode
+        pattern = _RAW_TEXT_END.get(name)
+        if pattern is None:
+            pattern = _RAW_TEXT_END[name] = re.compile(r'</' + name + r'[\s/>]', re.IGNORECASE)
+        m = pattern.search(text, pos)
+        if m is None:
+            # 末尾可能是被截断的结束标签，留到下一块再判断
+            end = len(text) if final else max(pos, len(text) - len(name) - 3)
+            if self._child is not None:
+                self._child.feed(text[pos:end])
+                self.timed_out = self._child.timed_out
+            return end
+        if self._child is not None:
+            self._child.feed(text[pos:m.start()])
+            self._child.close()
+            self._child = None
+        self._mode = None
+        close = text.find('>', m.start())
+        return m.end() if close == -1 else close + 1
+
+    def _tag(self, text, lt, name_start, closing):
+        """解析一个开始/结束标签，返回标签结束后的位置；标签不完整返回 None"""
+        n = len(text)
+        m = _TAG_NAME.match(text, name_start)
+        name = m.group().lower()
+        pos = m.end()
+        if closing:
+            end = text.find('>', pos)
+            if end == -1:
+                return None
+            self._end_tag(name)
+            return end + 1
+
+        attrs = {}
+        while True:
+            pos = _TAG_SEPARATOR.match(text, pos).end()
+            if pos >= n:
+                return None
+            if text[pos] == '>':
+                break
+            m = _ATTR_NAME.match(text, pos)
+            attr = m.group().lower()
+            pos = _SPACES.match(text, m.end()).end()
+            value = ''
+            if pos < n and text[pos] == '=':
+                pos = _SPACES.match(text, pos + 1).end()
+                if pos >= n:
+                    return None
+                quote = text[pos]
+                if quote in '"\'':
+                    close = text.find(quote, pos + 1)
+                    if close == -1:
+                        return None
+                    value = text[pos + 1:close]
+                    pos = close + 1
+                else:
+                    m = _UNQUOTED_VALUE.match(text, pos)
+                    value = m.group()
+                    pos = m.end()
+            elif pos >= n:
+                return None
+            attrs.setdefault(attr, value)
+        self_closing = text[pos - 1] == '/'
+        self._start_tag(name, attrs, self_closing)
+        return pos + 1
+
+    def _start_tag(self, name, attrs, self_closing):
+        stack = self._stack
+        if stack:
+            top = stack[-1][0]
+            if (name in _IMPLIED_END_ELEMENTS and top == name) or (name in _CLOSES_P_ELEMENTS and top == 'p'):
+                self._pop()
+
+        hidden = self.hidden or 'hidden' in attrs or style_hides_element(attrs.get('style', ''))
+        if not hidden and 'width' in attrs and 'height' in attrs:
+            hidden = _css_number(attrs['width'].strip()) == 0 and _css_number(attrs['height'].strip()) == 0
+        if hidden:
+            for attr in ('href', 'src') if name in _HIDDEN_SRC_ELEMENTS else ('href',):
+                value = _clean_attr_value(attrs.get(attr, ''))
+                if value:
+                    self.links.add(value)
+
+        if name in _RAW_TEXT_ELEMENTS and not self_closing:
+            self._mode = name
+            if name == 'script':
+                self._child = HiddenLinkScanner(links=self.links, hidden=hidden, deadline=self._deadline)
+            return
+        if name in _VOID_ELEMENTS or self_closing:
+            return
+        stack.append((name, hidden))
+        self._open[name] = self._open.get(name, 0) + 1
+
+    def _pop(self):
+        name, _ = self._stack.pop()
+        self._open[name] -= 1
+
+    def _end_tag(self, name):
+        # 只有确实存在同名的未闭合元素时才出栈，多余的结束标签直接忽略
+        if not self._open.get(name):
+            return
+        while self._stack:
+            top = self._stack[-1][0]
+            self._pop()
+            if top == name:
+                break
+
+
+def find_hidden_links(source_code, timeout=DEFAULT_HIDDEN_TIMEOUT):
+    """对整篇文档做一次暗链检测，返回可能的暗链集合"""
+    scanner = HiddenLinkScanner(timeout)
+    scanner.feed(source_code)
+    return scanner.close()
+
+
+# ===================== 链接提取 =====================
+
+def fold_case(text):
+    """
+    将文本转换为与 re.IGNORECASE 匹配语义等价的小写形式，且长度与原文一致，
+    因此在归一化文本上得到的匹配位置可以直接映射回原文；字节串（字节级扫描）只转换 ASCII 字母
+    """
+    if isinstance(text, bytes):
+        return text.lower()
+    if '\u0130' in text or '\u0131' in text or '\u017f' in text:
+        text = text.translate(_CASE_FOLD_FIXES)
+    return text.lower()
+
+
+def load_tld_file(tld_file):
+    """读取 IANA tlds-alpha-by-domain.txt 格式的 TLD 列表（# 开头为注释，每行一个）"""
+    tlds = []
+    with open(tld_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                tlds.append(line)
+    return tlds
+
+
+def set_tld_list(tlds):
+    """替换当前使用的 TLD 列表"""
+    global _TLD_RANK
+    rank = {}
+    for tld in tlds:
+        rank.setdefault(fold_case(tld.strip()), len(rank))
+    _TLD_RANK = rank
+
+
+set_tld_list(_BUILTIN_TLDS)
+
+
+def _match_domain_at(folded, m):
+    """
+    在候选 m 上复现原 DOMAIN_REGEX 的回溯语义：
+    先尽量多地吞掉 "label."，最后一段须是 TLD 且其后为单词边界；
+    多个 TLD 同时满足时取列表中靠前的。返回匹配结束位置，不匹配返回 None
+    （字节级扫描时候选只含 ASCII 字符，解码开销可以忽略）
+    """
+    group = m.group()
+    if isinstance(group, bytes):
+        group = group.decode('ascii')
+    labels = group.split('.')
+    offsets = []
+    pos = m.start()
+    for label in labels:
+        offsets.append(pos)
+        pos += len(label) + 1
+
+    last = len(labels) - 1
+    after = m.end()
+    tail = folded[after:after + 1]
+    tail_boundary = not tail or not (tail.isalnum() or tail == '_' or tail == b'_')
+
+    for k in range(last, 0, -1):
+        run = labels[k]
+        best = None
+        if k < last or tail_boundary:
+            rank = _TLD_RANK.get(run)
+            if rank is not None:
+                best = (rank, len(run))
+        if '-' in run:
+            idx = run.find('-')
+            while idx != -1:
+                rank = _TLD_RANK.get(run[:idx])
+                if rank is not None and (best is None or rank < best[0]):
+                    best = (rank, idx)
+                idx = run.find('-', idx + 1)
+        if best is not None:
+            return offsets[k] + best[1]
+    return None
+
+
+def scan_domain_tokens(source_code, folded=None, limit=None, start=0):
+    """
+    提取代码中的纯域名字符串（不要求 http:// 前缀），结果与原 DOMAIN_REGEX.findall 一致。
+    limit / start 供窗口化扫描使用：只接受起点在 limit 之前的匹配，从 start 处开始搜索；
+    返回 (domain_tokens, 最后一次命中的结束位置)。source_code 为字节串时结果也是字节串
+    """
+    if folded is None:
+        folded = fold_case(source_code)
+
+    domain_tokens = set()
+    search = (_DOMAIN_CANDIDATE_BYTES if isinstance(folded, bytes) else _DOMAIN_CANDIDATE).search
+    pos = start
+    last_end = start
+    while True:
+        m = search(folded, pos)
+        if m is None or (limit is not None and m.start() >= limit):
+            break
+        end = _match_domain_at(folded, m)
+        if end is None:
+            pos = m.start() + 1
+            continue
+        token = source_code[m.start():end].strip().lower()
+        if token:
+            domain_tokens.add(token)
+        pos = last_end = end
+    return domain_tokens, last_end
+
+
+def scan_link_candidates(source_code, folded=None, limit=None, starts=None, ends=None, hidden_regex=True):
+    """
+    融合扫描：返回 (all_links, hidden_links)，
+    与对 URL_PATTERNS / HIDDEN_LINK_PATTERNS 逐个 re.findall(..., re.IGNORECASE) 的结果完全一致
+    （匹配在归一化文本上进行，取值从原文按位置截取，保留原始大小写）。
+    hidden_regex=False 时跳过 HIDDEN_LINK_PATTERNS（暗链改由 HiddenLinkScanner 检测），hidden_links 为空。
+    窗口化扫描时：只接受起点在 limit 之前的匹配；starts 为各模式的起始搜索位置，
+    ends（输出）记录各模式最后一次命中的结束位置，用于在相邻窗口之间延续非重叠语义。
+    source_code 为字节串时使用 _BYTE_SCAN_PATTERNS，结果也是字节串
+    """
+    all_links = set()
+    hidden_links = set()
+    if folded is None:
+        folded = fold_case(source_code)
+
+    prof = _profiler
+    patterns = _BYTE_SCAN_PATTERNS if isinstance(folded, bytes) else _SCAN_PATTERNS
+    for idx, (is_hidden, regex, group) in enumerate(patterns):
+        if is_hidden and not hidden_regex:
+            continue
+        if prof is not None:
+            started = time.perf_counter()
+        target = hidden_links if is_hidden else all_links
+        for m in regex.finditer(folded, starts[idx] if starts else 0):
+            if limit is not None and m.start() >= limit:
+                break
+            if ends is not None:
+                ends[idx] = m.end()
+            start, end = m.span(group)
+            if end > start:
+                target.add(source_code[start:end].strip())
+        if prof is not None:
+            prof.add_pattern(idx, time.perf_counter() - started)
+
+    return all_links, hidden_links
+
+
+# 窗口化扫描的默认窗口大小（字符数）与相邻窗口的重叠长度：
+# 单个匹配只要短于重叠长度，就不会因为落在窗口边界上而丢失或被截断
+DEFAULT_WINDOW_SIZE = 16 * 1024 * 1024
+DEFAULT_WINDOW_OVERLAP = 64 * 1024
+
+
+# 窗口之间额外保留的上下文长度（覆盖相对路径模式的后顾断言与 \b 所需的前一个字符）
+_WINDOW_CONTEXT = 8
+
+
+def scan_stream(f, window_size=DEFAULT_WINDOW_SIZE, overlap=DEFAULT_WINDOW_OVERLAP,
+                hidden_detector=DEFAULT_HIDDEN_DETECTOR, hidden_timeout=DEFAULT_HIDDEN_TIMEOUT):
+    """
+    以固定大小的窗口流式扫描文本文件对象 f，返回 (all_links, hidden_links, domain_tokens)。
+    每个窗口只接受起点在 (窗口末尾 - overlap) 之前的匹配，剩余部分并入下一个窗口，
+    因此内存占用只与窗口大小有关，与文件大小无关；
+    HTML 暗链检测器本身是流式的，每个窗口读入的新内容直接喂给它。
+    f 为二进制文件对象时按字节扫描（字节级扫描），结果为字节串；HTML 暗链检测器看到的是按 latin-1
+    逐字节映射的文本（标签结构都是 ASCII，不做解码校验），检出的暗链再映射回原始字节
+    """
+    hidden_regex = hidden_detector == HIDDEN_DETECTOR_REGEX
+    hidden_scanner = None if hidden_regex else HiddenLinkScanner(hidden_timeout)
+    overlap = max(0, min(overlap, window_size // 2))
     all_links = set()
+    hidden_links = set()
     domain_tokens = set()
-    suspicious_set = set()
+    # 各模式（最后一项为域名提取）在当前窗口中的起始搜索位置
+    starts = [0] * (len(_SCAN_PATTERNS) + 1)
+    carry = ''
+    binary = False
+    prof = _profiler
+
+    while True:
+        if prof is not None:
+            t = time.perf_counter()
+        chunk = f.read(window_size)
+        if prof is not None:
+            t = prof.stage('read', t)
+        binary = isinstance(chunk, bytes)
+        if hidden_scanner is not None:
+            hidden_scanner.feed(chunk.decode('latin-1') if binary else chunk)
+            if prof is not None:
+                t = prof.stage('hidden', t)
+        text = carry + chunk if carry else chunk
+        limit = len(text) - overlap if chunk else None
+        if limit is not None and limit <= 0:
+            carry = text
+            continue
+        folded = fold_case(text)
+        if prof is not None:
+            t = prof.stage('fold', t)
+
+        ends = list(starts)
+        links, hidden = scan_link_candidates(text, folded, limit, starts, ends, hidden_regex)
+        if prof is not None:
+            t = prof.stage('links', t)
+        domains, ends[-1] = scan_domain_tokens(text, folded, limit, starts[-1])
+        if prof is not None:
+            prof.stage('domains', t)
+        all_links |= links
+        hidden_links |= hidden
+        domain_tokens |= domains
+
+        if limit is None:
+            break
+        # 多保留几个字符作为后顾断言 / 单词边界的上下文，这些字符本身不再作为匹配起点
+        keep = min(_WINDOW_CONTEXT, limit)
+        base = limit - keep
+        starts = [max(keep, e - base) for e in ends]
+        carry = text[base:]
 
-    if black_patterns:
-        black_patterns = [p.lower() for p in black_patterns]
+    if hidden_scanner is not None:
+        if prof is not None:
+            t = time.perf_counter()
+        hidden_links = hidden_scanner.close()
+        if binary:
+            hidden_links = {link.encode('latin-1') for link in hidden_links}
+        if prof is not None:
+            prof.stage('hidden', t)
+    return all_links, hidden_links, domain_tokens
 
-    def check_suspicious(candidate):
-        if not candidate or not black_patterns:
+
+# ===================== 黑名单多模式匹配 =====================
+
+# 关键字数量不超过该值时直接逐个做子串查找（C 实现的 str.__contains__ 在小规模下更快）
+SMALL_BLACKLIST_SIZE = 32
+
+
+class BlackPatternMatcher:
+    """
+    黑名单关键字/域名片段的多模式匹配器（不区分大小写的子串匹配）：
+      - 每次运行只构建一次，文件扫描与 HTTP 探测共用
+      - 规模较大时使用 Aho-Corasick 自动机，匹配开销只与文本长度线性相关，与黑名单规模无关
+      - 安装了 pyahocorasick 时使用其 C 实现，否则使用内置的纯 Python 实现
+    """
+
+    def __init__(self, patterns):
+        seen = set()
+        self.patterns = []
+        for p in patterns or []:
+            p = p.lower()
+            if p and p not in seen:
+                seen.add(p)
+                self.patterns.append(p)
+
+        self._automaton = None
+        self._goto = None
+        self._byte_matcher = None
+        if len(self.patterns) <= SMALL_BLACKLIST_SIZE:
             return
-        c = candidate.lower()
-        for p in black_patterns:
-            if p in c:
-                suspicious_set.add(candidate.strip())
-                break
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for p in self.patterns:
+                # 字节串关键字（见 byte_matcher）按 latin-1 逐字节映射成字符串交给 C 实现
+                automaton.add_word(p.decode('latin-1') if isinstance(p, bytes) else p, p)
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            self._build(self.patterns)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def __reduce__(self):
+        # 进程间传递时只传关键字列表，在对端重新构建自动机
+        return (self.__class__, (self.patterns,))
+
+    def _build(self, patterns):
+        """构建纯 Python 的 Aho-Corasick 自动机：goto 转移表、fail 指针、输出集合"""
+        goto = [{}]
+        out = [()]
+        for p in patterns:
+            state = 0
+            for ch in p:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] = out[state] + (p,)
+
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[nxt] = f if f != nxt else 0
+                out[nxt] = out[nxt] + out[fail[nxt]]
+                queue.append(nxt)
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def _iter_hits(self, text):
+        """在已转为小写的文本上逐个产出命中的关键字（可能重复）"""
+        if self._automaton is not None:
+            if isinstance(text, bytes):
+                text = text.decode('latin-1')
+            for _, p in self._automaton.iter(text):
+                yield p
+            return
+        if self._goto is None:
+            for p in self.patterns:
+                if p in text:
+                    yield p
+            return
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        root = goto[0]
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0) if state else root.get(ch, 0)
+            if out[state]:
+                yield from out[state]
+
+    def search(self, text):
+        """文本中是否包含任意一个黑名单关键字"""
+        if not text or not self.patterns:
+            return False
+        for _ in self._iter_hits(text.lower()):
+            return True
+        return False
+
+    def find_all(self, text):
+        """返回文本中命中的所有黑名单关键字（去重、排序）"""
+        if not text or not self.patterns:
+            return []
+        return sorted(set(self._iter_hits(text.lower())))
+
+    def byte_matcher(self):
+        """
+        字节级扫描使用的匹配器：每个关键字预先编码为 BYTE_SCAN_ENCODINGS 中各编码的字节串
+        （无法编码的跳过，编码结果相同的合并），直接在未解码的字节上做子串匹配。
+        返回 (匹配器, {字节串: 编码})，首次调用时构建；字节串的大小写转换只作用于 ASCII 字节，
+        与待匹配内容的转换一致，GBK/Big5 中落在 ASCII 范围的尾字节不会造成漏报
+        """
+        if self._byte_matcher is None:
+            encodings = {}
+            for p in self.patterns:
+                if isinstance(p, bytes):
+                    continue
+                for encoding in BYTE_SCAN_ENCODINGS:
+                    try:
+                        encoded = p.encode(encoding)
+                    except UnicodeEncodeError:
+                        continue
+                    encodings.setdefault(encoded.lower(), encoding)
+            self._byte_matcher = (BlackPatternMatcher(list(encodings)), encodings)
+        return self._byte_matcher
+
+
+@lru_cache(maxsize=8)
+def _build_black_matcher(patterns):
+    return BlackPatternMatcher(patterns)
+
+
+def get_black_matcher(black_patterns):
+    """
+    接受关键字列表或已构建好的 BlackPatternMatcher，返回匹配器；
+    传入列表时按内容缓存，避免每个文件都重新构建自动机
+    """
+    if not black_patterns:
+        return None
+    if isinstance(black_patterns, BlackPatternMatcher):
+        return black_patterns
+    return _build_black_matcher(tuple(black_patterns))
+
 
-    # 提取所有可能的链接
-    for pattern in url_patterns:
-        matches = re.findall(pattern, source_code, re.IGNORECASE)
-        for match in matches:
-            if isinstance(match, tuple) and len(match) > 0:
-                match = match[0]
-            if match:
-                all_links.add(match.strip())
+def extract_links(source_code, base_domain=None, black_patterns=None,
+                  hidden_detector=DEFAULT_HIDDEN_DETECTOR, hidden_timeout=DEFAULT_HIDDEN_TIMEOUT):
+    """
+    从源代码中提取所有链接，并区分外链和可能的暗链，同时提取纯域名字符串并做黑名单匹配；
+    hidden_detector='regex'（默认）时暗链由 HIDDEN_LINK_PATTERNS 检测，'html' 时使用 HiddenLinkScanner；
+    暗链只用于标记已提取到的链接，不额外并入链接集合
+    """
+    prof = _profiler
+    if prof is not None:
+        t = time.perf_counter()
+
+    # 大小写归一化只做一次，链接模式与域名提取共用
+    folded = fold_case(source_code)
+    if prof is not None:
+        t = prof.stage('fold', t)
+
+    # 提取所有可能的链接及暗链
+    hidden_regex = hidden_detector == HIDDEN_DETECTOR_REGEX
+    all_links, hidden_links = scan_link_candidates(source_code, folded, hidden_regex=hidden_regex)
+    if prof is not None:
+        t = prof.stage('links', t)
+    if not hidden_regex:
+        hidden_links = find_hidden_links(source_code, hidden_timeout)
+        if prof is not None:
+            t = prof.stage('hidden', t)
 
     # 提取纯域名字符串
-    for m in DOMAIN_REGEX.findall(source_code):
-        if m:
-            domain_tokens.add(m.strip().lower())
+    domain_tokens, _ = scan_domain_tokens(source_code, folded)
+    if prof is not None:
+        t = prof.stage('domains', t)
+
+    results = classify_links(all_links, hidden_links, domain_tokens, base_domain, black_patterns)
+    if prof is not None:
+        prof.stage('classify', t)
+    return results
+
+
+def decode_span(span, encodings=()):
+    """
+    把字节级扫描得到的片段解码成文本：先按 UTF-8；失败时依次尝试 encodings（片段中命中的关键字所用的编码）、
+    GBK 与 Big5；都失败时与文本扫描一致，按 UTF-8 忽略无法解码的字节
+    """
+    try:
+        return span.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    for encoding in (*encodings, 'gbk', 'big5'):
+        try:
+            return span.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return span.decode('utf-8', errors='ignore')
+
+
+def classify_byte_links(all_links, hidden_links, domain_tokens, base_domain=None, black_patterns=None):
+    """
+    字节级扫描的分类：候选片段（字节串）先在原始字节上按关键字的 UTF-8/GBK/Big5 编码做黑名单匹配，
+    再逐个解码（只解码候选片段，不解码整个文件），之后与 classify_links 相同；
+    与文本扫描一致，链接按补全后的形式匹配（// 开头补 https:，/ 开头补 base_domain）
+    """
+    matcher = get_black_matcher(black_patterns)
+    byte_matcher, encodings = matcher.byte_matcher() if matcher else (None, {})
+    base_prefix = base_domain.rstrip('/').encode('utf-8') if base_domain else None
+    flagged = set()
+    decoded = {}
+
+    def decode(span, is_link=True):
+        text = decoded.get(span)
+        if text is not None:
+            return text
+        # 与 classify_links 补全 full_link 的规则相同
+        prefix = b''
+        if is_link and span.startswith(b'//'):
+            prefix = b'https:'
+        elif is_link and span.startswith(b'/') and base_prefix is not None:
+            prefix = base_prefix
+        if span.isascii():
+            # 纯 ASCII 片段（绝大多数）里只可能出现 ASCII 关键字，各编码的字节都相同，直接用文本匹配器
+            text = decoded[span] = span.decode('ascii')
+            if matcher and matcher.search(prefix.decode('utf-8') + text if prefix else text):
+                flagged.add(text)
+            return text
+        hits = byte_matcher.find_all(prefix + span) if byte_matcher else ()
+        text = decoded[span] = decode_span(span, [encodings[h] for h in hits])
+        if hits:
+            flagged.add(text)
+        return text
+
+    links = {decode(span) for span in all_links}
+    hidden = {decode(span) for span in hidden_links}
+    domains = {decode(span, is_link=False) for span in domain_tokens}
+    return classify_links(links, hidden, domains, base_domain, black_patterns, flagged=flagged)
+
+
+def extract_links_bytes(data, base_domain=None, black_patterns=None,
+                        hidden_detector=DEFAULT_HIDDEN_DETECTOR, hidden_timeout=DEFAULT_HIDDEN_TIMEOUT):
+    """
+    extract_links 的字节级版本：链接与域名模式直接在未解码的字节上匹配，
+    黑名单关键字按 UTF-8/GBK/Big5 编码后的字节匹配，只解码匹配到的片段；
+    HTML 暗链检测器看到的是按 latin-1 逐字节映射的文本，检出的暗链再映射回原始字节
+    """
+    prof = _profiler
+    if prof is not None:
+        t = time.perf_counter()
+
+    folded = data.lower()
+    if prof is not None:
+        t = prof.stage('fold', t)
+
+    hidden_regex = hidden_detector == HIDDEN_DETECTOR_REGEX
+    all_links, hidden_links = scan_link_candidates(data, folded, hidden_regex=hidden_regex)
+    if prof is not None:
+        t = prof.stage('links', t)
+    if not hidden_regex:
+        hidden_links = {link.encode('latin-1') for link in find_hidden_links(data.decode('latin-1'), hidden_timeout)}
+        if prof is not None:
+            t = prof.stage('hidden', t)
+
+    domain_tokens, _ = scan_domain_tokens(data, folded)
+    if prof is not None:
+        t = prof.stage('domains', t)
+
+    results = classify_byte_links(all_links, hidden_links, domain_tokens, base_domain, black_patterns)
+    if prof is not None:
+        prof.stage('classify', t)
+    return results
+
+
+def extract_links_from_file(file_path, base_domain=None, black_patterns=None,
+                            window_size=DEFAULT_WINDOW_SIZE, window_overlap=DEFAULT_WINDOW_OVERLAP,
+                            skip_binary=False, hidden_detector=DEFAULT_HIDDEN_DETECTOR,
+                            hidden_timeout=DEFAULT_HIDDEN_TIMEOUT, byte_scan=False):
+    """
+    从文件中提取链接：不超过一个窗口的文件整体读入，
+    更大的文件按窗口流式扫描，内存占用受 window_size 限制；
+    skip_binary=True 时先嗅探文件头，二进制文件抛出 FileSkipped；byte_scan=True 时按字节扫描，不解码整个文件
+    """
+    with open(file_path, 'rb') as raw:
+        if skip_binary:
+            reason = sniff_binary(raw.read(BINARY_SNIFF_SIZE))
+            if reason:
+                raise FileSkipped(reason)
+            raw.seek(0)
+        return extract_links_from_stream(raw, os.fstat(raw.fileno()).st_size, base_domain, black_patterns,
+                                         window_size, window_overlap, hidden_detector, hidden_timeout, byte_scan)
+
+
+def extract_links_from_stream(raw, size, base_domain=None, black_patterns=None,
+                              window_size=DEFAULT_WINDOW_SIZE, window_overlap=DEFAULT_WINDOW_OVERLAP,
+                              hidden_detector=DEFAULT_HIDDEN_DETECTOR, hidden_timeout=DEFAULT_HIDDEN_TIMEOUT,
+                              byte_scan=False):
+    """
+    从二进制流（已打开的文件或压缩包成员）中提取链接，size 为内容长度：
+    不超过一个窗口的内容整体读入，更大的按窗口流式扫描；
+    byte_scan=False 时按 UTF-8 解码（忽略错误字节）后扫描，True 时直接扫描字节（见 extract_links_bytes）
+    """
+    if byte_scan:
+        f, extract, classify = raw, extract_links_bytes, classify_byte_links
+    else:
+        f, extract, classify = io.TextIOWrapper(raw, encoding='utf-8', errors='ignore'), extract_links, classify_links
+    if not window_size or size <= window_size:
+        if _profiler is None:
+            return extract(f.read(), base_domain, black_patterns, hidden_detector, hidden_timeout)
+        t = time.perf_counter()
+        source_code = f.read()
+        _profiler.stage('read', t)
+        return extract(source_code, base_domain, black_patterns, hidden_detector, hidden_timeout)
+    all_links, hidden_links, domain_tokens = scan_stream(f, window_size, window_overlap,
+                                                         hidden_detector, hidden_timeout)
+    if _profiler is None:
+        return classify(all_links, hidden_links, domain_tokens, base_domain, black_patterns)
+    t = time.perf_counter()
+    results = classify(all_links, hidden_links, domain_tokens, base_domain, black_patterns)
+    _profiler.stage('classify', t)
+    return results
+
+
+def hash_file(file_path, block_size=1024 * 1024):
+    """计算文件内容的 sha256（分块读取）"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def scan_file(file_path, base_domain=None, black_patterns=None, hash_content=False, known_hash=None,
+              result_cache=None, **file_options):
+    """
+    扫描单个文件，返回 (links, meta)。meta 为文件指纹 {'mtime_ns', 'size'[, 'sha256']}，
+    随结果写入进度记录，供后续运行判断文件是否变化；
+    hash_content=True 时先计算内容哈希，与 known_hash 相同则抛出 FileUnchanged，不再重新提取；
+    传入 result_cache 时按内容哈希查结果缓存，命中则不再提取，未命中则提取后写回缓存
+    """
+    st = os.stat(file_path)
+    meta = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+    content_hash = None
+    prof = _profiler
+    if hash_content or result_cache is not None:
+        if prof is not None:
+            t = time.perf_counter()
+        content_hash = hash_file(file_path)
+        if prof is not None:
+            prof.stage('hash', t)
+    if hash_content:
+        meta['sha256'] = content_hash
+        if known_hash and content_hash == known_hash:
+            raise FileUnchanged(meta)
+
+    if result_cache is not None:
+        # 缓存里只有扫描结果，二进制判定仍需在查缓存之前做，保证跳过策略生效
+        if file_options.get('skip_binary'):
+            with open(file_path, 'rb') as raw:
+                reason = sniff_binary(raw.read(BINARY_SNIFF_SIZE))
+            if reason:
+                raise FileSkipped(reason)
+        if prof is not None:
+            t = time.perf_counter()
+        links = result_cache.get(content_hash)
+        if prof is not None:
+            prof.stage('cache', t)
+        if links is not None:
+            return links, meta
+
+    links = extract_links_from_file(file_path, base_domain, black_patterns, **file_options)
+    if result_cache is not None:
+        if prof is not None:
+            t = time.perf_counter()
+        result_cache.put(content_hash, links)
+        if prof is not None:
+            prof.stage('cache', t)
+    return links, meta
+
+
+def classify_links(all_links, hidden_links, domain_tokens, base_domain=None, black_patterns=None, flagged=None):
+    """
+    对提取到的候选链接分类（暗链/外链/内链/其他），并对链接与域名字符串做黑名单匹配；
+    传入 flagged 时不再匹配，flagged 中的候选（字节级扫描时已在原始字节上命中关键字）即为可疑
+    """
+    suspicious_set = set()
+    matcher = get_black_matcher(black_patterns)
+
+    def check_suspicious(candidate):
+        if not candidate or not matcher:
+            return
+        if matcher.search(candidate):
+            suspicious_set.add(candidate.strip())
 
     results = {
         'external_links': [],
@@ -97,23 +1620,6 @@ def extract_links(source_code, base_domain=None, black_patterns=None):
         'suspicious_links': []
     }
 
-    # 可能的暗链模式
-    hidden_link_patterns = [
-        r'display\s*:\s*none[^>]*href=["\']([^"\']+)["\']',
-        r'visibility\s*:\s*hidden[^>]*href=["\']([^"\']+)["\']',
-        r'width\s*:\s*0[^>]*height\s*:\s*0[^>]*href=["\']([^"\']+)["\']',
-        r'opacity\s*:\s*0[^>]*href=["\']([^"\']+)["\']'
-    ]
-
-    hidden_links = set()
-    for pattern in hidden_link_patterns:
-        matches = re.findall(pattern, source_code, re.IGNORECASE)
-        for match in matches:
-            if isinstance(match, tuple) and len(match) > 0:
-                match = match[0]
-            if match:
-                hidden_links.add(match.strip())
-
     base_host = None
     if base_domain:
         try:
@@ -131,7 +1637,10 @@ def extract_links(source_code, base_domain=None, black_patterns=None):
         elif link.startswith('/') and base_domain:
             full_link = base_domain.rstrip('/') + link
 
-        check_suspicious(full_link or link)
+        if flagged is None:
+            check_suspicious(full_link or link)
+        elif link in flagged:
+            suspicious_set.add((full_link or link).strip())
 
         is_external = False
         if base_host and full_link.startswith(('http://', 'https://')):
@@ -153,300 +1662,3645 @@ def extract_links(source_code, base_domain=None, black_patterns=None):
 
     for domain in domain_tokens:
         results['domain_tokens'].append(domain)
-        check_suspicious(domain)
+        if flagged is None:
+            check_suspicious(domain)
+        elif domain in flagged:
+            suspicious_set.add(domain.strip())
+
+    results['external_links'] = sorted(set(results['external_links']))
+    results['possible_hidden_links'] = sorted(set(results['possible_hidden_links']))
+    results['internal_links'] = sorted(set(results['internal_links']))
+    results['other_links'] = sorted(set(results['other_links']))
+    results['domain_tokens'] = sorted(set(results['domain_tokens']))
+    results['suspicious_links'] = sorted(suspicious_set)
+
+    return results
+
+
+def is_source_file(filename, extensions=None, scan_all=False):
+    """
+    判断文件是否需要扫描：
+      - scan_all=True：所有文件都扫
+      - 否则：如果指定了 extensions，则按扩展名过滤；没指定就默认所有
+    """
+    if scan_all:
+        return True
+    if extensions:
+        ext = os.path.splitext(filename)[1].lower()
+        return ext in extensions
+    # 没有指定 extensions，但 scan_all=False 的情况，退回到全扫
+    return True
+
+
+# ===================== 二进制文件识别 =====================
+
+# 嗅探文件头的字节数、判定为二进制的 NUL 字节占比
+BINARY_SNIFF_SIZE = 8192
+BINARY_NUL_RATIO = 0.001
+
+# 常见二进制格式的文件头魔数：(偏移, 魔数, 类型)
+BINARY_MAGIC = [
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'\xff\xd8\xff', 'jpeg'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (0, b'\x00\x00\x01\x00', 'ico'),
+    (0, b'RIFF', 'riff'),           # webp / wav / avi
+    (0, b'%PDF-', 'pdf'),
+    (0, b'PK\x03\x04', 'zip'),      # zip / jar / war / docx
+    (0, b'PK\x05\x06', 'zip'),
+    (0, b'\x1f\x8b', 'gzip'),
+    (0, b'BZh', 'bzip2'),
+    (0, b'\xfd7zXZ\x00', 'xz'),
+    (0, b'7z\xbc\xaf\x27\x1c', '7z'),
+    (0, b'Rar!\x1a\x07', 'rar'),
+    (257, b'ustar', 'tar'),
+    (0, b'\x7fELF', 'elf'),
+    (0, b'MZ', 'exe'),
+    (0, b'\xca\xfe\xba\xbe', 'class'),
+    (0, b'wOFF', 'woff'),
+    (0, b'wOF2', 'woff2'),
+    (0, b'\x00\x01\x00\x00\x00', 'ttf'),
+    (0, b'OTTO', 'otf'),
+    (4, b'ftyp', 'mp4'),
+    (0, b'ID3', 'mp3'),
+    (0, b'OggS', 'ogg'),
+    (0, b'fLaC', 'flac'),
+    (0, b'\x1a\x45\xdf\xa3', 'webm'),
+    (0, b'FLV\x01', 'flv'),
+    (0, b'SQLite format 3\x00', 'sqlite'),
+]
+
+# 跳过原因
+SKIP_TOO_LARGE = 'too_large'
+SKIP_BINARY_NUL = 'binary:nul'
+SKIP_ARCHIVE_DEPTH = 'archive:depth'
+SKIP_ARCHIVE_SIZE = 'archive:size'
+SKIP_ARCHIVE_ENCRYPTED = 'archive:encrypted'
+
+
+class FileSkipped(Exception):
+    """文件按策略被跳过（不是错误），reason 为跳过原因"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class FileUnchanged(Exception):
+    """文件内容与进度记录一致（不是错误），沿用已有结果"""
+
+    def __init__(self, meta):
+        super().__init__('unchanged')
+        self.meta = meta
+
+
+# 文件内容未变化时在结果元组中使用的状态（不计入跳过统计）
+FILE_UNCHANGED = 'unchanged'
+
+
+def sniff_binary(head):
+    """
+    根据文件头判断是否为二进制文件：
+    返回 'binary:<类型>'（命中魔数）、'binary:nul'（NUL 字节占比过高），文本文件返回 None
+    """
+    if not head:
+        return None
+    for offset, magic, kind in BINARY_MAGIC:
+        if head.startswith(magic, offset):
+            return 'binary:' + kind
+    if head.count(b'\x00') > len(head) * BINARY_NUL_RATIO:
+        return SKIP_BINARY_NUL
+    return None
+
+
+def describe_skip_reason(reason):
+    """跳过原因的中文描述"""
+    if reason == SKIP_TOO_LARGE:
+        return '超过大小限制'
+    if reason == SKIP_BINARY_NUL:
+        return '二进制文件（NUL字节占比过高）'
+    if reason == SKIP_ARCHIVE_DEPTH:
+        return '压缩包嵌套层数超过上限'
+    if reason == SKIP_ARCHIVE_SIZE:
+        return '压缩包解压总量超过上限'
+    if reason == SKIP_ARCHIVE_ENCRYPTED:
+        return '加密的压缩包成员'
+    if reason.startswith('binary:'):
+        return f"二进制文件（{reason[len('binary:'):]} 文件头）"
+    return reason
+
+
+def process_single_file(file_path, base_domain, black_patterns=None, known_hash=None, **file_options):
+    """
+    处理单个文件（供多线程使用），返回 (file_path, links, meta, error, skip_reason)：
+    出错时 links 为 None、error 为错误信息；被跳过时 links 为 None 且 skip_reason 为跳过原因；
+    内容哈希与 known_hash 一致时 skip_reason 为 FILE_UNCHANGED。
+    file_options 原样传给 scan_file（窗口大小、是否跳过二进制、是否计算哈希等）
+    """
+    if _profiler is None:
+        return _process_single_file(file_path, base_domain, black_patterns, known_hash, file_options)
+
+    started = time.perf_counter()
+    result = _process_single_file(file_path, base_domain, black_patterns, known_hash, file_options)
+    meta = result[2]
+    _profiler.record_file(file_path, (meta or {}).get('size', 0), time.perf_counter() - started,
+                          result_status(result))
+    return result
+
+
+def result_status(result):
+    """单个结果元组对应的剖析状态（FILE_STATUSES 之一）"""
+    _, _, _, error, skip_reason = result
+    if error is not None:
+        return 'error'
+    if skip_reason == FILE_UNCHANGED:
+        return 'unchanged'
+    if skip_reason:
+        return 'skipped'
+    return 'ok'
+
+
+def _process_single_file(file_path, base_domain, black_patterns, known_hash, file_options):
+    try:
+        links, meta = scan_file(file_path, base_domain, black_patterns, known_hash=known_hash, **file_options)
+        return (file_path, links, meta, None, None)
+    except FileUnchanged as e:
+        return (file_path, None, e.meta, None, FILE_UNCHANGED)
+    except FileSkipped as e:
+        return (file_path, None, None, None, e.reason)
+    except Exception as e:
+        return (file_path, None, None, str(e), None)
+
+
+def report_file_status(done, found, file_path, error=None, skip_reason=None):
+    """输出单个文件的处理状态；found 为目前已发现的待处理文件数（目录遍历结束前会继续增长）"""
+    with print_lock:
+        if skip_reason == FILE_UNCHANGED:
+            print(f"[{done}/{found}] 内容未变化: {file_path}")
+        elif skip_reason:
+            print(f"[{done}/{found}] 跳过: {file_path}（{describe_skip_reason(skip_reason)}）")
+        elif error is None:
+            print(f"[{done}/{found}] 已处理: {file_path}")
+        else:
+            print(f"[{done}/{found}] 处理文件 {file_path} 时出错: {error}")
+
+
+def report_archive_status(archive_path, error=None, skip_reason=None):
+    """输出压缩包本身（而不是其中的文件）出错或被跳过的原因，不带文件计数"""
+    with print_lock:
+        if skip_reason:
+            print(f"[!] 跳过压缩包: {archive_path}（{describe_skip_reason(skip_reason)}）")
+        else:
+            print(f"[!] 处理压缩包 {archive_path} 时出错: {error}")
+
+
+# ===================== 压缩包扫描 =====================
+
+# 压缩包成员的键：<压缩包路径>!/<成员路径>，嵌套的压缩包依次拼接（如 site.war!/WEB-INF/lib/a.jar!/x.html），
+# 结果与进度记录都以成员为单位；压缩包本身的记录键为 <压缩包路径>!/（只保存指纹，提取结果为空）
+ARCHIVE_SEPARATOR = '!/'
+
+# 按扩展名识别的压缩包类型（jar/war/ear 均为 zip 格式；tar 支持 gzip/bzip2/xz 压缩）
+ARCHIVE_SUFFIXES = (
+    ('.zip', 'zip'), ('.jar', 'zip'), ('.war', 'zip'), ('.ear', 'zip'),
+    ('.tar', 'tar'), ('.tar.gz', 'tar'), ('.tgz', 'tar'), ('.tar.bz2', 'tar'), ('.tbz2', 'tar'),
+    ('.tar.xz', 'tar'), ('.txz', 'tar'),
+)
+
+# 嵌套层数上限（1 表示只展开顶层压缩包，不再打开其中的压缩包）、单个顶层压缩包的解压总量上限
+DEFAULT_ARCHIVE_DEPTH = 3
+DEFAULT_ARCHIVE_MAX_SIZE = 1024 * 1024 * 1024
+
+# 嵌套的 zip 需要随机访问、需要先算内容哈希的成员需要读两遍，这两种情况先放进缓冲：
+# 不超过该大小时在内存中，否则落到临时文件
+ARCHIVE_SPOOL_SIZE = 16 * 1024 * 1024
+
+# 读取损坏或格式不支持的压缩包时可能出现的异常
+ARCHIVE_ERRORS = (OSError, EOFError, zipfile.BadZipFile, zipfile.LargeZipFile, tarfile.TarError,
+                  NotImplementedError, RuntimeError)
+
+# 压缩包中已不存在的成员：结果写入端据此删除旧记录（不输出状态、不计入跳过统计）
+MEMBER_REMOVED = 'removed'
+
+def archive_kind(file_path):
+    """按扩展名判断压缩包类型：'zip' / 'tar'，不是支持的压缩包时返回 None"""
+    name = file_path.lower()
+    for suffix, kind in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return kind
+    return None
+
+
+def archive_outer_path(key):
+    """成员键所在的磁盘文件（最外层压缩包）路径；普通文件路径原样返回"""
+    return key.split(ARCHIVE_SEPARATOR, 1)[0]
+
+
+def is_archive_record(key):
+    """是否为压缩包本身（含嵌套压缩包）的记录：键以 !/ 结尾，只保存指纹，不是需要计数或报告的文件"""
+    return key.endswith(ARCHIVE_SEPARATOR)
+
+
+def is_archive_member(key):
+    """是否为压缩包中的成员（含嵌套压缩包本身的记录，不含顶层压缩包本身的记录）"""
+    if key.endswith(ARCHIVE_SEPARATOR):
+        key = key[:-len(ARCHIVE_SEPARATOR)]
+    return ARCHIVE_SEPARATOR in key
+
+
+class ArchiveLimitExceeded(FileSkipped):
+    """解压总量超过上限（压缩炸弹或超大备份），该压缩包剩余部分不再扫描"""
+
+    def __init__(self):
+        super().__init__(SKIP_ARCHIVE_SIZE)
+
+
+class _MemberReader(io.RawIOBase):
+    """压缩包成员的只读流：读出的字节都计入所属顶层压缩包的解压总量，超过上限时抛出 ArchiveLimitExceeded"""
+
+    def __init__(self, stream, scanner):
+        self._stream = stream
+        self._scanner = scanner
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._stream.read(len(b))
+        n = len(data)
+        self._scanner.consume(n)
+        b[:n] = data
+        return n
+
+
+def _open_member_reader(open_member, scanner):
+    """打开成员并包装成带缓冲、计入解压总量的流（缓冲不小于嗅探长度，peek 即可拿到完整文件头）"""
+    return io.BufferedReader(_MemberReader(open_member(), scanner), max(io.DEFAULT_BUFFER_SIZE, BINARY_SNIFF_SIZE))
+
+
+def _spool_member(reader, hasher=None):
+    """把成员内容读进可随机访问的缓冲（超过 ARCHIVE_SPOOL_SIZE 时改用临时文件），可顺带计算哈希"""
+    buf = io.BytesIO()
+    while True:
+        block = reader.read(1024 * 1024)
+        if not block:
+            break
+        if hasher is not None:
+            hasher.update(block)
+        if isinstance(buf, io.BytesIO) and buf.tell() + len(block) > ARCHIVE_SPOOL_SIZE:
+            spilled = tempfile.TemporaryFile()
+            spilled.write(buf.getbuffer())
+            buf = spilled
+        buf.write(block)
+    buf.seek(0)
+    return buf
+
+
+def _open_archive(source, kind):
+    """打开压缩包：source 为磁盘路径或二进制流；tar 以流模式打开，按顺序读取，不需要随机访问"""
+    if kind == 'zip':
+        return zipfile.ZipFile(source)
+    if isinstance(source, str):
+        return tarfile.open(source, mode='r|*')
+    return tarfile.open(fileobj=source, mode='r|*')
+
+
+def _zip_mtime_ns(date_time):
+    try:
+        return calendar.timegm(date_time + (0, 0, 0)) * 1_000_000_000
+    except (ValueError, OverflowError):
+        return 0
+
+
+def _iter_archive_members(archive, kind):
+    """
+    逐个产出压缩包中的普通文件 (name, size, mtime_ns, open_member, encrypted)，跳过目录、链接与设备文件；
+    tar 为流模式，open_member 只能在产出该成员时调用
+    """
+    if kind == 'zip':
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            yield (info.filename.lstrip('/'), info.file_size, _zip_mtime_ns(info.date_time),
+                   lambda info=info: archive.open(info), bool(info.flag_bits & 0x1))
+    else:
+        for member in archive:
+            if not member.isfile():
+                continue
+            name = member.name[2:] if member.name.startswith('./') else member.name
+            yield (name.lstrip('/'), member.size, int(member.mtime * 1_000_000_000),
+                   lambda member=member: archive.extractfile(member), False)
+
+
+def empty_links():
+    """没有任何发现的提取结果（压缩包本身的记录使用：只保存指纹，下次运行时指纹未变化的压缩包整体沿用）"""
+    return {key: [] for key in LINK_KEYS}
+
+
+def _member_unchanged(known, meta):
+    return bool(known) and known.get('mtime_ns') == meta['mtime_ns'] and known.get('size') == meta['size']
+
+
+class ArchiveScanner:
+    """
+    不解压到磁盘地扫描一个压缩包（含嵌套的压缩包），成员逐个流式读出交给提取逻辑：
+      - 每个成员一条结果，键为 压缩包路径!/成员路径，指纹为成员记录的 mtime 与解压后大小
+      - known_members 为进度库中已有的成员指纹 {key: meta}：指纹未变化的成员（及嵌套压缩包）不再读取、不产出结果，
+        中断后重新运行时已写入进度库的成员不会重复扫描
+      - max_depth 为嵌套层数上限，max_size 为整个顶层压缩包解压出的字节数上限（超过后停止扫描剩余部分）
+      - 成员按 extensions / scan_all 过滤，解压后超过 max_file_size 的成员跳过；file_options 与 scan_file 相同
+    """
+
+    def __init__(self, base_domain=None, black_patterns=None, known_members=None,
+                 max_depth=DEFAULT_ARCHIVE_DEPTH, max_size=DEFAULT_ARCHIVE_MAX_SIZE,
+                 extensions=None, scan_all=False, max_file_size=None, **file_options):
+        self.base_domain = base_domain
+        self.black_patterns = black_patterns
+        self.known = known_members or {}
+        self.max_depth = max(1, max_depth)
+        self.max_size = max_size
+        self.extensions = extensions
+        self.scan_all = scan_all
+        self.max_file_size = max_file_size
+        self.hash_content = file_options.pop('hash_content', False)
+        self.result_cache = file_options.pop('result_cache', None)
+        self.skip_binary = file_options.pop('skip_binary', False)
+        self.extract_options = file_options
+        self.consumed = 0
+        self._results = []
+        self._seen = set()
+        self._kept = []
+
+    def consume(self, n):
+        """累计解压出的字节数，超过上限时抛出 ArchiveLimitExceeded"""
+        self.consumed += n
+        if self.max_size and self.consumed > self.max_size:
+            raise ArchiveLimitExceeded()
+
+    def scan(self, archive_path):
+        """
+        扫描磁盘上的压缩包，返回 [(key, links, meta, error, skip_reason), ...]，与 process_single_file 的结果格式相同；
+        本次已不存在的成员产出 skip_reason 为 MEMBER_REMOVED 的结果。最后一项是压缩包本身：
+        正常时键为 archive_path!/、links 为空结果、meta 为压缩包指纹；压缩包损坏或超过解压上限时键为 archive_path，
+        为错误/跳过，不记录指纹，下次运行会重新打开（已完成的成员仍按指纹跳过）
+        """
+        st = os.stat(archive_path)
+        meta = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+        container = archive_path + ARCHIVE_SEPARATOR
+        self._seen.add(container)
+        try:
+            self._scan_archive(archive_path, archive_kind(archive_path), archive_path, 1)
+        except FileSkipped as e:
+            self._results.append((archive_path, None, None, None, e.reason))
+            return self._results
+        except Exception as e:
+            self._results.append((archive_path, None, None, str(e), None))
+            return self._results
+
+        for key in self.known:
+            if key not in self._seen and not key.startswith(tuple(self._kept)):
+                self._results.append((key, None, None, None, MEMBER_REMOVED))
+        self._results.append((container, empty_links(), meta, None, None))
+        return self._results
+
+    def _scan_archive(self, source, kind, prefix, depth):
+        with _open_archive(source, kind) as archive:
+            for name, size, mtime_ns, open_member, encrypted in _iter_archive_members(archive, kind):
+                key = prefix + ARCHIVE_SEPARATOR + name
+                nested = archive_kind(name)
+                if not nested and not is_source_file(name, self.extensions, self.scan_all):
+                    continue
+                if nested:
+                    key += ARCHIVE_SEPARATOR
+                self._seen.add(key)
+                meta = {'mtime_ns': mtime_ns, 'size': size}
+                known = self.known.get(key)
+                unchanged = _member_unchanged(known, meta)
+                if encrypted:
+                    self._results.append((key, None, None, None, SKIP_ARCHIVE_ENCRYPTED))
+                elif nested:
+                    if unchanged and not self.hash_content:
+                        # 指纹未变化的嵌套压缩包连同其中的成员整体沿用
+                        self._kept.append(key)
+                    elif depth >= self.max_depth:
+                        self._results.append((key, None, None, None, SKIP_ARCHIVE_DEPTH))
+                    else:
+                        self._scan_nested(open_member, nested, key, depth + 1, meta)
+                elif self.max_file_size and size > self.max_file_size:
+                    self._results.append((key, None, None, None, SKIP_TOO_LARGE))
+                elif not unchanged or self.hash_content:
+                    known_hash = known.get('sha256') if unchanged else None
+                    self._scan_member(key, open_member, meta, known_hash)
+
+    def _scan_nested(self, open_member, kind, key, depth, meta):
+        prefix = key[:-len(ARCHIVE_SEPARATOR)]
+        try:
+            with _open_member_reader(open_member, self) as reader:
+                # zip 的目录在文件末尾，需要先读进可随机访问的缓冲；tar 直接按顺序读
+                if kind == 'zip':
+                    with _spool_member(reader) as spool:
+                        self._scan_archive(spool, kind, prefix, depth)
+                else:
+                    self._scan_archive(reader, kind, prefix, depth)
+        except ArchiveLimitExceeded:
+            raise
+        except Exception as e:
+            self._results.append((key, None, None, str(e), None))
+            return
+        self._results.append((key, empty_links(), meta, None, None))
+
+    def _scan_member(self, key, open_member, meta, known_hash):
+        started = time.perf_counter()
+        try:
+            with _open_member_reader(open_member, self) as reader:
+                result = (key, self._extract(reader, meta, known_hash), meta, None, None)
+        except ArchiveLimitExceeded:
+            raise
+        except FileUnchanged as e:
+            result = (key, None, e.meta, None, FILE_UNCHANGED)
+        except FileSkipped as e:
+            result = (key, None, None, None, e.reason)
+        except Exception as e:
+            result = (key, None, None, str(e), None)
+        if _profiler is not None:
+            _profiler.record_file(key, meta['size'], time.perf_counter() - started, result_status(result))
+        self._results.append(result)
+
+    def _extract(self, reader, meta, known_hash):
+        """与 scan_file 相同的逻辑：二进制嗅探 → 内容哈希比对 / 结果缓存 → 流式提取"""
+        if self.skip_binary:
+            reason = sniff_binary(reader.peek(BINARY_SNIFF_SIZE)[:BINARY_SNIFF_SIZE])
+            if reason:
+                raise FileSkipped(reason)
+        if not self.hash_content and self.result_cache is None:
+            return extract_links_from_stream(reader, meta['size'], self.base_domain, self.black_patterns,
+                                             **self.extract_options)
+
+        hasher = hashlib.sha256()
+        with _spool_member(reader, hasher) as spool:
+            content_hash = hasher.hexdigest()
+            if self.hash_content:
+                meta['sha256'] = content_hash
+                if known_hash and content_hash == known_hash:
+                    raise FileUnchanged(meta)
+            if self.result_cache is not None:
+                links = self.result_cache.get(content_hash)
+                if links is not None:
+                    return links
+            links = extract_links_from_stream(spool, meta['size'], self.base_domain, self.black_patterns,
+                                              **self.extract_options)
+        if self.result_cache is not None:
+            self.result_cache.put(content_hash, links)
+        return links
+
+
+def process_archive(archive_path, base_domain, black_patterns=None, known_members=None, archive_options=None,
+                    **file_options):
+    """
+    处理单个压缩包（供线程/进程池使用），返回其中每个成员的结果列表，格式同 process_single_file；
+    archive_options 为 ArchiveScanner 的限制与过滤参数（max_depth / max_size / extensions / scan_all / max_file_size）
+    """
+    scanner = ArchiveScanner(base_domain, black_patterns, known_members, **(archive_options or {}), **file_options)
+    return scanner.scan(archive_path)
+
+
+def iter_archive_members(archive_path, max_depth=DEFAULT_ARCHIVE_DEPTH, extensions=None, scan_all=False):
+    """
+    列出压缩包中需要扫描的成员键（含 max_depth 层以内的嵌套压缩包），不提取内容；
+    嵌套的压缩包需要读出才能列出其成员，损坏的压缩包不产出成员
+    """
+    scanner = ArchiveScanner(max_depth=max_depth, max_size=None, extensions=extensions, scan_all=scan_all)
+
+    def walk(source, kind, prefix, depth):
+        with _open_archive(source, kind) as archive:
+            for name, _, _, open_member, _ in _iter_archive_members(archive, kind):
+                key = prefix + ARCHIVE_SEPARATOR + name
+                nested = archive_kind(name)
+                if nested and depth < max_depth:
+                    try:
+                        with _open_member_reader(open_member, scanner) as reader:
+                            if nested == 'zip':
+                                with _spool_member(reader) as spool:
+                                    yield from walk(spool, nested, key, depth + 1)
+                            else:
+                                yield from walk(reader, nested, key, depth + 1)
+                    except ARCHIVE_ERRORS:
+                        continue
+                elif not nested and is_source_file(name, extensions, scan_all):
+                    yield key
+
+    try:
+        yield from walk(archive_path, archive_kind(archive_path), archive_path, 1)
+    except ARCHIVE_ERRORS:
+        return
+
+
+# ===================== 目录遍历 =====================
+
+# 并行列目录的默认线程数（os.scandir 在系统调用期间释放 GIL，NFS 等高延迟文件系统上收益明显）
+DEFAULT_WALK_WORKERS = 4
+
+# 每个目录的文件列表按批放入输出队列；队列有上限，消费跟不上时遍历线程会等待
+_WALK_QUEUE_SIZE = 1024
+_WALK_DONE = object()
+
+
+def compile_exclude_globs(exclude_globs):
+    """
+    把 --exclude 的 glob 列表编译成判断函数 excluded(rel_path, name)：
+      - 不含 '/' 的模式匹配文件/目录名本身（如 node_modules、.git、*.bak）
+      - 含 '/' 的模式匹配相对于扫描根目录的路径（如 uploads/cache、backup/*）
+    没有模式时返回 None
+    """
+    name_patterns = []
+    path_patterns = []
+    for pattern in exclude_globs or []:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        if '/' in pattern.strip('/'):
+            path_patterns.append(fnmatch.translate(pattern.strip('/')))
+        else:
+            name_patterns.append(fnmatch.translate(pattern.strip('/')))
+    if not name_patterns and not path_patterns:
+        return None
+    name_re = re.compile('|'.join(name_patterns)) if name_patterns else None
+    path_re = re.compile('|'.join(path_patterns)) if path_patterns else None
+
+    def excluded(rel_path, name):
+        return bool((name_re and name_re.match(name)) or (path_re and path_re.match(rel_path)))
+    return excluded
+
+
+def _scan_directory(directory, root, recursive, extensions, scan_all, exclude_set, excluded, archives=False):
+    """
+    列出单个目录：返回 (文件列表 [(file_path, stat_result)], 子目录列表)。
+    stat 结果来自 DirEntry（能复用 d_type 时不再额外 stat），排除规则在这里就剪掉整棵子树；
+    archives=True 时支持的压缩包不受扩展名过滤（其中的成员在扫描时再按扩展名过滤）
+    """
+    files = []
+    subdirs = []
+    rel_dir = os.path.relpath(directory, root).replace(os.sep, '/')
+    rel_prefix = '' if rel_dir == '.' else rel_dir + '/'
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                file_path = os.path.join(directory, entry.name)
+                if excluded is not None and excluded(rel_prefix + entry.name, entry.name):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # 与 os.walk 一致：不跟随指向目录的符号链接
+                    if recursive and not entry.is_symlink():
+                        subdirs.append(file_path)
+                    continue
+
+                # 关键：跳过进度文件（以及未来你想排除的其他文件）
+                if file_path in exclude_set:
+                    continue
+                if not is_source_file(entry.name, extensions, scan_all) and not (archives and archive_kind(entry.name)):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files.append((file_path, st))
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def iter_files(directory, recursive=False, extensions=None, scan_all=False,
+               exclude_paths=None, exclude_globs=None, workers=DEFAULT_WALK_WORKERS, archives=False):
+    """
+    基于 os.scandir 的目录遍历，边遍历边产出 (file_path, stat_result)（统一使用绝对路径）：
+      - workers > 1 时由多个线程并行列目录，产出顺序不固定
+      - exclude_paths 为需要跳过的具体文件，exclude_globs 为 --exclude 模式（命中的目录整棵剪掉）
+      - archives=True 时支持的压缩包（见 ARCHIVE_SUFFIXES）不论扩展名过滤都会产出
+    """
+    root = os.path.abspath(directory)
+    exclude_set = {os.path.abspath(p) for p in exclude_paths} if exclude_paths else set()
+    excluded = compile_exclude_globs(exclude_globs)
+    args = (root, recursive, extensions, scan_all, exclude_set, excluded, archives)
+
+    if workers <= 1 or not recursive:
+        stack = [root]
+        while stack:
+            files, subdirs = _scan_directory(stack.pop(), *args)
+            yield from files
+            stack.extend(reversed(subdirs))
+        return
+
+    dir_queue = queue.Queue()
+    out_queue = queue.Queue(maxsize=_WALK_QUEUE_SIZE)
+    state_lock = threading.Lock()
+    state = {'pending': 1}
+    stop = threading.Event()
+
+    def emit(item):
+        while not stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def walk_worker():
+        while True:
+            current = dir_queue.get()
+            if current is None:
+                return
+            files, subdirs = ([], []) if stop.is_set() else _scan_directory(current, *args)
+            # 先交出文件再更新计数，保证结束标记一定排在所有文件之后
+            if files:
+                emit(files)
+            with state_lock:
+                state['pending'] += len(subdirs) - 1
+                finished = state['pending'] == 0
+            for sub in subdirs:
+                dir_queue.put(sub)
+            if finished:
+                emit(_WALK_DONE)
+
+    threads = [threading.Thread(target=walk_worker, name=f'walker-{i}', daemon=True) for i in range(workers)]
+    for t in threads:
+        t.start()
+    dir_queue.put(root)
+    try:
+        while True:
+            batch = out_queue.get()
+            if batch is _WALK_DONE:
+                break
+            yield from batch
+    finally:
+        # 消费方提前退出时也要让遍历线程尽快结束
+        stop.set()
+        for _ in threads:
+            dir_queue.put(None)
+        try:
+            while True:
+                out_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+
+def collect_files(directory, recursive=False, extensions=None, scan_all=False,
+                  exclude_paths=None, exclude_globs=None, workers=DEFAULT_WALK_WORKERS,
+                  archives=False, archive_depth=DEFAULT_ARCHIVE_DEPTH):
+    """
+    收集需要处理的所有文件（统一使用绝对路径），可以排除指定路径与 --exclude 模式；
+    archives=True 时压缩包视为虚拟目录，展开为其中成员的键（压缩包路径!/成员路径）
+    """
+    files = []
+    for file_path, _ in iter_files(directory, recursive, extensions, scan_all,
+                                   exclude_paths, exclude_globs, workers, archives):
+        if archives and archive_kind(file_path):
+            files.extend(iter_archive_members(file_path, archive_depth, extensions, scan_all))
+        else:
+            files.append(file_path)
+    return files
+
+
+# ===================== 多进程扫描引擎 =====================
+
+# 每个进程任务（chunk）最多包含的文件数 / 文件总字节数，小文件合批以降低进程间通信开销
+PROCESS_CHUNK_FILES = 64
+PROCESS_CHUNK_BYTES = 8 * 1024 * 1024
+
+# 结果字典的键顺序：进程间只传递按该顺序排列的列表元组，由父进程还原成字典
+LINK_KEYS = (
+    'external_links',
+    'possible_hidden_links',
+    'internal_links',
+    'other_links',
+    'domain_tokens',
+    'suspicious_links',
+)
+
+# 工作进程内的黑名单匹配器（由进程初始化函数构建，每个进程只构建一次）
+_worker_black_matcher = None
+
+
+def pack_links(links):
+    """将 extract_links 的结果字典压缩为按 LINK_KEYS 排列的元组"""
+    return tuple(links[key] for key in LINK_KEYS)
+
+
+def unpack_links(packed):
+    """pack_links 的逆操作"""
+    return dict(zip(LINK_KEYS, packed))
+
+
+def chunk_files(tasks, max_files=PROCESS_CHUNK_FILES, max_bytes=PROCESS_CHUNK_BYTES):
+    """
+    按文件数与总字节数把待处理任务 (file_path, size, known_hash, known_members) 切分成批次，超大文件单独成批；
+    逐批产出 [(file_path, known_hash, known_members), ...]，不会一次性读完 tasks
+    """
+    chunk = []
+    chunk_bytes = 0
+    for file_path, size, known_hash, known_members in tasks:
+        if chunk and (len(chunk) >= max_files or chunk_bytes + size > max_bytes):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append((file_path, known_hash, known_members))
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def iter_bounded(executor, fn, args_iter, max_in_flight):
+    """
+    有界提交：从 args_iter 逐个取参数提交 fn(*args)，同时在途的任务不超过 max_in_flight 个，
+    按完成顺序产出结果。上游（目录遍历）与下游（结果写入）都是流式的，内存占用不随文件总数增长
+    """
+    in_flight = set()
+    for args in args_iter:
+        in_flight.add(executor.submit(fn, *args))
+        if len(in_flight) >= max_in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    while in_flight:
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def _init_process_worker(tlds, black_patterns, profile_top=None):
+    """
+    工作进程初始化：同步父进程的 TLD 列表，并构建一次黑名单匹配器（正则在模块导入时已编译）；
+    父进程开启了剖析时（profile_top 不为 None）工作进程也开启
+    """
+    global _worker_black_matcher
+    set_tld_list(tlds)
+    _worker_black_matcher = get_black_matcher(black_patterns)
+    if profile_top is not None:
+        enable_profiler(profile_top)
+
+
+def process_task(file_path, base_domain, black_patterns, known_hash=None, known_members=None,
+                 file_options=None, archive_options=None):
+    """
+    处理一个扫描任务，返回结果列表：普通文件只有一个结果（见 process_single_file），
+    压缩包（known_members 不为 None）为其中每个成员的结果（见 process_archive）
+    """
+    if known_members is None:
+        return [process_single_file(file_path, base_domain, black_patterns, known_hash, **(file_options or {}))]
+    return process_archive(file_path, base_domain, black_patterns, known_members, archive_options,
+                           **(file_options or {}))
+
+
+def _process_file_chunk(chunk, base_domain, file_options, archive_options=None):
+    """
+    工作进程中处理一批文件（[(file_path, known_hash, known_members), ...]），返回 (results, profile)：
+    results 为 [(file_path, packed_links 或 None, meta 或 None, 错误信息 或 None, 跳过原因 或 None), ...]，
+    profile 为本批的剖析数据（未开启剖析时为 None）
+    """
+    results = []
+    for file_path, known_hash, known_members in chunk:
+        for file_path, links, meta, error, skip_reason in process_task(
+                file_path, base_domain, _worker_black_matcher, known_hash, known_members,
+                file_options, archive_options):
+            results.append((file_path, pack_links(links) if links is not None else None, meta, error,
+                            skip_reason))
+    return results, (_profiler.drain() if _profiler is not None else None)
+
+
+def iter_process_results(tasks, base_domain, black_patterns, max_workers, file_options=None,
+                         archive_options=None):
+    """
+    多进程扫描：tasks 为 (file_path, size, known_hash, known_members) 的可迭代对象，按批次分发到工作进程，
+    逐个产出 (file_path, links, meta, error, skip_reason)；在途批次数有上限，进度输出与结果写入都留在父进程
+    """
+    file_options = file_options or {}
+    max_bytes = max(PROCESS_CHUNK_BYTES, file_options.get('window_size') or 0)
+    profile_top = _profiler.top if _profiler is not None else None
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_process_worker,
+        initargs=(list(_TLD_RANK), get_black_matcher(black_patterns), profile_top)
+    ) as executor:
+        chunk_args = ((chunk, base_domain, file_options, archive_options)
+                      for chunk in chunk_files(tasks, max_bytes=max_bytes))
+        for results, profile in iter_bounded(executor, _process_file_chunk, chunk_args, max_workers * 2):
+            if profile is not None:
+                _profiler.merge(profile)
+            for file_path, packed, meta, error, skip_reason in results:
+                links = unpack_links(packed) if packed is not None else None
+                yield file_path, links, meta, error, skip_reason
+
+
+def iter_thread_results(tasks, base_domain, black_patterns, max_workers, file_options=None,
+                        archive_options=None):
+    """
+    多线程扫描：tasks 为 (file_path, size, known_hash, known_members) 的可迭代对象，每个文件（压缩包）一个任务，
+    在途任务数有上限，逐个产出 (file_path, links, meta, error, skip_reason)
+    """
+    file_options = file_options or {}
+    matcher = get_black_matcher(black_patterns)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        file_args = (
+            (file_path, base_domain, matcher, known_hash, known_members, file_options, archive_options)
+            for file_path, _, known_hash, known_members in tasks
+        )
+        for results in iter_bounded(executor, process_task, file_args, max_workers * 4):
+            yield from results
+
+
+# ===================== 内容寻址结果缓存 =====================
+
+# 结果缓存的默认位置与大小上限；缓存跨目录、跨运行共享
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'scan_blacklink'
+)
+DEFAULT_RESULT_CACHE = os.path.join(CACHE_DIR, 'result_cache.sqlite3')
+DEFAULT_RESULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# 提取/分类逻辑发生不兼容变化时递增，旧缓存条目自动失效
+RESULT_CACHE_VERSION = 1
+
+# 每写入多少条检查一次缓存总大小，超过上限时按最近使用时间淘汰到上限的 90%
+RESULT_CACHE_EVICT_EVERY = 64
+
+
+def result_cache_scope(base_domain=None, black_patterns=None, hidden_detector=DEFAULT_HIDDEN_DETECTOR,
+                       byte_scan=False):
+    """
+    计算缓存作用域：基础域名、黑名单、TLD 列表、暗链检测方式和是否按字节扫描都会影响分类结果，
+    它们（连同缓存版本号）的摘要作为缓存键的一部分
+    """
+    matcher = get_black_matcher(black_patterns)
+    scope = {
+        'version': RESULT_CACHE_VERSION,
+        'base_domain': base_domain or '',
+        'black_patterns': sorted(matcher.patterns) if matcher else [],
+        'tlds': sorted(_TLD_RANK),
+        'hidden_detector': hidden_detector,
+    }
+    if byte_scan:
+        # 只在开启时加入，不影响已有缓存条目
+        scope['byte_scan'] = True
+    return hashlib.sha256(json.dumps(scope, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class SQLiteCache:
+    """
+    SQLite 文件缓存的公共部分（结果缓存与探测缓存共用）：
+      - 每个线程/进程使用独立连接（WAL 模式），多个扫描同时运行也可共用同一个缓存文件
+      - 每条记录带 size 与 last_used，总大小超过 max_size 字节后按最近使用时间（LRU）淘汰
+    子类通过 TABLE / SCHEMA 声明表结构
+    """
+
+    TABLE = None
+    SCHEMA = ()
+
+    def __init__(self, path, max_size):
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self._local = threading.local()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._local.conn = conn
+            self._local.puts = 0
+        return conn
+
+    def _count_put(self, count=1):
+        """记录写入条数，每 RESULT_CACHE_EVICT_EVERY 条检查一次大小上限"""
+        before = self._local.puts
+        self._local.puts += count
+        if before // RESULT_CACHE_EVICT_EVERY != self._local.puts // RESULT_CACHE_EVICT_EVERY:
+            self.evict()
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的条目开始删除，直到不超过上限的 90%"""
+        if not self.max_size:
+            return
+        conn = self._connect()
+        total = conn.execute(f'SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}').fetchone()[0]
+        if total <= self.max_size:
+            return
+        target = int(self.max_size * 0.9)
+        doomed = []
+        for rowid, size in conn.execute(f'SELECT rowid, size FROM {self.TABLE} ORDER BY last_used'):
+            if total <= target:
+                break
+            doomed.append((rowid,))
+            total -= size
+        conn.executemany(f'DELETE FROM {self.TABLE} WHERE rowid = ?', doomed)
+        conn.commit()
+
+    def stats(self):
+        """返回 (条目数, 总大小字节)"""
+        try:
+            return self._connect().execute(
+                f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.TABLE}'
+            ).fetchone()
+        except sqlite3.Error:
+            return (0, 0)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class ResultCache(SQLiteCache):
+    """
+    以 (文件内容 sha256, 作用域摘要) 为键的提取结果缓存，存放在 SQLite 文件中：
+      - 内容相同的文件（如各处重复的 jQuery/Bootstrap/主题文件）只提取一次
+      - 总大小超过 max_size 字节后按最近使用时间（LRU）淘汰
+      - 缓存读写失败只当作未命中，不影响扫描本身
+    """
+
+    TABLE = 'results'
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS results ('
+        ' content_hash TEXT NOT NULL, scope TEXT NOT NULL, links TEXT NOT NULL,'
+        ' size INTEGER NOT NULL, last_used REAL NOT NULL,'
+        ' PRIMARY KEY (content_hash, scope))',
+        'CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)',
+    )
+
+    def __init__(self, path=DEFAULT_RESULT_CACHE, max_size=DEFAULT_RESULT_CACHE_SIZE, scope=''):
+        super().__init__(path, max_size)
+        self.scope = scope
+
+    def __reduce__(self):
+        # 传给工作进程时只传配置，连接在进程内重新建立
+        return (ResultCache, (self.path, self.max_size, self.scope))
+
+    def set_scope(self, base_domain=None, black_patterns=None, hidden_detector=DEFAULT_HIDDEN_DETECTOR,
+                  byte_scan=False):
+        self.scope = result_cache_scope(base_domain, black_patterns, hidden_detector, byte_scan)
+
+    def get(self, content_hash):
+        """按内容哈希查找结果，未命中返回 None"""
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT links FROM results WHERE content_hash = ? AND scope = ?',
+                (content_hash, self.scope)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE results SET last_used = ? WHERE content_hash = ? AND scope = ?',
+                (time.time(), content_hash, self.scope)
+            )
+            conn.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def put(self, content_hash, links):
+        """写入一条结果，并定期检查是否需要淘汰"""
+        data = json.dumps(links, ensure_ascii=False)
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO results (content_hash, scope, links, size, last_used)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (content_hash, self.scope, data, len(data), time.time())
+            )
+            conn.commit()
+            self._count_put()
+        except sqlite3.Error:
+            pass
+
+
+# ===================== 断点续跑相关函数 =====================
+
+# 默认的进度库文件名（放在目标目录下）与旧版 JSONL 进度文件名
+DEFAULT_PROGRESS_FILE = '.url_extraction_progress.sqlite3'
+LEGACY_PROGRESS_FILE = '.url_extraction_progress.jsonl'
+
+# 后台写入线程的默认批量大小、最长提交间隔（秒）与同步策略
+DEFAULT_PROGRESS_BATCH = 500
+DEFAULT_PROGRESS_FLUSH = 1.0
+PROGRESS_SYNC_MODES = ('off', 'normal', 'full')
+PROGRESS_JOURNAL_MODES = ('wal', 'delete')
+# 按路径分页读取进度库时每页的记录数
+ITER_PAGE_SIZE = 1000
+
+
+def prefix_upper_bound(prefix):
+    """以 prefix 开头的字符串的（不含）上界：把最后一个字符加一，配合 >= prefix 做主键范围查询"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class ProgressStore:
+    """
+    基于 SQLite 的进度库：每个文件一行（路径为主键），保存分析结果与文件指纹。
+      - 写入（put/delete）只是放进队列，由后台线程按批提交：
+        攒满 batch_size 条或距上次提交超过 flush_interval 秒时提交一次事务
+      - sync 对应 SQLite 的 synchronous 设置：off 不主动 fsync，normal 在 WAL 检查点时 fsync，
+        full 每次提交都 fsync（最安全也最慢）
+      - journal_mode 默认 wal；放在网络文件系统上、可能被其他主机打开的进度库（分片进度库）
+        无法使用 WAL 依赖的共享内存，需使用 delete（回滚日志）
+      - 断点续跑时按路径逐个查询指纹（get_meta），不需要把全部历史记录读进内存
+      - 清理已删除文件的记录不逐条 stat：begin_scan 开始一轮扫描后，遍历到的文件用 mark_seen 打上本轮编号，
+        完整遍历后 delete_unseen 用一条 DELETE 删掉没打上编号的记录
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_PROGRESS_BATCH, flush_interval=DEFAULT_PROGRESS_FLUSH,
+                 sync='normal', journal_mode='wal'):
+        if sync not in PROGRESS_SYNC_MODES:
+            raise ValueError(f"未知的同步策略: {sync}")
+        if journal_mode not in PROGRESS_JOURNAL_MODES:
+            raise ValueError(f"未知的日志模式: {journal_mode}")
+        self.journal_mode = journal_mode
+        self.path = os.path.abspath(path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.sync = sync
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        self._reader.execute(
+            'CREATE TABLE IF NOT EXISTS progress ('
+            ' path TEXT PRIMARY KEY, links TEXT NOT NULL,'
+            ' mtime_ns INTEGER, size INTEGER, sha256 TEXT, scan_id INTEGER)'
+        )
+        columns = {row[1] for row in self._reader.execute('PRAGMA table_info(progress)')}
+        if 'scan_id' not in columns:
+            # 旧版进度库没有扫描编号列
+            self._reader.execute('ALTER TABLE progress ADD COLUMN scan_id INTEGER')
+        self._reader.commit()
+        self.scan_id = None
+
+        # 队列有上限：写入跟不上时 put 会阻塞，形成背压而不是无限占用内存
+        self._queue = queue.Queue(maxsize=self.batch_size * 4)
+        self._writer = threading.Thread(target=self._write_loop, name='progress-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute(f'PRAGMA journal_mode={self.journal_mode.upper()}')
+        conn.execute(f'PRAGMA synchronous={self.sync.upper()}')
+        return conn
+
+    def own_files(self):
+        """进度库自身占用的文件（扫描时需要排除）"""
+        return [self.path, self.path + '-wal', self.path + '-shm', self.path + '-journal']
+
+    # ---------- 写入（后台线程） ----------
+
+    def put(self, file_path, links, meta=None):
+        """记录一个文件的分析结果与指纹"""
+        self._queue.put(('put', file_path, links, meta or {}))
+
+    def update_links(self, file_path, links):
+        """只更新一个文件的分析结果，保留原有指纹（如 HTTP 探测后补充可疑链接）"""
+        self._queue.put(('update', file_path, links, None))
+
+    def delete(self, file_path):
+        """删除一个文件的记录（文件已删除，或旧结果已作废）"""
+        self._queue.put(('delete', file_path, None, None))
+
+    def begin_scan(self):
+        """开始一轮扫描：之后写入与 mark_seen 的记录都带上本轮编号"""
+        self.scan_id = time.time_ns()
+        return self.scan_id
+
+    def mark_seen(self, file_path, prefix=False):
+        """本轮遍历到了该文件，保留它的记录；prefix=True 时标记以 file_path 开头的全部记录（压缩包成员）"""
+        self._queue.put(('seen_prefix' if prefix else 'seen', file_path, None, self.scan_id))
+
+    def delete_unseen(self):
+        """删除本轮没有遍历到的文件的记录（只在完整遍历之后调用），返回删除的记录数"""
+        self.flush()
+        with self._read_lock:
+            with self._reader:
+                cursor = self._reader.execute('DELETE FROM progress WHERE scan_id IS NULL OR scan_id <> ?',
+                                              (self.scan_id,))
+            return cursor.rowcount
+
+    def flush(self):
+        """阻塞直到此前放入队列的记录全部提交"""
+        done = threading.Event()
+        self._queue.put(('flush', None, None, done))
+        done.wait()
+
+    def close(self):
+        """提交剩余记录并停止后台线程"""
+        if self._writer.is_alive():
+            self._queue.put(('stop', None, None, None))
+            self._writer.join()
+        with self._read_lock:
+            self._reader.close()
+
+    def _write_loop(self):
+        conn = self._connect()
+        batch = []
+        waiters = []
+        last_commit = time.monotonic()
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_commit))
+            try:
+                op, file_path, links, extra = self._queue.get(timeout=timeout if batch else None)
+                if op == 'stop':
+                    stopping = True
+                elif op == 'flush':
+                    waiters.append(extra)
+                else:
+                    batch.append((op, file_path, links, extra))
+            except queue.Empty:
+                pass
+
+            if (batch or waiters) and (stopping or waiters or len(batch) >= self.batch_size
+                                       or time.monotonic() - last_commit >= self.flush_interval):
+                started = time.perf_counter()
+                self._commit(conn, batch)
+                if _profiler is not None and batch:
+                    _profiler.record_store_commit(len(batch), time.perf_counter() - started)
+                batch = []
+                last_commit = time.monotonic()
+                for done in waiters:
+                    done.set()
+                waiters = []
+        conn.close()
+
+    def _commit(self, conn, batch):
+        try:
+            with conn:
+                for op, file_path, links, meta in batch:
+                    if op == 'put':
+                        conn.execute(
+                            'INSERT OR REPLACE INTO progress (path, links, mtime_ns, size, sha256, scan_id)'
+                            ' VALUES (?, ?, ?, ?, ?, ?)',
+                            (file_path, json.dumps(links, ensure_ascii=False),
+                             meta.get('mtime_ns'), meta.get('size'), meta.get('sha256'), self.scan_id)
+                        )
+                    elif op == 'seen':
+                        conn.execute('UPDATE progress SET scan_id = ? WHERE path = ?', (meta, file_path))
+                    elif op == 'seen_prefix':
+                        conn.execute('UPDATE progress SET scan_id = ? WHERE path >= ? AND path < ?',
+                                     (meta, file_path, prefix_upper_bound(file_path)))
+                    elif op == 'update':
+                        conn.execute('UPDATE progress SET links = ? WHERE path = ?',
+                                     (json.dumps(links, ensure_ascii=False), file_path))
+                    else:
+                        conn.execute('DELETE FROM progress WHERE path = ?', (file_path,))
+        except sqlite3.Error as e:
+            with print_lock:
+                print(f"[!] 写入进度库失败（{len(batch)} 条记录未保存）: {e}")
+
+    # ---------- 查询 ----------
+
+    def get_meta(self, file_path):
+        """返回文件的指纹 {'mtime_ns', 'size'[, 'sha256']}，没有记录时返回 None（旧版导入的记录可能为空字典）"""
+        with self._read_lock:
+            row = self._reader.execute(
+                'SELECT mtime_ns, size, sha256 FROM progress WHERE path = ?', (file_path,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {k: v for k, v in zip(('mtime_ns', 'size', 'sha256'), row) if v is not None}
+
+    def get_links(self, file_path):
+        """返回文件的分析结果，没有记录时返回 None"""
+        with self._read_lock:
+            row = self._reader.execute('SELECT links FROM progress WHERE path = ?', (file_path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self, files_only=False):
+        """记录条数；files_only=True 时不含压缩包本身的记录（键以 !/ 结尾）"""
+        with self._read_lock:
+            if files_only:
+                return self._reader.execute('SELECT COUNT(*) FROM progress WHERE path NOT LIKE ?',
+                                            ('%' + ARCHIVE_SEPARATOR,)).fetchone()[0]
+            return self._reader.execute('SELECT COUNT(*) FROM progress').fetchone()[0]
+
+    def _prefix_rows(self, columns, prefix):
+        with self._read_lock:
+            return self._reader.execute(
+                f'SELECT {columns} FROM progress WHERE path >= ? AND path < ?', (prefix, prefix_upper_bound(prefix))
+            ).fetchall()
+
+    def get_member_metas(self, archive_path):
+        """返回压缩包中已记录成员的指纹 {key: meta}（键以 archive_path!/ 开头，含嵌套压缩包中的成员）"""
+        rows = self._prefix_rows('path, mtime_ns, size, sha256', archive_path + ARCHIVE_SEPARATOR)
+        return {row[0]: {k: v for k, v in zip(('mtime_ns', 'size', 'sha256'), row[1:]) if v is not None}
+                for row in rows}
+
+    def import_store(self, other_path, old_root=None, new_root=None):
+        """
+        把另一个进度库文件中的全部记录并入本库（相同路径的记录被覆盖），返回并入的记录数；
+        old_root 与 new_root 不同时，把键开头的 old_root 替换为 new_root（合并各节点挂载点不同的分片结果）
+        """
+        self.flush()
+        with self._read_lock:
+            self._reader.execute('ATTACH DATABASE ? AS other', (other_path,))
+            try:
+                with self._reader:
+                    if old_root and new_root and old_root != new_root:
+                        cursor = self._reader.execute(
+                            'INSERT OR REPLACE INTO progress (path, links, mtime_ns, size, sha256)'
+                            ' SELECT ? || substr(path, ?), links, mtime_ns, size, sha256 FROM other.progress',
+                            (new_root, len(old_root) + 1)
+                        )
+                    else:
+                        cursor = self._reader.execute(
+                            'INSERT OR REPLACE INTO progress (path, links, mtime_ns, size, sha256)'
+                            ' SELECT path, links, mtime_ns, size, sha256 FROM other.progress'
+                        )
+                return cursor.rowcount
+            finally:
+                self._reader.execute('DETACH DATABASE other')
+
+    def iter_paths(self, prefix=None):
+        """
+        按路径顺序逐个产出已记录的文件路径，可只取以 prefix 开头的；
+        按主键分页查询，每页一条独立的语句，不一次读出全部路径，也不在遍历期间占着读事务（可以安全地 delete）
+        """
+        lower, upper = (prefix, prefix_upper_bound(prefix)) if prefix else ('', None)
+        condition = 'path >= ?'
+        while True:
+            sql = f'SELECT path FROM progress WHERE {condition}' + (' AND path < ?' if upper else '')
+            params = (lower, upper) if upper else (lower,)
+            with self._read_lock:
+                rows = self._reader.execute(sql + ' ORDER BY path LIMIT ?', (*params, ITER_PAGE_SIZE)).fetchall()
+            for (file_path,) in rows:
+                yield file_path
+            if len(rows) < ITER_PAGE_SIZE:
+                return
+            lower = rows[-1][0]
+            condition = 'path > ?'
+
+    def iter_results(self, files_only=False):
+        """按路径顺序逐条产出 (file_path, links)；files_only=True 时跳过压缩包本身的记录"""
+        with self._read_lock:
+            cursor = self._reader.execute('SELECT path, links FROM progress ORDER BY path')
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for file_path, links in rows:
+                if files_only and is_archive_record(file_path):
+                    continue
+                yield file_path, json.loads(links)
+            with self._read_lock:
+                rows = cursor.fetchmany(1000)
+
+
+class ScanResults(Mapping):
+    """
+    扫描结果的汇总层：只读接口与 {file_path: links} 字典一致，数据全部落在进度库中，
+    遍历时按路径顺序逐条从库中读出，内存占用不随文件数增长。
+      - add/discard 由扫描的结果写入端调用，经进度库的后台线程批量写入
+      - results[file_path] = links 只更新分析结果、保留文件指纹（HTTP 探测回写可疑链接时使用）
+      - temporary=True 时进度库是临时文件，close() 时删除
+      - 压缩包本身的记录（键以 !/ 结尾，只保存指纹）不是文件结果，不出现在只读接口中
+    """
+
+    def __init__(self, store, temporary=False):
+        self.store = store
+        self.temporary = temporary
+        self._dirty = False
+
+    def _sync(self):
+        if self._dirty:
+            self.store.flush()
+            self._dirty = False
+
+    def add(self, file_path, links, meta=None):
+        self.store.put(file_path, links, meta)
+        self._dirty = True
+
+    def discard(self, file_path):
+        self.store.delete(file_path)
+        self._dirty = True
+
+    def __setitem__(self, file_path, links):
+        self.store.update_links(file_path, links)
+        self._dirty = True
+
+    def __getitem__(self, file_path):
+        if is_archive_record(file_path):
+            raise KeyError(file_path)
+        self._sync()
+        links = self.store.get_links(file_path)
+        if links is None:
+            raise KeyError(file_path)
+        return links
+
+    def __iter__(self):
+        self._sync()
+        return (file_path for file_path, _ in self.store.iter_results(files_only=True))
+
+    def __len__(self):
+        self._sync()
+        return self.store.count(files_only=True)
+
+    def items(self):
+        self._sync()
+        return self.store.iter_results(files_only=True)
+
+    def close(self):
+        self.store.close()
+        if self.temporary:
+            shutil.rmtree(os.path.dirname(self.store.path), ignore_errors=True)
+
+
+def import_progress_jsonl(store, jsonl_file, ignore_paths=()):
+    """
+    一次性导入旧版 JSONL 进度文件（同一文件有多条记录时以最后一条为准，links 为 null 表示作废），
+    逐行读取，不会把整个文件读进内存；返回导入的记录条数
+    """
+    ignore_set = {os.path.abspath(p) for p in ignore_paths}
+    imported = 0
+    with open(jsonl_file, 'r', encoding='utf-8') as pf:
+        for line_no, line in enumerate(pf, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+                file_path = rec.get("file")
+                links = rec.get("links")
+                if not file_path:
+                    continue
+                abs_path = os.path.abspath(file_path)
+                # 关键：忽略进度文件自身（旧版本可能写过进去）
+                if abs_path in ignore_set:
+                    continue
+                if links is None:
+                    store.delete(abs_path)
+                elif isinstance(links, dict):
+                    store.put(abs_path, links, {k: rec[k] for k in ('mtime_ns', 'size', 'sha256') if k in rec})
+                    imported += 1
+            except Exception as e:
+                with print_lock:
+                    print(f"[!] 解析进度文件第 {line_no} 行失败: {e}")
+    store.flush()
+    return imported
+
+
+def open_progress_store(progress_file, **store_options):
+    """
+    打开进度库。progress_file 以 .jsonl 结尾时视为旧版进度文件，进度库放在同名 .sqlite3 文件中；
+    旧版 JSONL 文件存在时先导入，导入完成后重命名为 *.jsonl.imported，之后不再重复导入
+    """
+    root, ext = os.path.splitext(progress_file)
+    if ext == '.jsonl':
+        legacy_file, store_file = progress_file, root + '.sqlite3'
+    elif os.path.basename(progress_file) == DEFAULT_PROGRESS_FILE:
+        legacy_file, store_file = os.path.join(os.path.dirname(progress_file), LEGACY_PROGRESS_FILE), progress_file
+    else:
+        legacy_file, store_file = None, progress_file
+
+    store = ProgressStore(store_file, **store_options)
+    if legacy_file and os.path.exists(legacy_file):
+        print(f"[+] 检测到旧版进度文件，正在导入 {legacy_file} ...")
+        try:
+            imported = import_progress_jsonl(store, legacy_file, ignore_paths=[legacy_file] + store.own_files())
+            os.replace(legacy_file, legacy_file + '.imported')
+            print(f"[+] 已导入 {imported} 条记录，旧文件已重命名为 {legacy_file}.imported")
+        except OSError as e:
+            print(f"[!] 导入旧版进度文件失败: {e}")
+    return store
+
+
+def is_file_unchanged(meta, st):
+    """进度记录中的文件指纹与当前 stat 是否一致（旧版记录没有指纹，视为已变化）"""
+    return bool(meta) and meta.get('mtime_ns') == st.st_mtime_ns and meta.get('size') == st.st_size
+
+
+def scan_task_options(base_domain=None, black_patterns=None, extensions=None, scan_all=False,
+                      window_size=DEFAULT_WINDOW_SIZE, window_overlap=DEFAULT_WINDOW_OVERLAP, max_file_size=None,
+                      skip_binary=False, hash_check=False, result_cache=None,
+                      hidden_detector=DEFAULT_HIDDEN_DETECTOR, hidden_timeout=DEFAULT_HIDDEN_TIMEOUT,
+                      archive_depth=DEFAULT_ARCHIVE_DEPTH, archive_max_size=DEFAULT_ARCHIVE_MAX_SIZE, byte_scan=False):
+    """
+    由 process_directory 的扫描参数得到传给扫描引擎的 (file_options, archive_options)，
+    传入 result_cache 时顺带设置其作用域（--watch 重新扫描变化的文件时同样使用）
+    """
+    file_options = {
+        'window_size': window_size,
+        'window_overlap': window_overlap,
+        'skip_binary': skip_binary,
+        'hash_content': hash_check,
+        'hidden_detector': hidden_detector,
+        'hidden_timeout': hidden_timeout,
+        'byte_scan': byte_scan,
+    }
+    if result_cache is not None:
+        result_cache.set_scope(base_domain, black_patterns, hidden_detector, byte_scan)
+        file_options['result_cache'] = result_cache
+    archive_options = {
+        'max_depth': archive_depth,
+        'max_size': archive_max_size,
+        'extensions': extensions,
+        'scan_all': scan_all,
+        'max_file_size': max_file_size,
+    }
+    return file_options, archive_options
+
+
+def process_directory(directory, base_domain=None, recursive=False,
+                      extensions=None, scan_all=False, max_workers=4,
+                      black_patterns=None, progress_file=None, engine='thread',
+                      window_size=DEFAULT_WINDOW_SIZE, window_overlap=DEFAULT_WINDOW_OVERLAP,
+                      max_file_size=None, skip_binary=False, skip_stats=None, hash_check=False,
+                      result_cache=None, progress_options=None, exclude_globs=None,
+                      walk_workers=DEFAULT_WALK_WORKERS, hidden_detector=DEFAULT_HIDDEN_DETECTOR,
+                      hidden_timeout=DEFAULT_HIDDEN_TIMEOUT, archives=False, archive_depth=DEFAULT_ARCHIVE_DEPTH,
+                      archive_max_size=DEFAULT_ARCHIVE_MAX_SIZE, byte_scan=False, file_list=None, cancel=None):
+    """
+    处理目录中的所有文件（支持多线程/多进程 + 增量断点续跑），流水线方式执行：
+      目录遍历（并行 scandir）→ 增量判断 → 有界任务队列 → 读取与提取（线程/进程池）→ 结果写入
+    各阶段都是流式的，在途任务数有上限，结果直接写入进度库，返回的 ScanResults 按需从库中读出，
+    内存占用不随文件总数增长（用完后调用 close()）。
+      - engine='thread'：线程池（默认，适合 I/O 密集的场景）
+      - engine='process'：进程池，绕开 GIL，适合 CPU 密集的正则提取
+      - 超过 window_size 的大文件按窗口流式扫描，相邻窗口重叠 window_overlap 个字符
+      - 超过 max_file_size 字节的文件、以及 skip_binary=True 时识别为二进制的文件不扫描，
+        按原因计数写入 skip_stats（传入的字典）
+      - 进度记录带有文件指纹：mtime/size 变化的文件重新扫描，已删除文件的记录被清理；
+        hash_check=True 时即使 mtime/size 未变也会比对内容哈希（防止篡改后回写 mtime）
+      - 传入 result_cache（ResultCache）时，内容相同的文件直接复用缓存中的提取结果
+      - progress_file 为进度库路径（见 open_progress_store），不指定时使用临时进度库；
+        progress_options 传给 ProgressStore（batch_size / flush_interval / sync / journal_mode）
+      - exclude_globs 为 --exclude 模式，命中的目录在遍历时整棵剪掉；walk_workers 为并行列目录的线程数
+      - hidden_detector / hidden_timeout 为暗链检测方式与单个文件的检测时间上限
+      - archives=True 时 zip/jar/war/tar 等压缩包视为虚拟目录，不解压到磁盘，成员逐个流式扫描，
+        结果与进度记录的键为 压缩包路径!/成员路径；嵌套层数不超过 archive_depth，
+        单个压缩包解压总量不超过 archive_max_size 字节（max_file_size 作用于解压后的单个成员）
+      - byte_scan=True 时直接在字节上扫描（不解码整个文件），黑名单关键字按 UTF-8/GBK/Big5 编码匹配
+      - file_list 为需要扫描的文件路径列表（分片扫描时由分片计划给出）：不再遍历目录，
+        进度库中不在列表里的记录被清理；cancel（threading.Event）置位后不再派发新任务，已派发的照常完成
+    """
+    if skip_stats is None:
+        skip_stats = {}
+    directory = os.path.abspath(directory)
+
+    # 1. 打开进度库（必要时导入旧版 JSONL 进度文件），清理已删除文件的记录
+    if progress_file:
+        store = open_progress_store(progress_file, **(progress_options or {}))
+        results = ScanResults(store)
+        exclude_paths = store.own_files() + [progress_file]
+    else:
+        store = ProgressStore(os.path.join(tempfile.mkdtemp(prefix='scan_blacklink_'), 'results.sqlite3'),
+                              **(progress_options or {}))
+        results = ScanResults(store, temporary=True)
+        exclude_paths = None
+
+    try:
+        # 不在开始时逐条 stat 已有记录：遍历时给遍历到的文件打上本轮编号，完整遍历后一次删掉其余记录
+        # （已删除的文件、不再被遍历的文件，以及未开启压缩包扫描时的成员记录）
+        store.begin_scan()
+        recorded_count = store.count(files_only=True)
+        if recorded_count:
+            print(f"[+] 进度库 {store.path} 中已有 {recorded_count} 个文件的结果")
+
+        # 2. 边遍历目录边判断还需要处理的文件：新文件、指纹变化的文件，以及 hash_check 时需要比对哈希的文件
+        #    （超过大小限制的文件直接跳过，不打开）；stat 结果由遍历器提供，指纹按路径逐个到进度库中查询
+        #    压缩包按其自身记录（压缩包路径!/）的指纹判断，需要处理时附上已记录成员的指纹，在工作线程/进程中逐个比对
+        counts = {'total': 0, 'known': 0, 'new': 0, 'changed': 0, 'unchanged': 0, 'hash': 0, 'pending': 0,
+                  'archive_files': 0, 'archives': 0, 'members': 0}
+
+        def iter_sources():
+            if file_list is None:
+                yield from iter_files(
+                    directory,
+                    recursive=recursive,
+                    extensions=extensions,
+                    scan_all=scan_all,
+                    exclude_paths=exclude_paths,
+                    exclude_globs=exclude_globs,
+                    workers=walk_workers,
+                    archives=archives,
+                )
+                return
+            for f in file_list:
+                try:
+                    yield f, os.stat(f)
+                except OSError:
+                    # 列出之后被删除的文件
+                    continue
+
+        def iter_tasks():
+            for f, st in iter_sources():
+                if cancel is not None and cancel.is_set():
+                    break
+                counts['total'] += 1
+                is_archive = archives and archive_kind(f) is not None
+                if is_archive:
+                    counts['archive_files'] += 1
+                # 压缩包的记录（压缩包路径!/）与成员记录一起保留，被删除的成员由工作线程/进程报告后清理
+                store.mark_seen(f + ARCHIVE_SEPARATOR if is_archive else f, prefix=is_archive)
+                if max_file_size and st.st_size > max_file_size and not is_archive:
+                    skip_stats[SKIP_TOO_LARGE] = skip_stats.get(SKIP_TOO_LARGE, 0) + 1
+                    # 之前扫描过、现在超过大小上限的文件，不再沿用旧结果
+                    results.discard(f)
+                    continue
+                meta = store.get_meta(f + ARCHIVE_SEPARATOR if is_archive else f)
+                if meta is not None:
+                    counts['known'] += 1
+                known_hash = None
+                if meta is None:
+                    counts['new'] += 1
+                elif not is_file_unchanged(meta, st):
+                    counts['changed'] += 1
+                elif hash_check and is_archive:
+                    # 压缩包本身不算哈希，由工作线程/进程逐个比对成员的内容哈希
+                    counts['hash'] += 1
+                elif hash_check and meta.get('sha256'):
+                    known_hash = meta['sha256']
+                    counts['hash'] += 1
+                elif hash_check:
+                    # 旧记录没有内容哈希时重新扫描一次，顺带补上哈希
+                    counts['changed'] += 1
+                else:
+                    counts['unchanged'] += 1
+                    continue
+                if not is_archive:
+                    counts['pending'] += 1
+                    yield f, st.st_size, known_hash, None
+                    continue
+                # 压缩包不计入待处理的文件数，其中的成员在扫描时逐个计入
+                counts['archives'] += 1
+                if store.get_meta(f) is not None:
+                    # 未开启压缩包扫描时按普通文件扫描过，旧结果作废
+                    results.discard(f)
+                yield f, st.st_size, None, store.get_member_metas(f)
+
+        file_options, archive_options = scan_task_options(
+            base_domain, black_patterns, extensions, scan_all, window_size, window_overlap, max_file_size,
+            skip_binary, hash_check, result_cache, hidden_detector, hidden_timeout, archive_depth,
+            archive_max_size, byte_scan)
+        if engine == 'process':
+            print(f"使用 {max_workers} 个进程进行并行处理（边遍历边扫描）...\n")
+            results_iter = iter_process_results(iter_tasks(), base_domain, black_patterns, max_workers,
+                                                file_options, archive_options)
+        else:
+            print(f"使用 {max_workers} 个线程进行并行处理（边遍历边扫描）...\n")
+            results_iter = iter_thread_results(iter_tasks(), base_domain, black_patterns, max_workers,
+                                               file_options, archive_options)
+
+        # 3. 结果写入端：逐个写入进度库（即汇总层），不在内存中保留结果
+        done = 0
+        for file_path, links, meta, error, skip_reason in results_iter:
+            if skip_reason == MEMBER_REMOVED:
+                results.discard(file_path)
+                continue
+            if is_archive_record(file_path) or (archives and archive_kind(file_path) is not None):
+                # 压缩包本身的结果（顶层压缩包失败时键为压缩包路径）：不计入处理的文件数，
+                # 成功时只保存指纹，损坏、超过解压上限等才报告
+                if error is None and not skip_reason:
+                    results.add(file_path, links, meta)
+                    continue
+                report_archive_status(file_path, error, skip_reason)
+            else:
+                if is_archive_member(file_path):
+                    # 压缩包成员在打开压缩包之后才发现
+                    counts['members'] += 1
+                    counts['pending'] += 1
+                done += 1
+                report_file_status(done, counts['pending'], file_path, error, skip_reason)
+            if skip_reason == FILE_UNCHANGED:
+                continue
+            if skip_reason:
+                skip_stats[skip_reason] = skip_stats.get(skip_reason, 0) + 1
+                # 之前扫描过、现在被策略跳过的文件，不再沿用旧结果
+                results.discard(file_path)
+            elif links is not None:
+                results.add(file_path, links, meta)
+
+        if cancel is None or not cancel.is_set():
+            deleted_count = store.delete_unseen()
+            if deleted_count:
+                print(f"[+] 清理已删除文件的进度记录: {deleted_count} 个")
+
+        if result_cache is not None:
+            # 工作进程各自的写入计数可能达不到检查间隔，结束时统一检查一次大小上限
+            try:
+                result_cache.evict()
+            except sqlite3.Error as e:
+                print(f"[!] 结果缓存淘汰失败: {e}")
+    except BaseException:
+        results.close()
+        raise
+
+    if counts['total'] == 0:
+        print("未在目标目录中找到任何需要处理的文件")
+        return results
+
+    print()
+    if skip_stats.get(SKIP_TOO_LARGE):
+        print(f"超过大小限制而跳过的文件数: {skip_stats[SKIP_TOO_LARGE]}")
+    print(f"当前目录共发现 {counts['total']} 个需扫描文件"
+          + (f"（其中压缩包 {counts['archive_files']} 个）" if counts['archive_files'] else "")
+          + f"，其中 {counts['known']} 个已在进度库中处理过")
+    print(f"新增文件 {counts['new']} 个，已变化 {counts['changed']} 个，未变化 {counts['unchanged']} 个"
+          + (f"，比对内容哈希 {counts['hash']} 个" if counts['hash'] else ""))
+    print(f"本次处理的文件数: {counts['pending']}"
+          + (f"（其中压缩包成员 {counts['members']} 个）" if counts['members'] else ""))
+    if counts['archives']:
+        print(f"本次重新打开的压缩包: {counts['archives']} 个")
+    if counts['pending'] == 0 and counts['archives'] == 0:
+        print("所有文件均已处理，无需重新扫描。")
+        return results
+
+    print(f"\n处理完成！共成功处理 {len(results)} 个文件（包含历史进度）")
+    if skip_stats:
+        print(f"跳过未扫描的文件: {sum(skip_stats.values())} 个")
+    return results
+
+
+# ===================== 分片分布式扫描 =====================
+
+# 默认分片数、租约有效期（秒）与空闲工作节点的轮询间隔（秒）
+DEFAULT_SHARD_COUNT = 64
+DEFAULT_SHARD_LEASE = 300.0
+SHARD_POLL_INTERVAL = 5.0
+
+# 分片状态
+SHARD_PENDING = 'pending'
+SHARD_LEASED = 'leased'
+SHARD_DONE = 'done'
+# 租约专用的分片进度库临时副本的文件名后缀（其后可能还有 SQLite 的 -journal）
+SHARD_LEASE_SUFFIX = '.lease'
+
+# 各节点的结果要能合并，这些命令行选项以分片计划为准（工作节点与合并时自己指定的值不生效）
+SHARD_PLAN_OPTIONS = ('base_domain', 'recursive', 'no_recursive', 'extensions', 'all', 'exclude',
+                      'window_size', 'window_overlap', 'max_file_size', 'skip_binary', 'scan_archives',
+                      'archive_depth', 'archive_max_size', 'hidden_detector', 'hidden_timeout', 'byte_scan',
+                      'hash_check')
+
+
+def shard_of(rel_path, shard_count):
+    """按相对路径的哈希分片：与挂载点无关，同一个文件在各节点、各次计划中都落在同一个分片"""
+    digest = hashlib.sha1(rel_path.encode('utf-8', 'surrogateescape')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+class ShardQueue:
+    """
+    放在共享存储上的分片租约队列（一个 SQLite 文件）：协调节点写入分片计划，各工作节点从中租用分片。
+      - plan 表保存扫描根目录、分片数、必须一致的扫描选项、黑名单与 TLD 列表，shard_files 表保存各分片的相对路径
+      - 租用在 BEGIN IMMEDIATE 事务中完成，同一个分片同一时刻只会租给一个节点；租约有有效期，
+        持有者定期续租，节点崩溃后租约过期，分片由其他节点重新租用
+      - 续租、完成与释放都校验租用时发放的令牌，租约已转给别的节点后旧持有者的操作不生效
+      - 各分片的进度库放在队列文件旁的 <队列文件>.shards/ 目录中：重新租用的节点沿用已完成的记录继续扫描，
+        分片数不变时重新制定计划也会沿用（同一文件总在同一分片），相当于增量扫描
+      - 持有者把分片进度库复制一份（本次租约专用的临时文件）再扫描，完成时仍持有租约才替换回去，
+        租约已转给别的节点的旧持有者不会写入新持有者正在使用的进度库
+    网络文件系统上无法使用 WAL 模式依赖的共享内存，队列使用默认的回滚日志模式，每次操作单独打开连接
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS plan (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS shards ('
+        ' id INTEGER PRIMARY KEY, state TEXT NOT NULL, files INTEGER NOT NULL, bytes INTEGER NOT NULL,'
+        ' owner TEXT, token TEXT, expires REAL, attempts INTEGER NOT NULL DEFAULT 0,'
+        ' root TEXT, skip_stats TEXT, finished REAL)',
+        'CREATE TABLE IF NOT EXISTS shard_files (shard INTEGER NOT NULL, path TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS shard_files_shard ON shard_files (shard)',
+    )
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.shard_dir = self.path + '.shards'
+
+    def own_files(self):
+        """队列自身占用的文件（制定计划时需要排除）"""
+        files = [self.path, self.path + '-journal']
+        if os.path.isdir(self.shard_dir):
+            files.extend(os.path.join(self.shard_dir, name) for name in os.listdir(self.shard_dir))
+        return files
+
+    def shard_store_path(self, shard_id):
+        return os.path.join(self.shard_dir, f'shard-{shard_id:04d}.sqlite3')
+
+    def lease_store_path(self, shard_id, token):
+        """某次租约专用的分片进度库临时副本"""
+        return f'{self.shard_store_path(shard_id)}.{token}{SHARD_LEASE_SUFFIX}'
+
+    @contextlib.contextmanager
+    def _transaction(self, immediate=True):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    # ---------- 协调节点 ----------
+
+    def create_plan(self, root, shard_count, files, plan):
+        """
+        写入新的分片计划（覆盖旧计划）：files 逐个产出 (file_path, size)，按相对 root 的路径分片，
+        plan 为计划表中的其余字段；分片数与旧计划不同时删除旧的分片进度库。返回各分片的文件数列表
+        """
+        os.makedirs(self.shard_dir, exist_ok=True)
+        counts = [0] * shard_count
+        sizes = [0] * shard_count
+        with self._transaction() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            old = conn.execute("SELECT value FROM plan WHERE key = 'shard_count'").fetchone()
+            # 保留上一次计划中各分片进度库的扫描根目录，新的持有者据此沿用其中的记录
+            old_roots = dict(conn.execute('SELECT id, root FROM shards').fetchall())
+            for table in ('plan', 'shards', 'shard_files'):
+                conn.execute(f'DELETE FROM {table}')
+            batch = []
+            for file_path, size in files:
+                rel_path = os.path.relpath(file_path, root)
+                shard_id = shard_of(rel_path, shard_count)
+                counts[shard_id] += 1
+                sizes[shard_id] += size
+                batch.append((shard_id, rel_path))
+                if len(batch) >= 1000:
+                    conn.executemany('INSERT INTO shard_files (shard, path) VALUES (?, ?)', batch)
+                    batch = []
+            conn.executemany('INSERT INTO shard_files (shard, path) VALUES (?, ?)', batch)
+            # 没有文件的分片直接记为完成
+            if old is None or json.loads(old[0]) != shard_count:
+                old_roots = {}
+            conn.executemany(
+                'INSERT INTO shards (id, state, files, bytes, root) VALUES (?, ?, ?, ?, ?)',
+                [(i, SHARD_PENDING if counts[i] else SHARD_DONE, counts[i], sizes[i], old_roots.get(i))
+                 for i in range(shard_count)]
+            )
+            plan = dict(plan, root=root, shard_count=shard_count, created=time.time())
+            conn.executemany('INSERT INTO plan (key, value) VALUES (?, ?)',
+                             [(k, json.dumps(v, ensure_ascii=False)) for k, v in plan.items()])
+        resize = old is not None and json.loads(old[0]) != shard_count
+        for name in os.listdir(self.shard_dir):
+            # 分片数变化时删除全部分片进度库；否则只清理崩溃节点留下的租约临时副本
+            if resize or SHARD_LEASE_SUFFIX in name:
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.shard_dir, name))
+        return counts
+
+    # ---------- 工作节点 ----------
+
+    def load_plan(self):
+        """读取分片计划，没有计划时抛出 ValueError"""
+        rows = []
+        if os.path.exists(self.path):
+            with self._transaction(immediate=False) as conn:
+                with contextlib.suppress(sqlite3.OperationalError):
+                    rows = conn.execute('SELECT key, value FROM plan').fetchall()
+        if not rows:
+            raise ValueError(f"{self.path} 中没有分片计划（先用 --shard-plan 制定计划）")
+        return {key: json.loads(value) for key, value in rows}
+
+    def lease(self, owner, lease_seconds, root):
+        """
+        租用一个待扫描或租约已过期的分片（优先待扫描的），并记录本节点的扫描根目录；
+        返回 (分片号, 令牌, 此前的租用次数, 上一个持有者的扫描根目录)，没有可租用的分片时返回 None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT id, attempts, root FROM shards WHERE state = ? OR (state = ? AND expires < ?)'
+                ' ORDER BY state = ?, id LIMIT 1',
+                (SHARD_PENDING, SHARD_LEASED, now, SHARD_LEASED)
+            ).fetchone()
+            if row is None:
+                return None
+            token = os.urandom(8).hex()
+            conn.execute(
+                'UPDATE shards SET state = ?, owner = ?, token = ?, expires = ?, root = ?, attempts = attempts + 1'
+                ' WHERE id = ?',
+                (SHARD_LEASED, owner, token, now + lease_seconds, root, row[0])
+            )
+        return row[0], token, row[1], row[2]
+
+    def _update_leased(self, sql, params, shard_id, token):
+        with self._transaction() as conn:
+            cursor = conn.execute(f'UPDATE shards SET {sql} WHERE id = ? AND token = ? AND state = ?',
+                                  (*params, shard_id, token, SHARD_LEASED))
+        return cursor.rowcount == 1
+
+    def renew(self, shard_id, token, lease_seconds):
+        """续租，租约已不属于该令牌时返回 False"""
+        return self._update_leased('expires = ?', (time.time() + lease_seconds,), shard_id, token)
+
+    def complete(self, shard_id, token, skip_stats=None):
+        """标记分片完成并记录跳过统计，租约已不属于该令牌时返回 False"""
+        return self._update_leased('state = ?, skip_stats = ?, finished = ?, expires = NULL',
+                                   (SHARD_DONE, json.dumps(skip_stats or {}), time.time()), shard_id, token)
+
+    def release(self, shard_id, token):
+        """放弃租约，分片立即可以被重新租用"""
+        return self._update_leased('state = ?, owner = NULL, token = NULL, expires = NULL',
+                                   (SHARD_PENDING,), shard_id, token)
+
+    def shard_files(self, shard_id):
+        """返回分片中文件的相对路径列表"""
+        with self._transaction(immediate=False) as conn:
+            return [row[0] for row in conn.execute(
+                'SELECT path FROM shard_files WHERE shard = ? ORDER BY path', (shard_id,))]
+
+    # ---------- 查询 ----------
+
+    def status(self):
+        """返回 {状态: (分片数, 文件数)}"""
+        with self._transaction(immediate=False) as conn:
+            rows = conn.execute('SELECT state, COUNT(*), SUM(files) FROM shards GROUP BY state').fetchall()
+        return {state: (shards, files or 0) for state, shards, files in rows}
+
+    def done_shards(self):
+        """返回已完成且有文件的分片 [(分片号, 扫描根目录, 跳过统计)]"""
+        with self._transaction(immediate=False) as conn:
+            rows = conn.execute('SELECT id, root, skip_stats FROM shards WHERE state = ? AND files > 0 ORDER BY id',
+                                (SHARD_DONE,)).fetchall()
+        return [(shard_id, root, json.loads(skips) if skips else {}) for shard_id, root, skips in rows]
+
+
+def plan_shards(queue_path, directory, shard_count=DEFAULT_SHARD_COUNT, plan_options=None, black_patterns=None,
+                recursive=False, extensions=None, scan_all=False, exclude_paths=None, exclude_globs=None,
+                walk_workers=DEFAULT_WALK_WORKERS, archives=False):
+    """
+    协调节点：遍历目录，按相对路径的哈希把文件分到 shard_count 个分片，写入分片队列 queue_path，返回各分片的文件数。
+    plan_options 为工作节点必须沿用的命令行选项（见 SHARD_PLAN_OPTIONS），与黑名单、当前 TLD 列表一起写入计划；
+    archives=True 时压缩包整个分给一个分片，由工作节点展开
+    """
+    shard_queue = ShardQueue(queue_path)
+    directory = os.path.abspath(directory)
+    files = ((f, st.st_size) for f, st in iter_files(
+        directory,
+        recursive=recursive,
+        extensions=extensions,
+        scan_all=scan_all,
+        exclude_paths=list(exclude_paths or []) + shard_queue.own_files(),
+        exclude_globs=exclude_globs,
+        workers=walk_workers,
+        archives=archives,
+    ))
+    return shard_queue.create_plan(directory, shard_count, files, {
+        'options': plan_options or {},
+        'black_patterns': list(black_patterns or []),
+        'tlds': list(_TLD_RANK),
+    })
+
+
+def rebase_shard_store(store_path, old_root, new_root):
+    """
+    本节点的挂载路径与分片进度库上一个持有者不同时，把库中键开头的根目录替换为本节点的，
+    这样重新租用（或重新制定计划后）仍能沿用其中的记录，而不是当作新文件全部重扫
+    """
+    if not old_root or old_root == new_root or not os.path.exists(store_path):
+        return
+    old_prefix, new_prefix = old_root.rstrip(os.sep) + os.sep, new_root.rstrip(os.sep) + os.sep
+    conn = sqlite3.connect(store_path, timeout=30)
+    try:
+        with conn, contextlib.suppress(sqlite3.OperationalError):
+            conn.execute('UPDATE OR REPLACE progress SET path = ? || substr(path, ?) WHERE substr(path, 1, ?) = ?',
+                         (new_prefix, len(old_prefix) + 1, len(old_prefix), old_prefix))
+    finally:
+        conn.close()
+
+
+def _keep_lease(shard_queue, shard_id, token, lease_seconds, stop, lost):
+    """续租线程：每隔租约有效期的三分之一续租一次；租约已过期并转给其他节点时置位 lost"""
+    while not stop.wait(lease_seconds / 3):
+        try:
+            if not shard_queue.renew(shard_id, token, lease_seconds):
+                lost.set()
+                return
+        except sqlite3.Error as e:
+            # 共享存储暂时不可用：租约还没过期，下次再试
+            with print_lock:
+                print(f"[!] 分片 {shard_id} 续租失败: {e}")
+
+
+def run_shard_worker(queue_path, directory=None, lease_seconds=DEFAULT_SHARD_LEASE, owner=None,
+                     poll_interval=SHARD_POLL_INTERVAL, **scan_options):
+    """
+    工作节点：循环租用分片并扫描，直到全部分片完成，返回本节点完成的分片数。
+      - directory 为本节点上扫描根目录的路径（共享存储在各节点的挂载点可以不同），默认使用计划中的根目录
+      - 每个分片用 process_directory 扫描其文件列表，结果写入该分片进度库的租约副本（回滚日志模式），
+        完成时仍持有租约才替换分片进度库；scan_options 传给 process_directory
+      - 暂时没有可租用的分片、但其他节点还持有租约时每隔 poll_interval 秒重试，以便接手崩溃节点过期的分片
+      - 续租失败（租约已转给其他节点）时停止派发该分片的任务并放弃它（丢弃租约副本，不写分片进度库）；
+        扫描出错或被中断时释放租约
+    """
+    shard_queue = ShardQueue(queue_path)
+    directory = os.path.abspath(directory or shard_queue.load_plan()['root'])
+    owner = owner or f'{socket.gethostname()}:{os.getpid()}'
+    # 分片进度库在共享存储上，不能使用 WAL
+    lease_options = dict(scan_options, progress_options=dict(scan_options.get('progress_options') or {},
+                                                            journal_mode='delete'))
+    finished = 0
+    while True:
+        leased = shard_queue.lease(owner, lease_seconds, directory)
+        if leased is None:
+            status = shard_queue.status()
+            if not status.get(SHARD_PENDING) and not status.get(SHARD_LEASED):
+                break
+            time.sleep(poll_interval)
+            continue
+        shard_id, token, attempts, old_root = leased
+        store_path = shard_queue.shard_store_path(shard_id)
+        lease_path = shard_queue.lease_store_path(shard_id, token)
+        files = [os.path.join(directory, rel_path) for rel_path in shard_queue.shard_files(shard_id)]
+        print(f"[+] 租用分片 {shard_id}（{len(files)} 个文件"
+              f"{f'，前一个租约已过期，第 {attempts + 1} 次租用' if attempts else ''}）")
+
+        stop = threading.Event()
+        lost = threading.Event()
+        keeper = threading.Thread(target=_keep_lease, args=(shard_queue, shard_id, token, lease_seconds, stop, lost),
+                                  name=f'shard-lease-{shard_id}', daemon=True)
+        keeper.start()
+        skip_stats = {}
+        try:
+            # 在本次租约专用的副本上扫描，完成后仍持有租约才替换回去
+            if os.path.exists(store_path):
+                shutil.copyfile(store_path, lease_path)
+            rebase_shard_store(lease_path, old_root, directory)
+            process_directory(directory, progress_file=lease_path, skip_stats=skip_stats, file_list=files,
+                              cancel=lost, **lease_options).close()
+            stop.set()
+            keeper.join()
+            if not lost.is_set() and shard_queue.renew(shard_id, token, lease_seconds):
+                os.replace(lease_path, store_path)
+        except BaseException:
+            stop.set()
+            keeper.join()
+            with contextlib.suppress(sqlite3.Error):
+                shard_queue.release(shard_id, token)
+            raise
+        finally:
+            for path in (lease_path, lease_path + '-journal'):
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+        if lost.is_set() or not shard_queue.complete(shard_id, token, skip_stats):
+            print(f"[!] 分片 {shard_id} 的租约已过期并由其他节点接手，本节点放弃该分片")
+            continue
+        finished += 1
+        print(f"[+] 分片 {shard_id} 完成")
+    return finished
+
+
+def merge_shards(queue_path, directory=None, skip_stats=None):
+    """
+    合并各分片进度库中的结果，返回与 process_directory 相同的 ScanResults（临时进度库，用完后调用 close()），
+    可直接交给 format_results / probe_suspicious_links；各分片的跳过统计累加到 skip_stats。
+    键中各节点的扫描根目录统一替换为 directory（默认计划中的根目录）；未完成的分片不合并，只给出提示
+    """
+    shard_queue = ShardQueue(queue_path)
+    plan = shard_queue.load_plan()
+    root = os.path.abspath(directory or plan['root'])
+    store = ProgressStore(os.path.join(tempfile.mkdtemp(prefix='scan_blacklink_'), 'results.sqlite3'))
+    results = ScanResults(store, temporary=True)
+    merged = 0
+    try:
+        for shard_id, shard_root, shard_skips in shard_queue.done_shards():
+            store_path = shard_queue.shard_store_path(shard_id)
+            if not os.path.exists(store_path):
+                continue
+            store.import_store(store_path, shard_root, root)
+            merged += 1
+            if skip_stats is not None:
+                for reason, count in shard_skips.items():
+                    skip_stats[reason] = skip_stats.get(reason, 0) + count
+        status = shard_queue.status()
+    except BaseException:
+        results.close()
+        raise
+
+    print(f"[+] 已合并 {merged} 个分片，共 {len(results)} 个文件的结果")
+    unfinished = [status[state] for state in (SHARD_PENDING, SHARD_LEASED) if state in status]
+    if unfinished:
+        print(f"[!] 还有 {sum(s for s, _ in unfinished)} 个分片（{sum(f for _, f in unfinished)} 个文件）"
+              f"尚未完成，报告中不包含这些文件")
+    return results
+
+
+# ===================== 实时监控（--watch） =====================
+
+# 同一文件最后一次变化之后等待的秒数（连续写入合并为一次扫描），以及持续变化时最长的等待倍数
+DEFAULT_WATCH_DEBOUNCE = 1.0
+WATCH_MAX_DELAY_FACTOR = 10
+# 无法使用 inotify（非 Linux、监视数达到上限）时，两次增量 stat 扫描之间的间隔（秒）
+DEFAULT_WATCH_INTERVAL = 60.0
+# 新出现时需要立即输出的发现类别
+WATCH_ALERT_KEYS = ('suspicious_links', 'possible_hidden_links')
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_EVENTS = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                | IN_DELETE_SELF | IN_ONLYDIR)
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class WatchLimitReached(OSError):
+    """inotify 监视数达到上限（fs.inotify.max_user_watches）"""
+
+
+class Inotify:
+    """
+    通过 ctypes 直接调用 libc 的 inotify 接口（不依赖第三方库），只在 Linux 上可用，
+    不可用时构造函数抛出 OSError。每个目录一个监视，wd 到目录路径的映射保存在 paths 中
+    """
+
+    def __init__(self):
+        try:
+            self._libc = ctypes.CDLL(None, use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError, TypeError) as e:
+            raise OSError(f"当前系统不支持 inotify: {e}")
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 失败: {os.strerror(err)}")
+        self.paths = {}
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_EVENTS)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise WatchLimitReached(err, "inotify 监视数已达到上限（fs.inotify.max_user_watches）", path)
+            raise OSError(err, os.strerror(err), path)
+        self.paths[wd] = path
+        return wd
+
+    def remove_watch(self, wd):
+        self.paths.pop(wd, None)
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout):
+        """等待至多 timeout 秒，返回 [(目录路径, 事件掩码, 文件名)]；目录路径为 None 表示事件队列溢出"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask, ''))
+                continue
+            path = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+            elif path is not None:
+                events.append((path, mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def watch_log(message):
+    """监控期间的状态输出写到标准错误，标准输出只留给 JSON Lines 事件"""
+    with print_lock:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+
+class DirectoryWatcher:
+    """
+    初次扫描之后持续监控目录，只重新扫描新建或改动的文件：
+      - 优先使用 inotify（每个目录一个监视，新建的子目录自动加入），同一文件的连续事件在最后一次变化 debounce 秒后
+        合并为一次扫描（持续变化的文件最多等待 WATCH_MAX_DELAY_FACTOR 倍）
+      - inotify 不可用、监视数达到上限或事件队列溢出时，改为每隔 interval 秒做一次增量 stat 扫描（与进度库中的指纹比对）
+      - 重新扫描的结果直接更新进度库（results 为初次扫描返回的 ScanResults），已删除文件的记录被清理
+      - 与进度库中的旧结果相比新出现的可疑链接与暗链（WATCH_ALERT_KEYS）立即以 JSON Lines 写到 output，
+        每行 {"type": "link", "time", "file", "category", "value"}，与 --format jsonl 的 link 记录一致
+    其余参数与 process_directory 相同
+    """
+
+    def __init__(self, directory, results, output, debounce=DEFAULT_WATCH_DEBOUNCE, interval=DEFAULT_WATCH_INTERVAL,
+                 use_inotify=True, base_domain=None, recursive=False, extensions=None, scan_all=False, max_workers=4,
+                 black_patterns=None, engine='thread', exclude_paths=None, exclude_globs=None,
+                 walk_workers=DEFAULT_WALK_WORKERS, archives=False, **task_options):
+        self.directory = os.path.abspath(directory)
+        self.results = results
+        self.store = results.store
+        self.output = output
+        self.debounce = debounce
+        self.interval = interval
+        self.use_inotify = use_inotify
+        self.base_domain = base_domain
+        self.recursive = recursive
+        self.extensions = extensions
+        self.scan_all = scan_all
+        self.max_workers = max_workers
+        self.black_patterns = black_patterns
+        self.engine = engine
+        self.exclude_set = {os.path.abspath(p) for p in exclude_paths or ()} | set(self.store.own_files())
+        self.exclude_globs = exclude_globs
+        self.excluded = compile_exclude_globs(exclude_globs)
+        self.walk_workers = walk_workers
+        self.archives = archives
+        self.max_file_size = task_options.get('max_file_size')
+        self.file_options, self.archive_options = scan_task_options(base_domain, black_patterns, extensions,
+                                                                    scan_all, **task_options)
+        self.inotify = None
+        self.pending = {}
+        self.alerts = 0
+
+    # ---------- 过滤与监视 ----------
+
+    def _wanted(self, path):
+        if path in self.exclude_set:
+            return False
+        name = os.path.basename(path)
+        rel_path = os.path.relpath(path, self.directory).replace(os.sep, '/')
+        if self.excluded is not None and self.excluded(rel_path, name):
+            return False
+        return is_source_file(name, self.extensions, self.scan_all) or bool(self.archives and archive_kind(name))
+
+    def _watch_tree(self, top, enqueue=False):
+        """给 top 及其子目录加上监视；enqueue=True 时（新出现的目录）把其中已有的文件加入待扫描"""
+        stack = [top]
+        while stack:
+            current = stack.pop()
+            try:
+                self.inotify.add_watch(current)
+            except WatchLimitReached:
+                raise
+            except OSError:
+                continue
+            files, subdirs = _scan_directory(current, self.directory, self.recursive, self.extensions, self.scan_all,
+                                             self.exclude_set, self.excluded, self.archives)
+            if enqueue:
+                for file_path, _ in files:
+                    self._touch(file_path)
+            stack.extend(subdirs)
+
+    def _unwatch_tree(self, top):
+        prefix = top + os.sep
+        for wd, path in list(self.inotify.paths.items()):
+            if path == top or path.startswith(prefix):
+                self.inotify.remove_watch(wd)
+
+    def _start_inotify(self):
+        try:
+            self.inotify = Inotify()
+            self._watch_tree(self.directory)
+            watch_log(f"inotify 监控已启动，共监视 {len(self.inotify.paths)} 个目录")
+        except OSError as e:
+            self._stop_inotify()
+            watch_log(f"无法使用 inotify（{e}），改为每 {self.interval:g} 秒增量 stat 扫描一次")
+
+    def _stop_inotify(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    # ---------- 事件处理 ----------
+
+    def _touch(self, path):
+        now = time.monotonic()
+        first, _ = self.pending.get(path, (now, now))
+        self.pending[path] = (first, now)
+
+    def _handle(self, dir_path, mask, name):
+        path = os.path.join(dir_path, name) if name else dir_path
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO) and self.recursive:
+                rel_path = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                if self.excluded is None or not self.excluded(rel_path, name):
+                    self._watch_tree(path, enqueue=True)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._unwatch_tree(path)
+                self._forget_tree(path)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self.pending.pop(path, None)
+            self._forget(path)
+        elif name and self._wanted(path):
+            self._touch(path)
+
+    def _forget(self, path):
+        """文件已删除：清理它（以及压缩包成员）的记录"""
+        self.results.discard(path)
+        for key in self.store.get_member_metas(path):
+            self.results.discard(key)
+
+    def _forget_tree(self, top):
+        for key in self.store.iter_paths(top + os.sep):
+            self.results.discard(key)
+
+    def _due(self):
+        """取出已经静默 debounce 秒（或等待过久）的文件，返回 (文件列表, 距下一个到期的秒数或 None)"""
+        now = time.monotonic()
+        max_delay = self.debounce * WATCH_MAX_DELAY_FACTOR
+        due = []
+        wait_time = None
+        for path, (first, last) in list(self.pending.items()):
+            ready_at = min(last + self.debounce, first + max_delay)
+            if ready_at <= now:
+                due.append(path)
+                del self.pending[path]
+            else:
+                wait_time = ready_at - now if wait_time is None else min(wait_time, ready_at - now)
+        return due, wait_time
+
+    # ---------- 扫描 ----------
+
+    def sweep(self):
+        """增量 stat 扫描：与进度库中的指纹比对找出新增/变化的文件，清理已删除文件的记录，然后重新扫描"""
+        self.store.flush()
+        removed = 0
+        for key in self.store.iter_paths():
+            if not os.path.exists(archive_outer_path(key)):
+                self.results.discard(key)
+                removed += 1
+        changed = []
+        for file_path, st in iter_files(self.directory, self.recursive, self.extensions, self.scan_all,
+                                        self.exclude_set, self.exclude_globs, self.walk_workers, self.archives):
+            is_archive = self.archives and archive_kind(file_path) is not None
+            if not is_file_unchanged(self.store.get_meta(file_path + ARCHIVE_SEPARATOR if is_archive else file_path),
+                                     st):
+                changed.append(file_path)
+        if removed:
+            watch_log(f"清理已删除文件的记录 {removed} 个")
+        self.scan(changed)
+
+    def scan(self, paths):
+        """重新扫描给定的文件，更新进度库并输出新出现的发现"""
+        self.store.flush()
+        tasks = []
+        for file_path in sorted(paths):
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                self._forget(file_path)
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            if self.archives and archive_kind(file_path) is not None:
+                if self.store.get_meta(file_path) is not None:
+                    self.results.discard(file_path)
+                tasks.append((file_path, st.st_size, None, self.store.get_member_metas(file_path)))
+            elif self.max_file_size and st.st_size > self.max_file_size:
+                self.results.discard(file_path)
+            else:
+                tasks.append((file_path, st.st_size, None, None))
+        if not tasks:
+            return
+
+        if self.engine == 'process' and len(tasks) > 1:
+            results_iter = iter_process_results(tasks, self.base_domain, self.black_patterns, self.max_workers,
+                                                self.file_options, self.archive_options)
+        else:
+            results_iter = iter_thread_results(tasks, self.base_domain, self.black_patterns, self.max_workers,
+                                               self.file_options, self.archive_options)
+        scanned = alerts = 0
+        for file_path, links, meta, error, skip_reason in results_iter:
+            if skip_reason == FILE_UNCHANGED:
+                continue
+            if error is not None:
+                watch_log(f"处理文件 {file_path} 时出错: {error}")
+                continue
+            if skip_reason or links is None:
+                self.results.discard(file_path)
+                continue
+            if not is_archive_record(file_path):
+                scanned += 1
+            alerts += self._emit_new(file_path, links)
+            self.results.add(file_path, links, meta)
+        self.alerts += alerts
+        watch_log(f"重新扫描 {scanned} 个文件" + (f"，新发现 {alerts} 条可疑链接/暗链" if alerts else ""))
+
+    def _emit_new(self, file_path, links):
+        old = self.store.get_links(file_path) or {}
+        now = datetime.now().isoformat(timespec='seconds')
+        count = 0
+        for key in WATCH_ALERT_KEYS:
+            known = set(old.get(key, ()))
+            for value in links.get(key, ()):
+                if value not in known:
+                    self.output.write(json.dumps({'type': 'link', 'time': now, 'file': file_path,
+                                                  'category': key, 'value': value}, ensure_ascii=False))
+                    self.output.write('\n')
+                    count += 1
+        if count:
+            self.output.flush()
+        return count
+
+    # ---------- 主循环 ----------
+
+    def run(self, stop=None):
+        """持续监控直到 stop（threading.Event）置位或收到 Ctrl+C"""
+        if self.use_inotify:
+            self._start_inotify()
+        next_sweep = time.monotonic() + self.interval
+        try:
+            while stop is None or not stop.is_set():
+                if self.inotify is None:
+                    timeout = min(max(0.0, next_sweep - time.monotonic()), 1.0)
+                    if stop is not None:
+                        stop.wait(timeout)
+                    else:
+                        time.sleep(timeout)
+                    if time.monotonic() >= next_sweep:
+                        self.sweep()
+                        next_sweep = time.monotonic() + self.interval
+                    continue
+
+                due, wait_time = self._due()
+                if due:
+                    self.scan(due)
+                    continue
+                events = self.inotify.read_events(1.0 if wait_time is None else min(wait_time, 1.0))
+                try:
+                    for dir_path, mask, name in events:
+                        if dir_path is None:
+                            watch_log("inotify 事件队列溢出，执行一次增量 stat 扫描")
+                            self.sweep()
+                        else:
+                            self._handle(dir_path, mask, name)
+                except WatchLimitReached as e:
+                    self._stop_inotify()
+                    self.pending.clear()
+                    watch_log(f"{e.strerror}，改为每 {self.interval:g} 秒增量 stat 扫描一次")
+                    self.sweep()
+                    next_sweep = time.monotonic() + self.interval
+        except KeyboardInterrupt:
+            watch_log("收到中断信号，停止监控")
+        finally:
+            self._stop_inotify()
+            self.store.flush()
+
+
+# ===================== 扫描服务（--serve） =====================
+
+# 服务的默认工作线程数、排队上限、请求正文大小上限与同时处理的连接数上限
+DEFAULT_SERVE_WORKERS = 4
+DEFAULT_SERVE_QUEUE = 64
+DEFAULT_SERVE_MAX_BODY = 64 * 1024 * 1024
+DEFAULT_SERVE_CONNECTIONS = 128
+# 读取请求与空闲的长连接在套接字上等待的最长秒数，慢速或停住的客户端不会一直占着名额与线程
+SERVE_SOCKET_TIMEOUT = 30
+UNIX_SOCKET_PREFIX = 'unix:'
+# 按 base_domain 准备的扫描选项（及结果缓存实例）最多保留的份数，超过后淘汰最久未用的
+MAX_SERVE_SCOPES = 32
+
+
+class ServiceBusy(Exception):
+    """正在执行与排队的请求数已达上限"""
+
+
+class ScanService:
+    """
+    常驻的扫描服务：黑名单自动机、链接/域名模式与 TLD 列表在启动时准备好，之后的请求直接复用，
+    省去每次运行 CLI 的导入、编译与读取黑名单的开销。
+      - 请求在独立的工作线程池（workers 个线程）中执行，正在执行与排队的请求合计不超过 workers + queue_size 个，
+        超过时立即拒绝（ServiceBusy，HTTP 503），而不是无限堆积；HTTP 请求在读取正文之前就占用名额（admit），
+        同时读入内存的正文因此也不超过 workers + queue_size 份
+      - 目录与压缩包中的文件再由 max_workers 个线程并行扫描（同 -t）；目录请求不使用进度库
+      - 每个请求可以指定自己的 base_domain，扫描选项（以及结果缓存的作用域）按 base_domain 分别准备，
+        最多保留 MAX_SERVE_SCOPES 份（LRU），客户端不断换 base_domain 也不会让内存无限增长
+      - 指定 root 时 path 请求只能访问 root 之内的文件与目录（按真实路径判断，符号链接不能绕过），否则抛出 PermissionError
+    其余参数与 process_directory 相同（服务只用线程扫描，engine 与 progress_options 不使用）
+    """
+
+    def __init__(self, workers=DEFAULT_SERVE_WORKERS, queue_size=DEFAULT_SERVE_QUEUE, max_body=DEFAULT_SERVE_MAX_BODY,
+                 root=None, black_patterns=None, base_domain=None, recursive=False, extensions=None, scan_all=False,
+                 max_workers=4, exclude_globs=None, walk_workers=DEFAULT_WALK_WORKERS, archives=False,
+                 result_cache=None, engine='thread', progress_options=None, **task_options):
+        self.matcher = get_black_matcher(black_patterns)
+        if self.matcher is not None and task_options.get('byte_scan'):
+            # 字节级扫描用到的按编码展开的自动机也提前构建
+            self.matcher.byte_matcher()
+        self.base_domain = base_domain
+        self.root = os.path.realpath(root) if root else None
+        self.extensions = extensions
+        self.scan_all = scan_all
+        self.recursive = recursive
+        self.exclude_globs = exclude_globs
+        self.archives = archives
+        self.workers = workers
+        self.queue_size = queue_size
+        self.scan_workers = max_workers
+        self.walk_workers = walk_workers
+        self.max_body = max_body
+        self.max_file_size = task_options.get('max_file_size')
+        self.result_cache = result_cache
+        self.task_options = task_options
+        self._options = {}
+        self._options_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan-service')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._stats = {'requests': 0, 'rejected': 0, 'errors': 0, 'in_flight': 0}
+        self._stats_lock = threading.Lock()
+        self.started = time.time()
+
+    def _count(self, key, delta=1):
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    def options(self, base_domain):
+        """返回该 base_domain 对应的 (file_options, archive_options)，第一次用到时准备"""
+        with self._options_lock:
+            # 取出后重新放到末尾，字典的插入顺序即最近使用顺序
+            options = self._options.pop(base_domain, None)
+            if options is not None:
+                self._options[base_domain] = options
+            else:
+                if len(self._options) >= MAX_SERVE_SCOPES:
+                    del self._options[next(iter(self._options))]
+                # 结果缓存的作用域与 base_domain 有关，每个 base_domain 各用一个实例（共用同一个缓存文件）
+                result_cache = None
+                if self.result_cache is not None:
+                    result_cache = ResultCache(self.result_cache.path, self.result_cache.max_size)
+                options = self._options[base_domain] = scan_task_options(
+                    base_domain, self.matcher, self.extensions, self.scan_all, result_cache=result_cache,
+                    **self.task_options)
+        return options
+
+    def admit(self):
+        """
+        占用一个请求名额；正在执行与排队的请求已满时抛出 ServiceBusy。
+        名额由 run() 在请求执行完后归还，占用后没有调用 run() 时须调用 release() 归还
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise ServiceBusy()
+        self._count('requests')
+        self._count('in_flight')
+
+    def release(self):
+        self._count('in_flight', -1)
+        self._slots.release()
+
+    def run(self, fn, *args):
+        """在工作线程池中执行 fn(*args) 并等待结果（调用前须已 admit()，执行完后归还名额）"""
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        try:
+            return future.result()
+        except Exception:
+            self._count('errors')
+            raise
+
+    def submit(self, fn, *args):
+        """占用名额后在工作线程池中执行 fn(*args) 并等待结果；正在执行与排队的请求已满时抛出 ServiceBusy"""
+        self.admit()
+        return self.run(fn, *args)
+
+    def health(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'status': 'ok',
+            'uptime': round(time.time() - self.started, 3),
+            'workers': self.workers,
+            'queue_limit': self.queue_size,
+            'black_patterns': len(self.matcher) if self.matcher is not None else 0,
+            'tlds': len(_TLD_RANK),
+        })
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    # ---------- 请求处理（在工作线程中执行） ----------
+
+    def handle(self, request):
+        """
+        处理一个 JSON 请求，path（文件或目录）、content（文本）、content_base64（原始字节）三者取其一，
+        可选 base_domain；参数错误时抛出 ValueError，文件不存在时抛出 FileNotFoundError，
+        path 不在 root 之内时抛出 PermissionError
+        """
+        if not isinstance(request, dict):
+            raise ValueError("请求必须是 JSON 对象")
+        sources = [key for key in ('path', 'content', 'content_base64') if request.get(key) is not None]
+        if len(sources) != 1:
+            raise ValueError("path、content、content_base64 需要且只能指定一个")
+        for key in (*sources, 'base_domain'):
+            if request.get(key) is not None and not isinstance(request[key], str):
+                raise ValueError(f"{key} 必须是字符串")
+        base_domain = request.get('base_domain', self.base_domain)
+        if 'content' in sources:
+            return self.scan_content(request['content'].encode('utf-8'), base_domain)
+        if 'content_base64' in sources:
+            try:
+                data = base64.b64decode(request['content_base64'], validate=True)
+            except (binascii.Error, TypeError) as e:
+                raise ValueError(f"content_base64 不是有效的 base64: {e}")
+            return self.scan_content(data, base_domain)
+        path = os.path.abspath(request['path'])
+        if self.root is not None:
+            real_path = os.path.realpath(path)
+            if real_path != self.root and not real_path.startswith(self.root.rstrip(os.sep) + os.sep):
+                raise PermissionError(f"不允许访问扫描根目录之外的路径: {path}")
+        if os.path.isdir(path):
+            return self.scan_directory(path, base_domain)
+        return self.scan_path(path, base_domain)
+
+    def scan_content(self, data, base_domain=None):
+        """扫描原始内容，返回 {"links": 与 extract_links 相同的结果}（被跳过时为 {"skipped", "reason"}）"""
+        file_options, _ = self.options(base_domain)
+        if file_options['skip_binary']:
+            reason = sniff_binary(data[:BINARY_SNIFF_SIZE])
+            if reason:
+                return {'skipped': reason, 'reason': describe_skip_reason(reason)}
+        result_cache = file_options.get('result_cache')
+        content_hash = hashlib.sha256(data).hexdigest() if result_cache is not None else None
+        links = result_cache.get(content_hash) if result_cache is not None else None
+        if links is None:
+            links = extract_links_from_stream(
+                io.BytesIO(data), len(data), base_domain, self.matcher,
+                **{key: file_options[key] for key in ('window_size', 'window_overlap', 'hidden_detector',
+                                                      'hidden_timeout', 'byte_scan')})
+            if result_cache is not None:
+                result_cache.put(content_hash, links)
+        return {'links': links}
+
+    def scan_path(self, path, base_domain=None):
+        """
+        扫描单个文件，返回 {"file", "links"}（被跳过时为 {"file", "skipped", "reason"}）；
+        开启压缩包扫描时压缩包返回 {"file", "files", "skipped", "errors"}，键为 压缩包路径!/成员路径
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"文件不存在: {path}")
+        file_options, archive_options = self.options(base_domain)
+        if self.archives and archive_kind(path) is not None:
+            results = process_task(path, base_domain, self.matcher, None, {}, file_options, archive_options)
+            return dict({'file': path}, **collect_scan_results(results))
+        if self.max_file_size and os.path.getsize(path) > self.max_file_size:
+            return {'file': path, 'skipped': SKIP_TOO_LARGE, 'reason': describe_skip_reason(SKIP_TOO_LARGE)}
+        _, links, _, error, skip_reason = process_single_file(path, base_domain, self.matcher, **file_options)
+        if error is not None:
+            raise OSError(error)
+        if skip_reason:
+            return {'file': path, 'skipped': skip_reason, 'reason': describe_skip_reason(skip_reason)}
+        return {'file': path, 'links': links}
+
+    def scan_directory(self, directory, base_domain=None):
+        """扫描目录（不使用进度库），返回 {"directory", "files": {路径: 结果}, "skipped": {路径: 原因}, "errors"}"""
+        file_options, archive_options = self.options(base_domain)
+        too_large = []
+
+        def iter_tasks():
+            for file_path, st in iter_files(directory, self.recursive, self.extensions, self.scan_all,
+                                            exclude_globs=self.exclude_globs, workers=self.walk_workers,
+                                            archives=self.archives):
+                if self.archives and archive_kind(file_path) is not None:
+                    yield file_path, st.st_size, None, {}
+                elif self.max_file_size and st.st_size > self.max_file_size:
+                    too_large.append(file_path)
+                else:
+                    yield file_path, st.st_size, None, None
+
+        response = dict({'directory': directory}, **collect_scan_results(iter_thread_results(
+            iter_tasks(), base_domain, self.matcher, self.scan_workers, file_options, archive_options)))
+        for file_path in too_large:
+            response['skipped'][file_path] = SKIP_TOO_LARGE
+        return response
+
+
+def collect_scan_results(results):
+    """把 (file_path, links, meta, error, skip_reason) 结果汇总为 {"files", "skipped", "errors"}（按路径排序）"""
+    files, skipped, errors = {}, {}, {}
+    for file_path, links, _, error, skip_reason in sorted(results, key=lambda r: r[0]):
+        if error is not None:
+            errors[file_path] = error
+        elif skip_reason:
+            skipped[file_path] = skip_reason
+        elif links is not None and not is_archive_record(file_path):
+            files[file_path] = links
+    return {'files': files, 'skipped': skipped, 'errors': errors}
+
+
+class _ScanHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health        服务状态与计数
+    POST /scan          JSON 请求（见 ScanService.handle）
+    POST /scan/content  请求正文即为待扫描的原始内容，base_domain 可放在查询参数中
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = SERVE_SOCKET_TIMEOUT
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            self._reply(404, {'error': f"未知的路径: {self.path}"})
+            return
+        self._reply(200, self.server.service.health())
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path not in ('/scan', '/scan/content'):
+            self._reply(404, {'error': f"未知的路径: {url.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > service.max_body:
+            # 没有读取正文，连接不能再复用
+            self.close_connection = True
+            self._reply(413 if length > 0 else 400, {'error': f"请求正文大小无效或超过上限（{service.max_body} 字节）"},
+                        {'Connection': 'close'})
+            return
+        try:
+            # 先占用名额再读取正文：名额已满时直接拒绝，大量并发上传不会先把正文全部读进内存
+            service.admit()
+        except ServiceBusy:
+            self.close_connection = True
+            self._reply(503, {'error': "排队的请求已满，请稍后重试"}, {'Retry-After': '1', 'Connection': 'close'})
+            return
+        try:
+            try:
+                body = self.rfile.read(length)
+                if len(body) < length:
+                    raise ConnectionError("请求正文不完整")
+            except BaseException:
+                service.release()
+                raise
+        except (ConnectionError, TimeoutError):
+            # 客户端断开或超时没有发完正文，不再回复
+            self.close_connection = True
+            return
+        try:
+            try:
+                if url.path == '/scan/content':
+                    base_domain = parse_qs(url.query).get('base_domain', [service.base_domain])[0]
+                    call = (service.scan_content, body, base_domain)
+                else:
+                    try:
+                        request = json.loads(body.decode('utf-8') or '{}')
+                    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                        raise ValueError(f"请求不是有效的 JSON: {e}")
+                    call = (service.handle, request)
+            except BaseException:
+                service.release()
+                raise
+            result = service.run(*call)
+        except ValueError as e:
+            self._reply(400, {'error': str(e)})
+        except FileNotFoundError as e:
+            self._reply(404, {'error': str(e)})
+        except PermissionError as e:
+            self._reply(403, {'error': str(e)})
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+        else:
+            self._reply(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _BoundedThreadingMixIn(socketserver.ThreadingMixIn):
+    """
+    每个连接一个处理线程，但同时处理的连接不超过 max_connections 个：
+    超过时直接回复 503 并关闭连接（不读取请求），线程数与其占用的内存不会随连接数无限增长
+    """
+
+    daemon_threads = True
+    max_connections = DEFAULT_SERVE_CONNECTIONS
+    busy_response = (b'HTTP/1.1 503 Service Unavailable\r\n'
+                     b'Content-Type: application/json; charset=utf-8\r\n'
+                     b'Retry-After: 1\r\nConnection: close\r\n')
+
+    def process_request(self, request, client_address):
+        if not self._connections.acquire(blocking=False):
+            body = json.dumps({'error': "同时处理的连接已满，请稍后重试"}, ensure_ascii=False).encode('utf-8')
+            with contextlib.suppress(OSError):
+                request.sendall(self.busy_response + f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+            self.shutdown_request(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._connections.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._connections.release()
+
+
+class _ScanHTTPServer(_BoundedThreadingMixIn, HTTPServer):
+    pass
+
+
+class _UnixHTTPServer(_BoundedThreadingMixIn, socketserver.UnixStreamServer):
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler 按 (host, port) 使用客户端地址，Unix 套接字没有
+        return request, ('unix', 0)
+
+
+def parse_serve_address(text):
+    """解析 --serve：unix:PATH 为 Unix 套接字路径，否则按 [HOST:]PORT 解析（HOST 默认为 127.0.0.1）"""
+    if text.startswith(UNIX_SOCKET_PREFIX):
+        path = text[len(UNIX_SOCKET_PREFIX):]
+        if not path:
+            raise ValueError(f"缺少 Unix 套接字路径: {text}")
+        return os.path.abspath(path)
+    return parse_listen_address(text)
+
+
+def is_loopback_host(host):
+    """host 是否只能从本机访问（localhost 或回环地址）；主机名按可能对外处理"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_scan_server(service, address, max_connections=DEFAULT_SERVE_CONNECTIONS):
+    """
+    创建扫描服务的 HTTP server：address 为 (host, port) 或 Unix 套接字路径（已存在的旧套接字文件会被替换），
+    同时处理的连接不超过 max_connections 个
+    """
+    if isinstance(address, str):
+        with contextlib.suppress(FileNotFoundError):
+            if stat.S_ISSOCK(os.stat(address).st_mode):
+                os.remove(address)
+        server = _UnixHTTPServer(address, _ScanHandler)
+    else:
+        server = _ScanHTTPServer(address, _ScanHandler)
+    server.max_connections = max(1, max_connections)
+    server._connections = threading.BoundedSemaphore(server.max_connections)
+    server.service = service
+    return server
+
+
+def describe_server_address(server):
+    address = server.server_address
+    if isinstance(address, str):
+        return f"{UNIX_SOCKET_PREFIX}{address}"
+    return f"http://{address[0]}:{address[1]}"
+
+
+# ===================== HTTP 探测相关 =====================
+
+def normalize_url_for_probe(target):
+    """将提取到的字符串归一化为可探测的 URL"""
+    if not target:
+        return None
+    t = target.strip()
+    if not t:
+        return None
+
+    if t.startswith(('http://', 'https://')):
+        return t
+    if t.startswith('//'):
+        return 'http:' + t
+    if t.startswith('/'):
+        return None
+    return 'http://' + t
+
+
+# 探测结果中保留的响应头
+PROBE_INTERESTING_HEADERS = [
+    'Server', 'X-Powered-By', 'Location',
+    'Set-Cookie', 'Content-Type',
+    'Referrer-Policy', 'Content-Security-Policy'
+]
+
+# 异步探测引擎的默认全局并发数与单个主机的并发连接数
+DEFAULT_PROBE_CONCURRENCY = 500
+DEFAULT_PROBE_PER_HOST = 4
+
+# 探测时最多读取的响应正文字节数（解压后）与每次读取的块大小；
+# 正文按块流式读取、边读边匹配关键词，超过上限即断开，不会整页下载
+DEFAULT_PROBE_MAX_BODY = 512 * 1024
+PROBE_BODY_CHUNK = 16 * 1024
+
+# 需要读取正文做关键词匹配的 Content-Type（未声明类型的响应也会读取），其余类型（图片、压缩包等）不下载正文
+PROBE_TEXT_TYPES = (
+    'text/', 'application/xhtml', 'application/xml', 'application/json',
+    'application/javascript', 'application/x-javascript', 'application/ecmascript',
+)
+PROBE_TEXT_SUFFIXES = ('+xml', '+json')
+
+# 正文读取情况（探测结果中的 body_status）
+BODY_COMPLETE = 'complete'
+BODY_TRUNCATED = 'truncated'
+BODY_EARLY_STOP = 'early_stop'
+BODY_SKIPPED = 'skipped'
+
+# 每个线程复用一个 requests.Session（连接池 + keep-alive），避免每次探测都重新握手
+_probe_local = threading.local()
+
+
+def build_probe_attempts(url):
+    """
+    探测顺序：
+      1. 先按传入的 URL 原样访问
+      2. 若是 http:// 且失败，再自动尝试 https://
+    """
+    attempt_urls = [url]
+
+    parsed = urlparse(url)
+    if parsed.scheme == "http":
+        https_parsed = parsed._replace(scheme="https", netloc=parsed.netloc)
+        https_url = urlunparse((
+            https_parsed.scheme,
+            https_parsed.netloc,
+            https_parsed.path or "",
+            https_parsed.params or "",
+            https_parsed.query or "",
+            ""
+        ))
+        if https_url != url:
+            attempt_urls.append(https_url)
+    return attempt_urls
+
+
+def pick_interesting_headers(headers):
+    """从响应头中挑出报告关心的几项（aiohttp 的同名多值头与 requests 一样用 ', ' 合并）"""
+    if hasattr(headers, 'getall'):
+        return {key: ', '.join(headers.getall(key)) for key in PROBE_INTERESTING_HEADERS if key in headers}
+    return {key: headers[key] for key in PROBE_INTERESTING_HEADERS if key in headers}
+
+
+def _get_probe_session():
+    session = getattr(_probe_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _probe_local.session = session
+    return session
+
+
+def parse_content_type(value):
+    """拆分 Content-Type 响应头，返回 (小写的媒体类型, charset 或 None)"""
+    if not value:
+        return '', None
+    mime, _, params = value.partition(';')
+    charset = None
+    for param in params.split(';'):
+        key, _, val = param.partition('=')
+        if key.strip().lower() == 'charset':
+            charset = val.strip().strip('"\'') or None
+    return mime.strip().lower(), charset
+
+
+def is_text_content_type(mime):
+    """是否需要读取正文做关键词匹配：文本类类型或未声明类型"""
+    return not mime or mime.startswith(PROBE_TEXT_TYPES) or mime.endswith(PROBE_TEXT_SUFFIXES)
+
+
+class BodyKeywordScanner:
+    """
+    响应正文的增量关键词匹配：按块喂入原始字节，增量解码后与上一块末尾拼接再匹配，
+    跨块的关键词不会漏掉；读满 max_bytes 字节或（early_stop 时）全部关键词都已命中后停止
+    """
+
+    def __init__(self, matcher, charset=None, max_bytes=DEFAULT_PROBE_MAX_BODY, early_stop=False):
+        self.matcher = matcher
+        self.max_bytes = max_bytes
+        self.early_stop = early_stop
+        try:
+            decoder = codecs.getincrementaldecoder(charset or 'utf-8')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')
+        self._decoder = decoder(errors='ignore')
+        self._keep = max(len(p) for p in matcher.patterns) - 1
+        self._tail = ''
+        self.hits = set()
+        self.bytes_read = 0
+        self.status = BODY_COMPLETE
+
+    def _match(self, text):
+        text = self._tail + text
+        self.hits.update(self.matcher.find_all(text))
+        self._tail = text[-self._keep:] if self._keep else ''
+
+    def feed(self, chunk):
+        """喂入一块正文，返回是否还需要继续读取"""
+        room = self.max_bytes - self.bytes_read
+        if len(chunk) > room:
+            chunk = chunk[:room]
+        self.bytes_read += len(chunk)
+        self._match(self._decoder.decode(chunk))
+        if self.early_stop and len(self.hits) == len(self.matcher):
+            self.status = BODY_EARLY_STOP
+            return False
+        if self.bytes_read >= self.max_bytes:
+            self.status = BODY_TRUNCATED
+            return False
+        return True
+
+    def finish(self):
+        self._match(self._decoder.decode(b'', final=True))
+        return sorted(self.hits)
+
+
+def build_probe_info(status_code, final_url, headers, scanner=None, body_skipped=False):
+    """组装探测结果；读取过正文时附带命中的关键词与正文读取情况"""
+    info = {
+        'status_code': status_code,
+        'final_url': final_url,
+        'headers': pick_interesting_headers(headers),
+        'body_keyword_hits': scanner.finish() if scanner else [],
+    }
+    if scanner:
+        info['body_bytes'] = scanner.bytes_read
+        info['body_status'] = scanner.status
+    elif body_skipped:
+        info['body_status'] = BODY_SKIPPED
+    return info
+
+
+def make_body_scanner(matcher, content_type, max_body, early_stop):
+    """按 Content-Type 决定是否读取正文：返回 (scanner, 是否因非文本类型跳过)"""
+    if not matcher:
+        return None, False
+    mime, charset = parse_content_type(content_type)
+    if not is_text_content_type(mime):
+        return None, True
+    return BodyKeywordScanner(matcher, charset, max_body, early_stop), False
+
+
+def _probe_attempt(attempt_url, timeout, matcher, max_body, early_stop, cancel=None):
+    """
+    单次 HTTP 请求（线程引擎）：成功返回探测结果，失败抛出异常；
+    cancel 被设置后（赛跑中另一协议已先应答）停止读取正文
+    """
+    with _get_probe_session().get(
+        attempt_url,
+        timeout=timeout,
+        allow_redirects=True,
+        verify=False,
+        stream=True
+    ) as resp:
+        scanner, skipped = make_body_scanner(matcher, resp.headers.get('Content-Type'), max_body, early_stop)
+        if scanner:
+            for chunk in resp.iter_content(PROBE_BODY_CHUNK):
+                if (cancel is not None and cancel.is_set()) or not scanner.feed(chunk):
+                    break
+        info = build_probe_info(resp.status_code, resp.url, resp.headers, scanner, skipped)
+        info['scheme'] = urlparse(attempt_url).scheme
+        return info
+
+
+def _race_probe_attempts(attempt_urls, executor, timeout, matcher, max_body, early_stop):
+    """
+    同时发出各协议的请求，取最先得到应答（任意状态码）的结果，其余请求取消：
+    尚未开始的直接撤销，正在读取正文的停止读取；连接阶段无法中断，最多占用到超时为止
+    """
+    cancel = threading.Event()
+    futures = [executor.submit(_probe_attempt, u, timeout, matcher, max_body, early_stop, cancel)
+               for u in attempt_urls]
+    errors = [None] * len(futures)
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for i, future in enumerate(futures):
+                if future not in done:
+                    continue
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors[i] = str(e)
+    finally:
+        cancel.set()
+        for future in futures:
+            future.cancel()
+    return {'error': errors[-1] or 'unknown error'}
+
+
+def probe_single_url(url, timeout=5.0, black_patterns=None, max_body=DEFAULT_PROBE_MAX_BODY, early_stop=False,
+                     race_executor=None):
+    """
+    对单个 URL 进行 HTTP 探测（线程引擎，每个线程复用一个 Session）：
+      1. 先按传入的 URL 原样访问
+      2. 若是 http:// 且失败，再自动尝试 https://
+    传入 race_executor 时 http 与 https 两个请求在该线程池中同时发出（赛跑），最先应答的胜出，
+    最坏耗时从 2 倍超时降为 1 倍；结果中的 scheme 记录实际应答的协议。
+    正文以流式读取，最多 max_body 字节；early_stop=True 时全部关键词都已命中即停止读取
+    """
+    matcher = get_black_matcher(black_patterns)
+    attempt_urls = build_probe_attempts(url)
+    if race_executor is not None and len(attempt_urls) > 1:
+        return _race_probe_attempts(attempt_urls, race_executor, timeout, matcher, max_body, early_stop)
+
+    last_error = None
+    for attempt_url in attempt_urls:
+        try:
+            return _probe_attempt(attempt_url, timeout, matcher, max_body, early_stop)
+        except Exception as e:
+            last_error = str(e)
+
+    return {'error': last_error or 'unknown error'}
+
+
+def _profile_probe(url, *args):
+    """开启剖析时的 probe_single_url：另外记录探测耗时与失败主机"""
+    started = time.perf_counter()
+    info = probe_single_url(url, *args)
+    _profiler.record_probe(url, info, time.perf_counter() - started)
+    return info
 
-    results['external_links'] = sorted(set(results['external_links']))
-    results['possible_hidden_links'] = sorted(set(results['possible_hidden_links']))
-    results['internal_links'] = sorted(set(results['internal_links']))
-    results['other_links'] = sorted(set(results['other_links']))
-    results['domain_tokens'] = sorted(set(results['domain_tokens']))
-    results['suspicious_links'] = sorted(suspicious_set)
 
-    return results
+async def _probe_attempt_async(session, attempt_url, client_timeout, matcher, max_body, early_stop):
+    """单次 HTTP 请求（异步引擎）：成功返回探测结果，失败抛出异常"""
+    async with session.get(attempt_url, allow_redirects=True, ssl=False, timeout=client_timeout) as resp:
+        scanner, skipped = make_body_scanner(matcher, resp.headers.get('Content-Type'), max_body, early_stop)
+        if scanner:
+            async for chunk in resp.content.iter_chunked(PROBE_BODY_CHUNK):
+                if not scanner.feed(chunk):
+                    break
+        info = build_probe_info(resp.status, str(resp.url), resp.headers, scanner, skipped)
+        info['scheme'] = urlparse(attempt_url).scheme
+        return info
 
 
-def is_source_file(filename, extensions=None, scan_all=False):
+async def probe_single_url_async(session, url, timeout=5.0, black_patterns=None,
+                                 max_body=DEFAULT_PROBE_MAX_BODY, early_stop=False, race=False):
     """
-    判断文件是否需要扫描：
-      - scan_all=True：所有文件都扫
-      - 否则：如果指定了 extensions，则按扩展名过滤；没指定就默认所有
+    probe_single_url 的异步版本（aiohttp，共享连接池），返回结构相同。
+    正文同样按块流式读取、增量匹配，不会整页读入内存；race=True 时 http 与 https 同时请求，
+    最先应答的胜出，另一个任务直接取消
     """
-    if scan_all:
-        return True
-    if extensions:
-        ext = os.path.splitext(filename)[1].lower()
-        return ext in extensions
-    # 没有指定 extensions，但 scan_all=False 的情况，退回到全扫
-    return True
+    matcher = get_black_matcher(black_patterns)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    attempt_urls = build_probe_attempts(url)
+
+    if race and len(attempt_urls) > 1:
+        tasks = [asyncio.ensure_future(_probe_attempt_async(session, u, client_timeout, matcher, max_body,
+                                                            early_stop))
+                 for u in attempt_urls]
+        errors = [None] * len(tasks)
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for i, task in enumerate(tasks):
+                    if task not in done:
+                        continue
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    errors[i] = str(error) or type(error).__name__
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return {'error': errors[-1] or 'unknown error'}
+
+    last_error = None
+    for attempt_url in attempt_urls:
+        try:
+            return await _probe_attempt_async(session, attempt_url, client_timeout, matcher, max_body, early_stop)
+        except Exception as e:
+            last_error = str(e) or type(e).__name__
+
+    return {'error': last_error or 'unknown error'}
+
 
+async def _probe_urls_async(targets, black_patterns, timeout, concurrency, per_host, on_result,
+                            max_body=DEFAULT_PROBE_MAX_BODY, early_stop=False, race=False):
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ssl=False)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        pending = iter(targets)
 
-def process_single_file(file_path, base_domain, file_num, total_files, black_patterns=None):
+        # 固定数量的协程从同一个迭代器取目标：在途探测数不超过 concurrency，
+        # 也不会为每个目标预先创建一个任务
+        async def worker():
+            for url in pending:
+                started = time.perf_counter()
+                info = await probe_single_url_async(session, url, timeout, black_patterns, max_body, early_stop,
+                                                    race)
+                if _profiler is not None:
+                    _profiler.record_probe(url, info, time.perf_counter() - started)
+                on_result(url, info)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(targets))))))
+
+
+def probe_urls_async(targets, black_patterns=None, timeout=5.0, concurrency=DEFAULT_PROBE_CONCURRENCY,
+                     per_host=DEFAULT_PROBE_PER_HOST, on_result=None, max_body=DEFAULT_PROBE_MAX_BODY,
+                     early_stop=False, race=False):
     """
-    处理单个文件（供多线程使用）
+    异步探测引擎：在一个事件循环里并发探测 targets，
+    全局在途探测数不超过 concurrency，同一主机的并发连接数不超过 per_host（连接复用 keep-alive）。
+    每完成一个目标调用 on_result(url, info)，返回 {url: info}
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            source_code = f.read()
+    results = {}
 
-        links = extract_links(source_code, base_domain, black_patterns)
+    def collect(url, info):
+        results[url] = info
+        if on_result:
+            on_result(url, info)
 
-        with print_lock:
-            print(f"[{file_num}/{total_files}] 已处理: {file_path}")
+    asyncio.run(_probe_urls_async(list(targets), get_black_matcher(black_patterns), timeout,
+                                  concurrency, per_host, collect, max_body, early_stop, race))
+    return results
 
-        return (file_path, links)
-    except Exception as e:
-        with print_lock:
-            print(f"[{file_num}/{total_files}] 处理文件 {file_path} 时出错: {str(e)}")
-        return (file_path, None)
 
+# ===================== 探测结果缓存 =====================
 
-def collect_files(directory, recursive=False, extensions=None, scan_all=False,
-                  exclude_paths=None):
-    """收集需要处理的所有文件（统一使用绝对路径），可以排除指定路径"""
-    exclude_set = set()
-    if exclude_paths:
-        exclude_set = {os.path.abspath(p) for p in exclude_paths}
-
-    files_to_process = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.abspath(os.path.join(root, file))
-
-            # 关键：跳过进度文件（以及未来你想排除的其他文件）
-            if file_path in exclude_set:
-                continue
+# 探测缓存的默认位置与大小上限；缓存跨目录、跨运行共享
+DEFAULT_PROBE_CACHE = os.path.join(CACHE_DIR, 'probe_cache.sqlite3')
+DEFAULT_PROBE_CACHE_SIZE = 64 * 1024 * 1024
 
-            if is_source_file(file, extensions, scan_all):
-                files_to_process.append(file_path)
+# 探测结果的三类及各自默认有效期（秒）：成功的结果相对稳定，
+# 失败多为临时故障（超时/连接被拒），域名不存在介于两者之间
+PROBE_CACHE_OK = 'ok'
+PROBE_CACHE_ERROR = 'error'
+PROBE_CACHE_NXDOMAIN = 'nxdomain'
+DEFAULT_PROBE_CACHE_TTL = {
+    PROBE_CACHE_OK: 24 * 3600,
+    PROBE_CACHE_ERROR: 3600,
+    PROBE_CACHE_NXDOMAIN: 6 * 3600,
+}
 
-        if not recursive:
-            break
-    return files_to_process
+# 新结果每攒够多少条写入一次缓存
+PROBE_CACHE_BATCH = 200
 
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
 
 
-# ===================== 断点续跑相关函数 =====================
+def parse_duration(text):
+    """解析时长：纯数字为秒，也可带 s/m/h/d 后缀（如 90、30m、12h、7d）"""
+    text = text.strip().lower()
+    unit = _DURATION_UNITS.get(text[-1:])
+    value = float(text[:-1] if unit else text)
+    if value < 0:
+        raise ValueError(f"时长不能为负数: {text}")
+    return value * (unit or 1)
+
 
-def append_progress_record(progress_file, file_path, links):
+def parse_probe_cache_ttl(spec):
     """
-    将单个文件的分析结果追加写入进度文件（JSONL，一行一条）
+    解析 --probe-cache-ttl：单个时长同时作用于三类结果，
+    或用逗号分隔的 类别=时长 分别指定（如 ok=1d,error=30m,nxdomain=6h），未指定的类别沿用默认值
     """
-    if not progress_file:
-        return
-    record = {
-        "file": file_path,
-        "links": links
-    }
-    line = json.dumps(record, ensure_ascii=False)
-    with progress_lock:
-        with open(progress_file, 'a', encoding='utf-8') as pf:
-            pf.write(line + '\n')
-
-
-def load_progress(progress_file, ignore_path=None):
+    ttl = dict(DEFAULT_PROBE_CACHE_TTL)
+    if not spec:
+        return ttl
+    if '=' not in spec:
+        value = parse_duration(spec)
+        return {kind: value for kind in ttl}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        kind, _, value = part.partition('=')
+        kind = kind.strip().lower()
+        if kind not in ttl:
+            raise ValueError(f"未知的探测结果类别: {kind}（可选 {', '.join(ttl)}）")
+        ttl[kind] = parse_duration(value)
+    return ttl
+
+
+def probe_cache_key(url):
     """
-    从进度文件恢复已处理文件的结果：
-
-    返回:
-        all_results: {file_path: links_dict}
-        processed_files: set([...])  已经处理过的绝对路径文件集合
+    探测缓存键：协议与主机名转小写，去掉默认端口与片段，空路径视为 /，
+    写法不同但指向同一地址的 URL 共用一条缓存
+    """
+    try:
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or '').lower()
+        port = parsed.port
+    except ValueError:
+        return url
+    if ':' in host:
+        host = f'[{host}]'
+    if port is not None and port != _DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{port}'
+    userinfo = parsed.netloc.rpartition('@')[0]
+    netloc = f'{userinfo}@{host}' if userinfo else host
+    return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, parsed.query, ''))
+
+
+def probe_result_kind(info):
+    """探测结果的类别：DNS 预解析判定不存在 / 探测失败 / 探测成功"""
+    if 'dns' in info:
+        return PROBE_CACHE_NXDOMAIN
+    if 'error' in info:
+        return PROBE_CACHE_ERROR
+    return PROBE_CACHE_OK
+
+
+class ProbeCache(SQLiteCache):
+    """
+    以归一化 URL 为键的 HTTP 探测结果缓存，存放在 SQLite 文件中：
+      - 成功、失败、域名不存在三类结果各有独立的有效期（ttl），过期条目视为未命中
+      - 正文关键词命中依赖黑名单，黑名单的摘要作为缓存键的一部分
+      - 总大小超过 max_size 字节后按最近使用时间（LRU）淘汰，并顺带清理过期条目
+      - 缓存读写失败只当作未命中，不影响探测本身
     """
-    all_results = {}
-    processed_files = set()
-
-    if not progress_file or not os.path.exists(progress_file):
-        return all_results, processed_files
 
-    ignore_abs = os.path.abspath(ignore_path) if ignore_path else None
+    TABLE = 'probes'
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS probes ('
+        ' url TEXT NOT NULL, scope TEXT NOT NULL, kind TEXT NOT NULL, info TEXT NOT NULL,'
+        ' stored_at REAL NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL,'
+        ' PRIMARY KEY (url, scope))',
+        'CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used)',
+    )
 
-    print(f"[+] 检测到进度文件，尝试从 {progress_file} 恢复...")
-    try:
-        with open(progress_file, 'r', encoding='utf-8') as pf:
-            for line_no, line in enumerate(pf, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    rec = json.loads(line)
-                    file_path = rec.get("file")
-                    links = rec.get("links")
-                    if not file_path or not isinstance(links, dict):
+    def __init__(self, path=DEFAULT_PROBE_CACHE, max_size=DEFAULT_PROBE_CACHE_SIZE, ttl=None, scope=''):
+        super().__init__(path, max_size)
+        self.ttl = dict(DEFAULT_PROBE_CACHE_TTL, **(ttl or {}))
+        self.scope = scope
+
+    def set_scope(self, black_patterns=None):
+        matcher = get_black_matcher(black_patterns)
+        patterns = sorted(matcher.patterns) if matcher else []
+        self.scope = hashlib.sha256(json.dumps(patterns, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def get_many(self, urls):
+        """批量查找未过期的探测结果，返回 {url: info}（url 为调用方传入的原始写法）"""
+        keys = {}
+        for url in urls:
+            keys.setdefault(probe_cache_key(url), []).append(url)
+        found = {}
+        now = time.time()
+        try:
+            conn = self._connect()
+            key_list = list(keys)
+            hit_keys = []
+            for i in range(0, len(key_list), 500):
+                batch = key_list[i:i + 500]
+                rows = conn.execute(
+                    f'SELECT url, kind, info, stored_at FROM probes WHERE scope = ? '
+                    f'AND url IN ({", ".join("?" * len(batch))})',
+                    [self.scope] + batch
+                ).fetchall()
+                for key, kind, info, stored_at in rows:
+                    if now - stored_at > self.ttl.get(kind, 0):
                         continue
-                    abs_path = os.path.abspath(file_path)
+                    info = json.loads(info)
+                    for url in keys[key]:
+                        found[url] = info
+                    hit_keys.append((now, key, self.scope))
+            conn.executemany('UPDATE probes SET last_used = ? WHERE url = ? AND scope = ?', hit_keys)
+            conn.commit()
+        except (sqlite3.Error, ValueError):
+            pass
+        return found
+
+    def put_many(self, items):
+        """批量写入 [(url, info)]，同一事务提交"""
+        now = time.time()
+        rows = []
+        for url, info in items:
+            data = json.dumps(info, ensure_ascii=False)
+            rows.append((probe_cache_key(url), self.scope, probe_result_kind(info), data, now, len(data), now))
+        if not rows:
+            return
+        try:
+            conn = self._connect()
+            conn.executemany(
+                'INSERT OR REPLACE INTO probes (url, scope, kind, info, stored_at, size, last_used)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.commit()
+            self._count_put(len(rows))
+        except sqlite3.Error:
+            pass
+
+    def purge_expired(self):
+        """删除已过期的条目"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            for kind, ttl in self.ttl.items():
+                conn.execute('DELETE FROM probes WHERE kind = ? AND stored_at < ?', (kind, now - ttl))
+            conn.commit()
+        except sqlite3.Error:
+            pass
 
-                    # 关键：忽略进度文件自身（旧版本可能写过进去）
-                    if ignore_abs and abs_path == ignore_abs:
-                        continue
+    def evict(self):
+        self.purge_expired()
+        super().evict()
 
-                    processed_files.add(abs_path)
-                    all_results[abs_path] = links
-                except Exception as e:
-                    with print_lock:
-                        print(f"[!] 解析进度文件第 {line_no} 行失败: {e}")
-    except Exception as e:
-        with print_lock:
-            print(f"[!] 读取进度文件失败: {e}")
 
-    print(f"[+] 已从进度文件恢复 {len(processed_files)} 个文件的结果")
-    return all_results, processed_files
+# ===================== DNS 预解析 =====================
 
+# DNS 预解析的默认超时（秒）与并发数
+DEFAULT_DNS_TIMEOUT = 2.0
+DEFAULT_DNS_WORKERS = 64
 
-def process_directory(directory, base_domain=None, recursive=False,
-                      extensions=None, scan_all=False, max_workers=4,
-                      black_patterns=None, progress_file=None):
-    """
-    处理目录中的所有文件（支持多线程 + 断点续跑）
-    """
-    directory = os.path.abspath(directory)
+# 解析结果状态：ok 有地址；nxdomain 域名不存在；nodata 域名存在但没有地址记录；error 超时或其他错误（不缓存）
+DNS_OK = 'ok'
+DNS_NXDOMAIN = 'nxdomain'
+DNS_NODATA = 'nodata'
+DNS_ERROR = 'error'
 
-    # 1. 先从进度文件恢复已有结果（显式忽略进度文件自己）
-    all_results, processed_files = load_progress(progress_file, ignore_path=progress_file)
 
-    # 2. 收集当前目录下所有需要处理的文件，并排除进度文件
-    files_to_process = collect_files(
-        directory,
-        recursive=recursive,
-        extensions=extensions,
-        scan_all=scan_all,
-        exclude_paths=[progress_file] if progress_file else None,
-    )
-    total_files = len(files_to_process)
+class HostNotFound(Exception):
+    """权威的否定应答：域名不存在（NXDOMAIN）或没有地址记录（NODATA）"""
 
-    if total_files == 0:
-        print("未在目标目录中找到任何需要处理的文件")
-        return all_results
+    def __init__(self, host, status=DNS_NXDOMAIN):
+        super().__init__(f"{host}: {status}")
+        self.host = host
+        self.status = status
 
-    # 3. 计算还需要处理的文件
-    pending_files = [f for f in files_to_process if f not in processed_files]
-    total_pending = len(pending_files)
 
-    print(f"当前目录共发现 {total_files} 个需扫描文件，其中 {len(processed_files)} 个已在进度文件中处理过")
-    print(f"本次需要新增处理的文件数: {total_pending}")
+class SystemResolver:
+    """使用系统解析器（getaddrinfo）；getaddrinfo 本身不能设置超时，放到守护线程里等待 timeout 秒"""
 
-    if total_pending == 0:
-        print("\n所有文件均已处理，无需重新扫描。")
-        return all_results
+    def __init__(self, timeout=DEFAULT_DNS_TIMEOUT):
+        self.timeout = timeout
 
-    print(f"使用 {max_workers} 个线程进行并行处理...\n")
+    def resolve(self, host):
+        box = {}
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_file = {
-            executor.submit(
-                process_single_file,
-                file_path,
-                base_domain,
-                idx + 1,
-                total_pending,
-                black_patterns
-            ): file_path
-            for idx, file_path in enumerate(pending_files)
-        }
+        def run():
+            try:
+                box['addrs'] = sorted({info[4][0] for info in socket.getaddrinfo(host, None,
+                                                                                  proto=socket.IPPROTO_TCP)})
+            except Exception as e:
+                box['error'] = e
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        worker.join(self.timeout)
+        if worker.is_alive():
+            raise TimeoutError(f"DNS 解析超时（{self.timeout}s）")
+        error = box.get('error')
+        if isinstance(error, socket.gaierror):
+            if error.errno == socket.EAI_NONAME:
+                raise HostNotFound(host, DNS_NXDOMAIN)
+            if error.errno == getattr(socket, 'EAI_NODATA', None):
+                raise HostNotFound(host, DNS_NODATA)
+        if error is not None:
+            raise error
+        return box['addrs']
+
+
+class DnsServerResolver:
+    """直接向指定的 DNS 服务器发送 UDP A 记录查询（可指向本地的替身 DNS 服务器）"""
+
+    def __init__(self, server, port=53, timeout=DEFAULT_DNS_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+
+    @staticmethod
+    def build_query(query_id, host):
+        labels = b''.join(bytes([len(label)]) + label for label in host.encode('idna').split(b'.') if label)
+        return struct.pack('>HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + labels + b'\x00' + struct.pack('>HH', 1, 1)
+
+    @staticmethod
+    def _skip_name(data, offset):
+        while True:
+            length = data[offset]
+            if length & 0xC0 == 0xC0:
+                return offset + 2
+            if length == 0:
+                return offset + 1
+            offset += length + 1
+
+    def resolve(self, host):
+        query_id = random.randrange(0x10000)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.sendto(self.build_query(query_id, host), (self.server, self.port))
+            while True:
+                data, _ = sock.recvfrom(4096)
+                if len(data) >= 12 and struct.unpack('>H', data[:2])[0] == query_id:
+                    break
+
+        _, flags, qdcount, ancount, _, _ = struct.unpack('>HHHHHH', data[:12])
+        rcode = flags & 0x0F
+        if rcode == 3:
+            raise HostNotFound(host, DNS_NXDOMAIN)
+        if rcode != 0:
+            raise OSError(f"DNS 服务器返回错误码 {rcode}")
+
+        offset = 12
+        for _ in range(qdcount):
+            offset = self._skip_name(data, offset) + 4
+        addrs = []
+        for _ in range(ancount):
+            offset = self._skip_name(data, offset)
+            rtype, _, _, rdlength = struct.unpack('>HHIH', data[offset:offset + 10])
+            offset += 10
+            if rtype == 1 and rdlength == 4:
+                addrs.append(socket.inet_ntoa(data[offset:offset + 4]))
+            offset += rdlength
+        if not addrs:
+            raise HostNotFound(host, DNS_NODATA)
+        return addrs
+
+
+class HostsFileResolver:
+    """按 hosts 文件格式（"IP 主机名 [别名...]"）解析，文件里没有的主机名视为 NXDOMAIN"""
+
+    def __init__(self, hosts_file):
+        self.table = {}
+        with open(hosts_file, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                parts = line.split('#', 1)[0].split()
+                if len(parts) < 2:
+                    continue
+                for name in parts[1:]:
+                    self.table.setdefault(name.lower().rstrip('.'), []).append(parts[0])
 
-        for future in as_completed(future_to_file):
-            file_path, links = future.result()
-            if links is not None:
-                all_results[file_path] = links
-                append_progress_record(progress_file, file_path, links)
+    def resolve(self, host):
+        addrs = self.table.get(host.lower().rstrip('.'))
+        if not addrs:
+            raise HostNotFound(host, DNS_NXDOMAIN)
+        return list(addrs)
 
-    print(f"\n处理完成！共成功处理 {len(all_results)} 个文件（包含历史进度）")
-    return all_results
 
+class CachingResolver:
+    """
+    在任意解析器外加一层缓存：肯定应答（地址）与否定应答（NXDOMAIN/NODATA）都缓存，
+    超时等错误不缓存，下次仍会重新解析
+    """
 
-# ===================== HTTP 探测相关 =====================
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, host):
+        """返回 (状态, 地址列表或错误信息)"""
+        key = host.lower()
+        with self._lock:
+            cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            answer = (DNS_OK, self.resolver.resolve(host))
+        except HostNotFound as e:
+            answer = (e.status, None)
+        except Exception as e:
+            return (DNS_ERROR, str(e) or type(e).__name__)
+        with self._lock:
+            self.cache[key] = answer
+        return answer
 
-def normalize_url_for_probe(target):
-    """将提取到的字符串归一化为可探测的 URL"""
-    if not target:
-        return None
-    t = target.strip()
-    if not t:
-        return None
 
-    if t.startswith(('http://', 'https://')):
-        return t
-    if t.startswith('//'):
-        return 'http:' + t
-    if t.startswith('/'):
-        return None
-    return 'http://' + t
+def make_resolver(dns_server=None, hosts_file=None, timeout=DEFAULT_DNS_TIMEOUT):
+    """根据命令行参数构建解析器：hosts 文件 > 指定 DNS 服务器（HOST[:PORT]）> 系统解析器"""
+    if hosts_file:
+        return HostsFileResolver(hosts_file)
+    if dns_server:
+        host, port = dns_server, 53
+        if dns_server.count(':') == 1:
+            host, port = dns_server.split(':')
+        return DnsServerResolver(host, int(port), timeout)
+    return SystemResolver(timeout)
 
 
-def probe_single_url(url, timeout=5.0, black_patterns=None, max_body_len=200000):
-    """
-    对单个 URL 进行 HTTP 探测：
-      1. 先按传入的 URL 原样访问
-      2. 若是 http:// 且失败，再自动尝试 https://
-    """
-    attempt_urls = [url]
+def is_ip_literal(host):
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return True
+    except ValueError:
+        return False
 
-    parsed = urlparse(url)
-    if parsed.scheme == "http":
-        https_parsed = parsed._replace(scheme="https", netloc=parsed.netloc)
-        https_url = urlunparse((
-            https_parsed.scheme,
-            https_parsed.netloc,
-            https_parsed.path or "",
-            https_parsed.params or "",
-            https_parsed.query or "",
-            ""
-        ))
-        if https_url != url:
-            attempt_urls.append(https_url)
 
-    last_error = None
+def resolve_hosts(hosts, resolver, workers=DEFAULT_DNS_WORKERS):
+    """并发解析一批主机名，返回 {host: (状态, 地址列表或错误信息)}"""
+    if not isinstance(resolver, CachingResolver):
+        resolver = CachingResolver(resolver)
+    hosts = list(hosts)
+    answers = {}
+    if not hosts:
+        return answers
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(hosts)))) as executor:
+        for host, answer in zip(hosts, executor.map(resolver.lookup, hosts)):
+            answers[host] = answer
+    return answers
 
-    for attempt_url in attempt_urls:
+
+def precheck_dns(targets, resolver, dns_workers, handle_result):
+    """
+    DNS 预解析阶段：并发解析 targets 中的所有主机名（IP 直接放行），
+    域名不存在的目标以 {'error', 'dns'} 结果交给 handle_result，返回仍需 HTTP 探测的目标
+    """
+    if resolver is None:
+        resolver = SystemResolver()
+    url_hosts = {}
+    for url in targets:
         try:
-            resp = requests.get(
-                attempt_url,
-                timeout=timeout,
-                allow_redirects=True,
-                verify=False
-            )
+            host = urlparse(url).hostname
+        except ValueError:
+            host = None
+        if host and not is_ip_literal(host):
+            url_hosts[url] = host
+    hosts = set(url_hosts.values())
+    if not hosts:
+        return targets
+
+    print(f"\nDNS 预解析 {len(hosts)} 个主机名（并发 {dns_workers}）...")
+    answers = resolve_hosts(hosts, resolver, dns_workers)
+    status_count = {}
+    for status, _ in answers.values():
+        status_count[status] = status_count.get(status, 0) + 1
+    print(f"DNS 预解析完成：可解析 {status_count.get(DNS_OK, 0)} 个，"
+          f"域名不存在 {status_count.get(DNS_NXDOMAIN, 0)} 个，无地址记录 {status_count.get(DNS_NODATA, 0)} 个，"
+          f"超时/错误 {status_count.get(DNS_ERROR, 0)} 个（仍会尝试 HTTP 探测）")
+
+    remaining = []
+    for url in targets:
+        host = url_hosts.get(url)
+        status = answers[host][0] if host else DNS_OK
+        if status in (DNS_NXDOMAIN, DNS_NODATA):
+            reason = '域名不存在（NXDOMAIN）' if status == DNS_NXDOMAIN else '没有地址记录'
+            if _profiler is not None:
+                _profiler.record_host_error(url, PROBE_ERROR_DNS)
+            handle_result(url, {'error': f"DNS 解析失败: {host} {reason}", 'dns': status})
+        else:
+            remaining.append(url)
+    return remaining
 
-            headers = dict(resp.headers)
-            interesting_headers = {}
-            for key in [
-                'Server', 'X-Powered-By', 'Location',
-                'Set-Cookie', 'Content-Type',
-                'Referrer-Policy', 'Content-Security-Policy'
-            ]:
-                if key in headers:
-                    interesting_headers[key] = headers[key]
-
-            hits = []
-            if black_patterns:
-                try:
-                    body = resp.text
-                except UnicodeDecodeError:
-                    body = resp.content.decode('utf-8', errors='ignore')
-
-                body_lower = body[:max_body_len].lower()
-                for p in black_patterns:
-                    if p and p in body_lower:
-                        hits.append(p)
-
-            return {
-                'status_code': resp.status_code,
-                'final_url': resp.url,
-                'headers': interesting_headers,
-                'body_keyword_hits': sorted(set(hits)),
-            }
-        except Exception as e:
-            last_error = str(e)
 
-    return {'error': last_error or 'unknown error'}
+def proxy_configured():
+    """requests 是否会经代理访问（HTTP_PROXY / HTTPS_PROXY / ALL_PROXY 等环境变量）"""
+    proxies = getproxies()
+    return any(proxies.get(scheme) for scheme in ('http', 'https', 'all'))
 
 
-def probe_suspicious_links(all_results, black_patterns, max_workers=8, timeout=5.0):
+def probe_suspicious_links(all_results, black_patterns, max_workers=8, timeout=5.0, engine='thread',
+                           concurrency=DEFAULT_PROBE_CONCURRENCY, per_host=DEFAULT_PROBE_PER_HOST,
+                           resolver=None, dns_workers=DEFAULT_DNS_WORKERS, dns_precheck=False,
+                           probe_cache=None, max_body=DEFAULT_PROBE_MAX_BODY, early_stop=False, race=False):
     """
     对疑似黑链 / 域名字符串进行 HTTP 探测（已在全局维度去重）
+      - engine='thread'：max_workers 个线程，基于 requests
+      - engine='async'：asyncio + aiohttp 连接池，全局并发 concurrency、单主机并发 per_host
+      - dns_precheck=True 时先用 resolver（默认系统解析器）并发预解析所有主机名，
+        域名不存在（NXDOMAIN/NODATA）的目标直接记为失败，不再进行 HTTP 探测；
+        线程引擎经 HTTP 代理访问时（主机名由代理解析，本机未必能解析）自动跳过预解析
+      - race=True 时 http:// 目标的 http 与 https 请求同时发出，取最先应答的一个
+      - 响应正文流式读取，最多 max_body 字节；early_stop=True 时全部关键词都已命中即停止读取
+      - probe_cache 为 ProbeCache 时，有效期内的缓存结果直接沿用，其余目标探测后分批写回缓存
     """
-    if requests is None:
+    if engine == 'async':
+        if aiohttp is None:
+            print("\n[!] 未安装 aiohttp 库，无法使用异步探测引擎。请先安装：pip install aiohttp")
+            return None
+    elif requests is None:
         print("\n[!] 未安装 requests 库，无法进行 HTTP 探测。请先安装：pip install requests")
         return None
 
-    lower_black = [p.lower() for p in (black_patterns or [])]
+    if dns_precheck and engine != 'async' and proxy_configured():
+        print("\n[!] 已配置 HTTP 代理，主机名由代理解析，跳过 DNS 预解析")
+        dns_precheck = False
+
+    black_matcher = get_black_matcher(black_patterns)
 
     raw_targets = set()
     for file_path, links in all_results.items():
@@ -480,247 +5334,576 @@ def probe_suspicious_links(all_results, black_patterns, max_workers=8, timeout=5
         print("\n没有成功归一化为可探测 URL 的目标。")
         return {}
 
-    print(f"\n开始对 {len(targets)} 个去重后的链接/域名进行 HTTP 探测（超时 {timeout}s，线程 {max_workers}）...")
-
     results = {}
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {
-            executor.submit(probe_single_url, url, timeout, lower_black): url
-            for url in targets
-        }
-        for future in as_completed(future_to_url):
-            url = future_to_url[future]
-            info = future.result()
-            results[url] = info
 
-            with print_lock:
-                if 'error' in info:
-                    print(f"[探测失败] {url} -> {info['error']}")
+    def handle_result(url, info):
+        results[url] = info
+
+        with print_lock:
+            if 'error' in info:
+                print(f"[探测失败] {url} -> {info['error']}")
+            else:
+                hits = info.get('body_keyword_hits') or []
+                if hits:
+                    print(f"[探测命中关键词] {url} -> {info['status_code']} 命中: {', '.join(sorted(set(hits)))}")
                 else:
-                    hits = info.get('body_keyword_hits') or []
-                    if hits:
-                        print(f"[探测命中关键词] {url} -> {info['status_code']} 命中: {', '.join(sorted(set(hits)))}")
-                    else:
-                        print(f"[探测成功] {url} -> {info['status_code']} {info.get('final_url', '')}")
+                    print(f"[探测成功] {url} -> {info['status_code']} {info.get('final_url', '')}")
+
+        hits = info.get('body_keyword_hits') or []
+        if hits:
+            for file_path, raw in url_to_sources.get(url, []):
+                # 整体写回（all_results 可能是进度库支撑的 ScanResults，取出的是副本）
+                links = all_results[file_path]
+                existing = set(links.get('suspicious_links', []))
+                existing.add(raw)
+                links['suspicious_links'] = sorted(existing)
+                all_results[file_path] = links
 
-            hits = info.get('body_keyword_hits') or []
-            if hits:
-                for file_path, raw in url_to_sources.get(url, []):
-                    existing = set(all_results[file_path].get('suspicious_links', []))
-                    existing.add(raw)
-                    all_results[file_path]['suspicious_links'] = sorted(existing)
+    def run_probes(targets, handle_result):
+        if dns_precheck:
+            targets = precheck_dns(targets, resolver, dns_workers, handle_result)
+            if not targets:
+                return
+
+        race_desc = '，http/https 赛跑' if race else ''
+        if engine == 'async':
+            print(f"\n开始对 {len(targets)} 个去重后的链接/域名进行 HTTP 探测（超时 {timeout}s，"
+                  f"异步并发 {concurrency}，单主机 {per_host}{race_desc}）...")
+            probe_urls_async(targets, black_matcher, timeout, concurrency, per_host, on_result=handle_result,
+                             max_body=max_body, early_stop=early_stop, race=race)
+            return
+
+        print(f"\n开始对 {len(targets)} 个去重后的链接/域名进行 HTTP 探测（超时 {timeout}s，"
+              f"线程 {max_workers}{race_desc}）...")
 
+        # 赛跑时每个探测线程同时发出两个请求，由单独的线程池执行；
+        # 结束时不等待仍在连接阶段的落败请求（它们会在超时后自行结束）
+        race_executor = ThreadPoolExecutor(max_workers=max_workers * 2) if race else None
+        try:
+            probe_fn = probe_single_url if _profiler is None else _profile_probe
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_url = {
+                    executor.submit(probe_fn, url, timeout, black_matcher, max_body, early_stop,
+                                    race_executor): url
+                    for url in targets
+                }
+                for future in as_completed(future_to_url):
+                    handle_result(future_to_url[future], future.result())
+        finally:
+            if race_executor is not None:
+                race_executor.shutdown(wait=False, cancel_futures=True)
+
+    if probe_cache is None:
+        run_probes(targets, handle_result)
+        return results
+
+    probe_cache.set_scope(black_matcher)
+    cached = probe_cache.get_many(targets)
+    if cached:
+        kind_count = {}
+        for info in cached.values():
+            kind = probe_result_kind(info)
+            kind_count[kind] = kind_count.get(kind, 0) + 1
+        print(f"\n探测缓存命中 {len(cached)} 个（成功 {kind_count.get(PROBE_CACHE_OK, 0)} 个，"
+              f"失败 {kind_count.get(PROBE_CACHE_ERROR, 0)} 个，域名不存在 {kind_count.get(PROBE_CACHE_NXDOMAIN, 0)} 个），"
+              f"其余 {len(targets) - len(cached)} 个需要探测")
+        for url in targets:
+            if url in cached:
+                handle_result(url, cached[url])
+        targets = [url for url in targets if url not in cached]
+
+    pending_cache = []
+
+    def handle_and_cache(url, info):
+        handle_result(url, info)
+        pending_cache.append((url, info))
+        if len(pending_cache) >= PROBE_CACHE_BATCH:
+            probe_cache.put_many(pending_cache)
+            del pending_cache[:]
+
+    try:
+        if targets:
+            run_probes(targets, handle_and_cache)
+    finally:
+        probe_cache.put_many(pending_cache)
     return results
 
 
 # ===================== 报告生成 =====================
 
-def format_results(all_results, probe_results=None):
-    """格式化所有文件的分析结果为字符串（可附带 HTTP 探测结果）"""
-    output = []
-    total_hidden = 0
-    total_external = 0
-    total_internal = 0
-    total_other = 0
-    total_domain_tokens = 0
-    total_suspicious = 0
+# 报告格式及对应的默认扩展名
+REPORT_FORMATS = {
+    'text': '.txt',
+    'jsonl': '.jsonl',
+    'csv': '.csv',
+    'sarif': '.sarif',
+}
+
+# 各类链接在文本报告中的标题
+REPORT_SECTIONS = (
+    ('possible_hidden_links', '可能的暗链'),
+    ('external_links', '外链'),
+    ('internal_links', '内链'),
+    ('other_links', '其他链接'),
+    ('domain_tokens', '代码中疑似域名字符串'),
+    ('suspicious_links', '命中黑名单关键字的可疑链接/域名'),
+)
 
-    global_domain_tokens = set()
-    global_suspicious_links = set()
+# SARIF 规则：只有暗链与命中黑名单的链接作为告警输出
+SARIF_RULES = (
+    ('suspicious_links', 'SBL001', 'error', '命中黑名单关键字的可疑链接/域名'),
+    ('possible_hidden_links', 'SBL002', 'warning', '可能的暗链（隐藏链接）'),
+)
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
 
-    for file_path, links in all_results.items():
-        total_hidden += len(links['possible_hidden_links'])
-        total_external += len(links['external_links'])
-        total_internal += len(links['internal_links'])
-        total_other += len(links['other_links'])
-
-        file_domain_tokens = links.get('domain_tokens', [])
-        file_suspicious = links.get('suspicious_links', [])
-
-        total_domain_tokens += len(file_domain_tokens)
-        total_suspicious += len(file_suspicious)
-
-        global_domain_tokens.update(file_domain_tokens)
-        global_suspicious_links.update(file_suspicious)
-
-    output.append("=" * 80)
-    output.append("URL提取分析报告")
-    output.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    output.append("=" * 80)
-    output.append(f"总结果: 共分析 {len(all_results)} 个文件")
-    output.append(f"发现 {total_hidden} 个可能的暗链")
-    output.append(f"发现 {total_external} 个外链")
-    output.append(f"发现 {total_internal} 个内链")
-    output.append(f"发现 {total_other} 个其他链接")
-    output.append(f"发现 {total_domain_tokens} 个疑似域名字符串（包括非完整URL形式）")
-    if total_suspicious:
-        output.append(f"其中 {total_suspicious} 个命中黑名单关键字（疑似黑链）")
-    else:
-        output.append("未发现命中黑名单关键字的链接/域名")
-    output.append("=" * 80)
-    output.append("")
 
-    for file_path, links in all_results.items():
-        output.append(f"文件: {file_path}")
+class SortedDedupSet:
+    """
+    基于临时 SQLite 库的去重集合：按字符串顺序迭代（UTF-8 字节序与 Python 字符串排序一致），
+    全局汇总中的去重列表不在内存中保留
+    """
 
-        output.append(f"  可能的暗链 ({len(links['possible_hidden_links'])}):")
-        if links['possible_hidden_links']:
-            for link in links['possible_hidden_links']:
-                output.append(f"    - {link}")
-        else:
-            output.append("    (无)")
+    def __init__(self):
+        # 文件名为空时 SQLite 创建私有的临时库，关闭后自动删除
+        self._conn = sqlite3.connect('')
+        self._conn.execute('CREATE TABLE items (value TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def update(self, values):
+        self._conn.executemany('INSERT OR IGNORE INTO items (value) VALUES (?)', ((v,) for v in values))
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def __iter__(self):
+        cursor = self._conn.execute('SELECT value FROM items ORDER BY value')
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for (value,) in rows:
+                yield value
+
+    def close(self):
+        self._conn.close()
+
+
+class ReportSummary:
+    """一次遍历结果时累计的汇总信息，供各报告格式在结尾使用"""
+
+    def __init__(self, skip_stats=None, probe_results=None):
+        self.generated_at = datetime.now()
+        self.files = 0
+        self.totals = {key: 0 for key in LINK_KEYS}
+        self.skip_stats = skip_stats or {}
+        self.probe_results = probe_results
+        self.domain_tokens = SortedDedupSet()
+        self.suspicious_links = SortedDedupSet()
+
+    def add_file(self, links):
+        self.files += 1
+        for key in LINK_KEYS:
+            self.totals[key] += len(links.get(key, []))
+        self.domain_tokens.update(links.get('domain_tokens', []))
+        self.suspicious_links.update(links.get('suspicious_links', []))
+
+    def to_dict(self):
+        return {
+            'generated_at': self.generated_at.isoformat(timespec='seconds'),
+            'files': self.files,
+            'totals': dict(self.totals),
+            'unique_domain_tokens': len(self.domain_tokens),
+            'unique_suspicious_links': len(self.suspicious_links),
+            'skipped': dict(self.skip_stats),
+            'probed_urls': len(self.probe_results or {}),
+        }
 
-        output.append(f"  外链 ({len(links['external_links'])}):")
-        if links['external_links']:
-            for link in links['external_links']:
-                output.append(f"    - {link}")
-        else:
-            output.append("    (无)")
+    def close(self):
+        self.domain_tokens.close()
+        self.suspicious_links.close()
 
-        output.append(f"  内链 ({len(links['internal_links'])}):")
-        if links['internal_links']:
-            for link in links['internal_links']:
-                output.append(f"    - {link}")
-        else:
-            output.append("    (无)")
 
-        output.append(f"  其他链接 ({len(links['other_links'])}):")
-        if links['other_links']:
-            for link in links['other_links']:
-                output.append(f"    - {link}")
-        else:
-            output.append("    (无)")
+class ReportWriter:
+    """报告格式的基类：write_report 遍历结果时对每个文件调用 add_file，遍历结束后调用 finish"""
+
+    def add_file(self, file_path, links):
+        pass
 
-        domain_tokens = links.get('domain_tokens', [])
-        output.append(f"  代码中疑似域名字符串 ({len(domain_tokens)}):")
-        if domain_tokens:
-            for d in domain_tokens:
-                output.append(f"    - {d}")
+    def finish(self, summary):
+        pass
+
+
+def iter_summary_lines(summary):
+    """文本报告开头的总体统计"""
+    totals = summary.totals
+    yield "=" * 80
+    yield "URL提取分析报告"
+    yield f"生成时间: {summary.generated_at.strftime('%Y-%m-%d %H:%M:%S')}"
+    yield "=" * 80
+    yield f"总结果: 共分析 {summary.files} 个文件"
+    yield f"发现 {totals['possible_hidden_links']} 个可能的暗链"
+    yield f"发现 {totals['external_links']} 个外链"
+    yield f"发现 {totals['internal_links']} 个内链"
+    yield f"发现 {totals['other_links']} 个其他链接"
+    yield f"发现 {totals['domain_tokens']} 个疑似域名字符串（包括非完整URL形式）"
+    if totals['suspicious_links']:
+        yield f"其中 {totals['suspicious_links']} 个命中黑名单关键字（疑似黑链）"
+    else:
+        yield "未发现命中黑名单关键字的链接/域名"
+    if summary.skip_stats:
+        yield f"跳过未扫描的文件 {sum(summary.skip_stats.values())} 个（按原因）:"
+        for reason in sorted(summary.skip_stats):
+            yield f"  - {describe_skip_reason(reason)}: {summary.skip_stats[reason]}"
+    yield "=" * 80
+    yield ""
+
+
+def iter_file_lines(file_path, links):
+    """文本报告中单个文件的明细"""
+    yield f"文件: {file_path}"
+    for key, title in REPORT_SECTIONS:
+        items = links.get(key, [])
+        yield f"  {title} ({len(items)}):"
+        if items:
+            for item in items:
+                yield f"    - {item}"
         else:
-            output.append("    (无)")
+            yield "    (无)"
+    yield "-" * 80
+    yield ""
+
+
+def iter_global_lines(summary):
+    """文本报告结尾的全局汇总与 HTTP 探测结果"""
+    yield "=" * 80
+    yield "全局汇总（去重后的疑似域名字符串 & 可疑链接/域名）"
+    yield "=" * 80
+
+    yield f"去重后的疑似域名字符串总数: {len(summary.domain_tokens)}"
+    if len(summary.domain_tokens):
+        yield "疑似域名字符串列表（去重后）："
+        for d in summary.domain_tokens:
+            yield f"  - {d}"
+    else:
+        yield "疑似域名字符串列表（去重后）：(无)"
+    yield ""
+
+    yield f"去重后的命中黑名单关键字的可疑链接/域名总数: {len(summary.suspicious_links)}"
+    if len(summary.suspicious_links):
+        yield "命中黑名单关键字的可疑链接/域名列表（去重后）："
+        for s in summary.suspicious_links:
+            yield f"  - {s}"
+    else:
+        yield "命中黑名单关键字的可疑链接/域名列表（去重后）：(无)"
+    yield ""
+
+    probe_results = summary.probe_results
+    if not probe_results:
+        return
+
+    status_buckets = {
+        200: set(),
+        404: set(),
+        403: set(),
+        401: set(),
+        302: set(),
+        "other": set(),
+    }
 
-        suspicious = links.get('suspicious_links', [])
-        output.append(f"  命中黑名单关键字的可疑链接/域名 ({len(suspicious)}):")
-        if suspicious:
-            for s in suspicious:
-                output.append(f"    - {s}")
+    dns_dead = set()
+    for url, info in probe_results.items():
+        if not isinstance(info, dict):
+            continue
+        if info.get('dns') in (DNS_NXDOMAIN, DNS_NODATA):
+            dns_dead.add(url)
+            continue
+        if 'error' in info:
+            continue
+        code = info.get('status_code')
+        if isinstance(code, int) and code in status_buckets:
+            status_buckets[code].add(url)
+        elif isinstance(code, int):
+            status_buckets["other"].add(url)
+
+    yield "=" * 80
+    yield "HTTP 探测状态码汇总（按原始探测 URL 去重）"
+    yield "=" * 80
+
+    for code in [200, 404, 403, 401, 302]:
+        urls = sorted(status_buckets[code])
+        yield f"状态码 {code}: {len(urls)} 个 URL"
+        if urls:
+            for u in urls:
+                yield f"  - {u}"
+        else:
+            yield "  (无)"
+        yield ""
+
+    other_urls = sorted(status_buckets["other"])
+    yield f"其他状态码: {len(other_urls)} 个 URL"
+    if other_urls:
+        for u in other_urls:
+            yield f"  - {u}"
+    else:
+        yield "  (无)"
+    yield ""
+
+    if dns_dead:
+        yield f"DNS 解析不存在（NXDOMAIN/无地址记录，未进行 HTTP 探测）: {len(dns_dead)} 个 URL"
+        for u in sorted(dns_dead):
+            yield f"  - {u}"
+        yield ""
+
+    yield "=" * 80
+    yield "HTTP 探测结果（按可疑URL归并）"
+    yield "=" * 80
+    for url in sorted(probe_results.keys()):
+        info = probe_results[url]
+        yield f"URL: {url}"
+        if 'error' in info:
+            yield f"  探测失败: {info['error']}"
         else:
-            output.append("    (无)")
+            yield f"  状态码: {info['status_code']}"
+            if info.get('scheme'):
+                yield f"  应答协议: {info['scheme'].upper()}"
+            final_url = info.get('final_url')
+            if final_url and final_url != url:
+                yield f"  最终跳转URL: {final_url}"
+            hits = info.get('body_keyword_hits') or []
+            if hits:
+                yield "  页面命中黑链关键词: " + ", ".join(sorted(set(hits)))
+            body_status = info.get('body_status')
+            if body_status == BODY_SKIPPED:
+                yield "  页面正文: 非文本类型，未下载"
+            elif body_status == BODY_TRUNCATED:
+                yield f"  页面正文: 已读取前 {info.get('body_bytes', 0)} 字节（达到读取上限）"
+            elif body_status == BODY_EARLY_STOP:
+                yield f"  页面正文: 读取 {info.get('body_bytes', 0)} 字节后全部关键词已命中，提前停止"
+            headers = info.get('headers') or {}
+            if headers:
+                yield "  关键响应头:"
+                for k, v in headers.items():
+                    yield f"    {k}: {v}"
+        yield "-" * 80
+        yield ""
+
+
+def write_lines(stream, lines):
+    for line in lines:
+        stream.write(line)
+        stream.write('\n')
+
+
+def write_joined(stream, lines):
+    """与 stream.write('\\n'.join(lines)) 相同：行之间换行，最后一行之后不换行"""
+    for i, line in enumerate(lines):
+        if i:
+            stream.write('\n')
+        stream.write(line)
+
+
+class TextReportWriter(ReportWriter):
+    """
+    中文文本报告，可同时写到多个输出（控制台与文件）：
+    总体统计要在遍历完所有文件后才知道，文件明细先写入临时文件，结束时依次输出 统计 → 明细 → 全局汇总。
+    与旧版逐字节一致：文件中的报告最后一行之后不换行，控制台 console 上与 print 一样以换行结尾
+    """
 
-        output.append("-" * 80)
-        output.append("")
+    def __init__(self, *streams, console=None):
+        self.streams = ((console,) if console is not None else ()) + streams
+        self.console = console
+        self._spool = tempfile.TemporaryFile('w+', encoding='utf-8', newline='\n')
 
-    output.append("=" * 80)
-    output.append("全局汇总（去重后的疑似域名字符串 & 可疑链接/域名）")
-    output.append("=" * 80)
+    def add_file(self, file_path, links):
+        write_lines(self._spool, iter_file_lines(file_path, links))
 
-    dedup_domains = sorted(global_domain_tokens)
-    dedup_suspicious = sorted(global_suspicious_links)
+    def finish(self, summary):
+        try:
+            for stream in self.streams:
+                write_lines(stream, iter_summary_lines(summary))
+                self._spool.seek(0)
+                shutil.copyfileobj(self._spool, stream)
+                write_joined(stream, iter_global_lines(summary))
+                if stream is self.console:
+                    stream.write('\n')
+        finally:
+            self._spool.close()
+
+
+class JsonlReportWriter(ReportWriter):
+    """
+    JSON Lines：每条发现一行 {"type": "link", "file", "category", "value"}，
+    之后每个探测结果一行 {"type": "probe", "url", ...}，最后一行为 {"type": "summary", ...}
+    """
 
-    output.append(f"去重后的疑似域名字符串总数: {len(dedup_domains)}")
-    if dedup_domains:
-        output.append("疑似域名字符串列表（去重后）：")
-        for d in dedup_domains:
-            output.append(f"  - {d}")
-    else:
-        output.append("疑似域名字符串列表（去重后）：(无)")
-    output.append("")
-
-    output.append(f"去重后的命中黑名单关键字的可疑链接/域名总数: {len(dedup_suspicious)}")
-    if dedup_suspicious:
-        output.append("命中黑名单关键字的可疑链接/域名列表（去重后）：")
-        for s in dedup_suspicious:
-            output.append(f"  - {s}")
-    else:
-        output.append("命中黑名单关键字的可疑链接/域名列表（去重后）：(无)")
-    output.append("")
-
-    if probe_results:
-        status_buckets = {
-            200: set(),
-            404: set(),
-            403: set(),
-            401: set(),
-            302: set(),
-            "other": set(),
-        }
+    def __init__(self, stream):
+        self.stream = stream
 
-        for url, info in probe_results.items():
-            if not isinstance(info, dict):
-                continue
-            if 'error' in info:
-                continue
-            code = info.get('status_code')
-            if isinstance(code, int) and code in status_buckets:
-                status_buckets[code].add(url)
-            elif isinstance(code, int):
-                status_buckets["other"].add(url)
-
-        output.append("=" * 80)
-        output.append("HTTP 探测状态码汇总（按原始探测 URL 去重）")
-        output.append("=" * 80)
-
-        for code in [200, 404, 403, 401, 302]:
-            urls = sorted(status_buckets[code])
-            output.append(f"状态码 {code}: {len(urls)} 个 URL")
-            if urls:
-                for u in urls:
-                    output.append(f"  - {u}")
-            else:
-                output.append("  (无)")
-            output.append("")
-
-        other_urls = sorted(status_buckets["other"])
-        output.append(f"其他状态码: {len(other_urls)} 个 URL")
-        if other_urls:
-            for u in other_urls:
-                output.append(f"  - {u}")
-        else:
-            output.append("  (无)")
-        output.append("")
-
-        output.append("=" * 80)
-        output.append("HTTP 探测结果（按可疑URL归并）")
-        output.append("=" * 80)
-        for url in sorted(probe_results.keys()):
-            info = probe_results[url]
-            output.append(f"URL: {url}")
-            if 'error' in info:
-                output.append(f"  探测失败: {info['error']}")
-            else:
-                output.append(f"  状态码: {info['status_code']}")
-                final_url = info.get('final_url')
-                if final_url and final_url != url:
-                    output.append(f"  最终跳转URL: {final_url}")
-                hits = info.get('body_keyword_hits') or []
-                if hits:
-                    output.append("  页面命中黑链关键词: " + ", ".join(sorted(set(hits))))
-                headers = info.get('headers') or {}
-                if headers:
-                    output.append("  关键响应头:")
-                    for k, v in headers.items():
-                        output.append(f"    {k}: {v}")
-            output.append("-" * 80)
-            output.append("")
+    def _write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False))
+        self.stream.write('\n')
+
+    def add_file(self, file_path, links):
+        for key in LINK_KEYS:
+            for value in links.get(key, []):
+                self._write({'type': 'link', 'file': file_path, 'category': key, 'value': value})
+
+    def finish(self, summary):
+        for url in sorted(summary.probe_results or {}):
+            record = {'type': 'probe', 'url': url}
+            record.update(summary.probe_results[url])
+            self._write(record)
+        record = {'type': 'summary'}
+        record.update(summary.to_dict())
+        self._write(record)
+
+
+class CsvReportWriter(ReportWriter):
+    """CSV：每条发现一行（record_type=link），之后每个探测结果一行（record_type=probe，value 为探测 URL）"""
+
+    COLUMNS = ('record_type', 'file', 'category', 'value', 'status_code', 'scheme', 'final_url',
+               'body_keyword_hits', 'error')
+
+    def __init__(self, stream):
+        self.writer = csv.writer(stream)
+        self.writer.writerow(self.COLUMNS)
 
-    return "\n".join(output)
+    def add_file(self, file_path, links):
+        for key in LINK_KEYS:
+            for value in links.get(key, []):
+                self.writer.writerow(('link', file_path, key, value, '', '', '', '', ''))
 
+    def finish(self, summary):
+        for url in sorted(summary.probe_results or {}):
+            info = summary.probe_results[url]
+            self.writer.writerow((
+                'probe', '', '', url, info.get('status_code', ''), info.get('scheme', ''),
+                info.get('final_url', ''), ' '.join(info.get('body_keyword_hits') or []), info.get('error', ''),
+            ))
 
-def print_results(all_results, probe_results=None):
-    output = format_results(all_results, probe_results)
-    print(output)
 
+class SarifReportWriter(ReportWriter):
+    """
+    SARIF 2.1.0：命中黑名单的链接与可能的暗链作为告警结果，位置为所在文件；
+    有探测结果时附在对应告警的 properties.probe 中。results 数组逐条写出，不在内存中拼装整个文档
+    """
 
-def save_results_to_file(all_results, output_file, probe_results=None):
+    def __init__(self, stream, probe_results=None):
+        self.stream = stream
+        self._first = True
+        self._probe_results = probe_results
+        rules = [{
+            'id': rule_id,
+            'name': key,
+            'shortDescription': {'text': description},
+            'defaultConfiguration': {'level': level},
+        } for key, rule_id, level, description in SARIF_RULES]
+        driver = {'name': 'Scan_Blacklink', 'informationUri': 'https://github.com/T0ny911/Scan_Blacklink',
+                  'rules': rules}
+        head = json.dumps({'version': '2.1.0', '$schema': SARIF_SCHEMA}, ensure_ascii=False)[:-1]
+        self.stream.write(head + ', "runs": [{"tool": ' + json.dumps({'driver': driver}, ensure_ascii=False)
+                          + ', "results": [\n')
+
+    def add_file(self, file_path, links):
+        try:
+            uri = pathlib.Path(file_path).as_uri()
+        except ValueError:
+            uri = file_path
+        for index, (key, rule_id, level, description) in enumerate(SARIF_RULES):
+            for value in links.get(key, []):
+                result = {
+                    'ruleId': rule_id,
+                    'ruleIndex': index,
+                    'level': level,
+                    'message': {'text': f"{description}: {value}"},
+                    'locations': [{'physicalLocation': {'artifactLocation': {'uri': uri}}}],
+                    'properties': {'value': value},
+                }
+                if self._probe_results:
+                    probe = self._probe_results.get(normalize_url_for_probe(value))
+                    if probe:
+                        result['properties']['probe'] = probe
+                self.stream.write(('' if self._first else ',\n') + json.dumps(result, ensure_ascii=False))
+                self._first = False
+
+    def finish(self, summary):
+        self.stream.write('\n], "properties": ' + json.dumps(summary.to_dict(), ensure_ascii=False) + '}]}\n')
+
+
+def write_report(all_results, writers, probe_results=None, skip_stats=None):
+    """
+    报告输出：只遍历一次 all_results，把每个文件交给所有 writers，同时累计汇总信息，
+    最后由各 writer 输出结尾部分。内存占用与报告大小无关（去重列表放在临时 SQLite 库中）
+    """
+    summary = ReportSummary(skip_stats, probe_results)
     try:
-        output = format_results(all_results, probe_results)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(output)
-        print(f"\n结果已保存到: {os.path.abspath(output_file)}")
-        return True
+        for file_path, links in all_results.items():
+            summary.add_file(links)
+            for writer in writers:
+                writer.add_file(file_path, links)
+        for writer in writers:
+            writer.finish(summary)
+    finally:
+        summary.close()
+    return summary
+
+
+def report_output_paths(output_file, formats):
+    """
+    各报告格式的输出路径：只输出一种格式时直接使用 output_file；
+    多种格式时文本报告使用 output_file，其余格式替换为对应扩展名
+    """
+    if len(formats) == 1:
+        return {formats[0]: output_file}
+    stem = os.path.splitext(output_file)[0]
+    return {fmt: output_file if fmt == 'text' else stem + REPORT_FORMATS[fmt] for fmt in formats}
+
+
+def save_reports(all_results, output_paths, probe_results=None, skip_stats=None, console=True):
+    """
+    按 {格式: 路径} 写出报告（一次遍历同时写所有格式）；console=True 时文本报告同时输出到控制台，
+    没有文本格式时控制台只输出总体统计
+    """
+    files = []
+    writers = []
+    try:
+        for fmt, path in output_paths.items():
+            f = open(path, 'w', encoding='utf-8', newline='' if fmt == 'csv' else None)
+            files.append(f)
+            if fmt == 'text':
+                writers.append(TextReportWriter(f, console=sys.stdout if console else None))
+            elif fmt == 'jsonl':
+                writers.append(JsonlReportWriter(f))
+            elif fmt == 'csv':
+                writers.append(CsvReportWriter(f))
+            elif fmt == 'sarif':
+                writers.append(SarifReportWriter(f, probe_results))
+        summary = write_report(all_results, writers, probe_results, skip_stats)
+        if console and 'text' not in output_paths:
+            write_lines(sys.stdout, iter_summary_lines(summary))
     except Exception as e:
         print(f"保存文件时出错: {str(e)}")
         return False
+    finally:
+        for f in files:
+            f.close()
+    for path in output_paths.values():
+        print(f"\n结果已保存到: {os.path.abspath(path)}")
+    return True
+
+
+def format_results(all_results, probe_results=None, skip_stats=None):
+    """格式化所有文件的分析结果为字符串（可附带 HTTP 探测结果与跳过文件统计）"""
+    output = io.StringIO()
+    write_report(all_results, [TextReportWriter(output)], probe_results, skip_stats)
+    return output.getvalue()
+
+
+def print_results(all_results, probe_results=None, skip_stats=None):
+    write_report(all_results, [TextReportWriter(console=sys.stdout)], probe_results, skip_stats)
+
+
+def save_results_to_file(all_results, output_file, probe_results=None, skip_stats=None):
+    return save_reports(all_results, {'text': output_file}, probe_results, skip_stats, console=False)
 
 
 def main():
@@ -728,28 +5911,47 @@ def main():
         description='提取目录中所有源代码文件的暗链和外链地址（支持多线程加速、断点续跑，并可对疑似黑链进行HTTP探测）',
         epilog='示例:\n'
                '  %(prog)s -d /path/to/dir                  # 扫描指定目录（默认全后缀）\n'
-               '  %(prog)s --progress-file cache.jsonl      # 指定进度文件\n'
+               '  %(prog)s --progress-file cache.sqlite3    # 指定进度库文件\n'
                '  %(prog)s -e html,php,js                   # 只扫描指定扩展名\n'
+               '  %(prog)s -x node_modules,.git,uploads/cache  # 跳过依赖、版本库与缓存目录\n'
                '  %(prog)s -t 8                             # 使用8个线程加速\n'
+               '  %(prog)s --scan-archives                  # 同时扫描 zip/war/tar.gz 等备份压缩包中的文件\n'
                '  %(prog)s -b https://example.com           # 指定基础域名识别外链\n'
                '  %(prog)s -bl blacklist.txt                # 追加黑链域名/关键字列表\n'
-               '  %(prog)s --probe                          # 对疑似黑链进行HTTP探测\n',
+               '  %(prog)s --probe                          # 对疑似黑链进行HTTP探测\n'
+               '  %(prog)s --probe --probe-engine async     # 使用异步探测引擎（需安装aiohttp）\n'
+               '  %(prog)s --probe --probe-cache            # 复用之前运行的探测结果（默认成功24小时内有效）\n'
+               '  %(prog)s --profile --metrics-file scan.prom  # 输出性能剖析并导出 Prometheus 指标\n'
+               '  %(prog)s --watch > alerts.jsonl           # 初次扫描后持续监控，新发现以 JSON Lines 写到标准输出（其余信息写到标准错误）\n'
+               '  %(prog)s -d /mnt/www --shard-plan /mnt/shared/q.sqlite3  # 分布式扫描：制定分片计划\n'
+               '  %(prog)s --shard-worker /mnt/shared/q.sqlite3    # 分布式扫描：在各节点上运行工作进程\n'
+               '  %(prog)s --shard-merge /mnt/shared/q.sqlite3 --probe  # 分布式扫描：合并结果并生成报告\n',
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
 
     # 基本选项
-    parser.add_argument('-d', '--directory', default='.',
-                        help='要处理的目录路径，默认为当前目录')
+    parser.add_argument('-d', '--directory',
+                        help='要处理的目录路径，默认为当前目录（--shard-worker / --shard-merge 时默认为分片计划中的目录）')
     parser.add_argument('-b', '--base-domain',
                         help='基础域名，用于判断是否为外链（如 https://example.com）')
     parser.add_argument('-o', '--output',
                         help='输出文件路径，默认自动生成带时间戳的文件名')
     parser.add_argument('--no-timestamp', action='store_true',
                         help='输出文件名不包含时间戳')
+    parser.add_argument('--format', default='text',
+                        help='报告格式，逗号分隔可同时输出多种：text（默认，中文文本报告）、jsonl（JSON Lines，每条发现一行）、'
+                             'csv、sarif（SARIF 2.1.0）；多种格式时文本报告使用 -o 指定的文件名，其余格式替换为对应扩展名')
 
     # 进度文件
     parser.add_argument('--progress-file',
-                        help='进度记录文件路径（JSONL，一行一条），用于断点续跑；不指定则默认放在目标目录下 .url_extraction_progress.jsonl')
+                        help='进度库文件路径（SQLite），用于断点续跑与增量扫描；不指定则默认放在目标目录下 '
+                             '.url_extraction_progress.sqlite3。指定旧版 .jsonl 进度文件时会自动导入到同名 .sqlite3 文件')
+    parser.add_argument('--progress-batch', type=int, default=DEFAULT_PROGRESS_BATCH,
+                        help=f'进度库后台写入线程每批提交的记录数，默认{DEFAULT_PROGRESS_BATCH}')
+    parser.add_argument('--progress-flush', type=float, default=DEFAULT_PROGRESS_FLUSH,
+                        help=f'进度库两次提交之间的最长间隔（秒），默认{DEFAULT_PROGRESS_FLUSH:g}')
+    parser.add_argument('--progress-sync', choices=PROGRESS_SYNC_MODES, default='normal',
+                        help='进度库的落盘策略：off 不主动fsync，normal（默认）在WAL检查点时fsync，full 每批提交都fsync')
 
     # 递归选项
     parser.add_argument('-r', '--recursive', action='store_true', default=True,
@@ -766,12 +5968,70 @@ def main():
 
     # 性能选项
     parser.add_argument('-t', '--threads', type=int, default=4,
-                        help='线程数（默认为4，建议范围：1-16）')
+                        help='线程数（默认为4，建议范围：1-16；--engine process 时为进程数）')
+
+    parser.add_argument('--engine', choices=['thread', 'process'], default='thread',
+                        help='扫描引擎：thread（默认，多线程，适合I/O密集）或 process（多进程，适合CPU密集的正则提取）')
+
+    parser.add_argument('--window-size', type=float, default=DEFAULT_WINDOW_SIZE / 1024 / 1024,
+                        help='大文件流式扫描的窗口大小（MB），超过该大小的文件分窗口扫描，默认16MB')
+    parser.add_argument('--window-overlap', type=int, default=DEFAULT_WINDOW_OVERLAP // 1024,
+                        help='相邻扫描窗口的重叠长度（KB），需大于单个链接的最大长度，默认64KB')
+
+    # 文件过滤策略
+    parser.add_argument('--max-file-size', type=float, default=0,
+                        help='单个文件大小上限（MB），超过则跳过不扫描，默认不限制')
+    parser.add_argument('--skip-binary', action='store_true',
+                        help='嗅探文件头（魔数与NUL字节占比），跳过图片/字体/音视频/压缩包等二进制文件')
+
+    # 压缩包扫描（不解压到磁盘）
+    parser.add_argument('--scan-archives', action='store_true',
+                        help='把 zip/jar/war/ear/tar(.gz/.bz2/.xz) 压缩包当作虚拟目录扫描：成员逐个流式读出，不解压到磁盘，'
+                             '结果与进度记录的键为 压缩包路径!/成员路径（成员同样按扩展名与 --max-file-size 过滤）')
+    parser.add_argument('--archive-depth', type=int, default=DEFAULT_ARCHIVE_DEPTH,
+                        help=f'压缩包嵌套层数上限（1 表示不打开压缩包中的压缩包），默认{DEFAULT_ARCHIVE_DEPTH}')
+    parser.add_argument('--archive-max-size', type=float, default=DEFAULT_ARCHIVE_MAX_SIZE / 1024 / 1024,
+                        help='单个压缩包（含嵌套）解压出的总字节数上限（MB），超过后停止扫描该压缩包剩余部分，'
+                             '防止压缩炸弹，0 表示不限制，默认1024MB')
+
+    # 暗链检测
+    parser.add_argument('--hidden-detector', choices=HIDDEN_DETECTORS, default=DEFAULT_HIDDEN_DETECTOR,
+                        help='暗链检测方式：regex（默认，正则匹配，只识别同一标签内的样式与href，结果与旧版本一致）或 '
+                             'html（单遍HTML词法分析，跟踪内联样式、hidden属性与祖先元素的可见性，耗时与文件长度线性相关）')
+    parser.add_argument('--hidden-timeout', type=float, default=DEFAULT_HIDDEN_TIMEOUT,
+                        help=f'单个文件的暗链检测时间上限（秒），超时后停止分析该文件剩余部分，默认{DEFAULT_HIDDEN_TIMEOUT:g}秒')
+
+    # 字节级扫描
+    parser.add_argument('--byte-scan', action='store_true',
+                        help='直接在文件字节上匹配链接与域名模式，不再把整个文件按UTF-8解码；黑名单关键字按 UTF-8、GBK、Big5 '
+                             '三种编码的字节匹配（可发现 GBK/Big5 页面中的中文关键字），只解码匹配到的片段')
+
+    # 增量扫描：进度记录中 mtime/size 未变化的文件默认直接沿用结果
+    parser.add_argument('--hash-check', action='store_true',
+                        help='增量扫描时额外记录并比对文件内容的sha256，mtime/size未变但内容被改动的文件也会重新扫描')
+
+    # 目录遍历
+    parser.add_argument('-x', '--exclude', action='append', default=[],
+                        help='排除的文件/目录 glob 模式，可多次指定或用逗号分隔；不含 / 的模式匹配名称（如 node_modules,.git,*.bak），'
+                             '含 / 的模式匹配相对扫描根目录的路径（如 uploads/cache）；命中的目录整棵跳过')
+    parser.add_argument('--walk-workers', type=int, default=DEFAULT_WALK_WORKERS,
+                        help=f'并行列目录的线程数，默认{DEFAULT_WALK_WORKERS}（网络文件系统上可适当调大）')
+
+    # 内容寻址结果缓存（跨目录、跨运行共享）
+    parser.add_argument('--result-cache', nargs='?', const=DEFAULT_RESULT_CACHE,
+                        help=f'启用按文件内容哈希的提取结果缓存（SQLite），内容相同的文件只提取一次；'
+                             f'可指定缓存文件路径，默认 {DEFAULT_RESULT_CACHE}')
+    parser.add_argument('--result-cache-size', type=float, default=DEFAULT_RESULT_CACHE_SIZE / 1024 / 1024,
+                        help='结果缓存大小上限（MB），超过后按最近使用时间淘汰，默认256MB')
 
     # 黑链关键字 / 域名片段列表文件（追加）
     parser.add_argument('-bl', '--blacklist',
                         help='黑链域名/关键字列表文件，每行一个，支持子串匹配')
 
+    # TLD 列表文件（替换内置的 IANA 顶级域名列表）
+    parser.add_argument('--tld-file',
+                        help='IANA tlds-alpha-by-domain.txt 格式的顶级域名列表文件，用于替换内置TLD列表')
+
     # HTTP 探测相关参数
     parser.add_argument('--probe', action='store_true',
                         help='对命中的疑似黑链/隐藏链接进行HTTP探测（需要安装requests库）')
@@ -779,27 +6039,179 @@ def main():
                         help='HTTP探测超时时间（秒），默认5秒')
     parser.add_argument('--probe-workers', type=int, default=8,
                         help='HTTP探测并发线程数，默认8')
+    parser.add_argument('--probe-engine', choices=['thread', 'async'], default='thread',
+                        help='HTTP探测引擎：thread（默认，多线程 + requests）或 async（asyncio + aiohttp 连接池，'
+                             '适合探测大量目标，需要安装aiohttp库）')
+    parser.add_argument('--probe-concurrency', type=int, default=DEFAULT_PROBE_CONCURRENCY,
+                        help=f'异步探测引擎的全局并发探测数，默认{DEFAULT_PROBE_CONCURRENCY}')
+    parser.add_argument('--probe-per-host', type=int, default=DEFAULT_PROBE_PER_HOST,
+                        help=f'异步探测引擎对同一主机的最大并发连接数，默认{DEFAULT_PROBE_PER_HOST}')
+    parser.add_argument('--probe-max-body', type=float, default=DEFAULT_PROBE_MAX_BODY / 1024,
+                        help=f'HTTP探测时每个响应最多读取的正文大小（KB），正文流式读取、边读边匹配关键词，'
+                             f'超过即停止下载，默认{DEFAULT_PROBE_MAX_BODY // 1024}KB')
+    parser.add_argument('--probe-early-stop', action='store_true',
+                        help='HTTP探测时全部黑链关键词都已在正文中命中后立即停止读取正文')
+    parser.add_argument('--probe-race', action='store_true',
+                        help='http:// 目标同时发出 http 与 https 请求，取最先应答的结果并取消另一个'
+                             '（默认先 http、失败后再 https，对端口 80 无响应的主机最坏耗时为 2 倍超时）')
+    parser.add_argument('--dns-precheck', action='store_true',
+                        help='HTTP探测前先并发预解析主机名，域名不存在的目标记为NXDOMAIN，不再进行HTTP探测'
+                             '（默认关闭；线程引擎经 HTTP 代理访问时自动跳过）')
+    parser.add_argument('--dns-timeout', type=float, default=DEFAULT_DNS_TIMEOUT,
+                        help=f'DNS预解析的单个查询超时时间（秒），默认{DEFAULT_DNS_TIMEOUT:g}秒')
+    parser.add_argument('--dns-workers', type=int, default=DEFAULT_DNS_WORKERS,
+                        help=f'DNS预解析的并发数，默认{DEFAULT_DNS_WORKERS}')
+    parser.add_argument('--dns-server',
+                        help='DNS预解析使用的DNS服务器（HOST[:PORT]，UDP查询A记录），默认使用系统解析器')
+    parser.add_argument('--dns-hosts',
+                        help='hosts文件格式的解析表（"IP 主机名"），DNS预解析只查该表，表中没有的主机名视为不存在')
+    parser.add_argument('--probe-cache', nargs='?', const=DEFAULT_PROBE_CACHE,
+                        help=f'启用跨运行共享的探测结果缓存（SQLite，以归一化URL为键），有效期内的结果不再重复探测；'
+                             f'可指定缓存文件路径，默认 {DEFAULT_PROBE_CACHE}')
+    parser.add_argument('--probe-cache-ttl',
+                        help='探测缓存有效期：单个时长（秒，或带 s/m/h/d 后缀）同时作用于所有结果，'
+                             '或按类别分别指定，如 ok=1d,error=30m,nxdomain=6h；默认 ok=24h,error=1h,nxdomain=6h')
+    parser.add_argument('--probe-cache-size', type=float, default=DEFAULT_PROBE_CACHE_SIZE / 1024 / 1024,
+                        help='探测缓存大小上限（MB），超过后清理过期条目并按最近使用时间淘汰，默认64MB')
+
+    # 实时监控
+    parser.add_argument('--watch', action='store_true',
+                        help='初次扫描（与报告）完成后持续监控目录：用 inotify 发现新建/改动的文件，只重新扫描这些文件并就地更新进度库，'
+                             '新出现的可疑链接与暗链立即以 JSON Lines 输出；inotify 不可用或监视数达到上限时改为定期增量 stat 扫描')
+    parser.add_argument('--watch-debounce', type=float, default=DEFAULT_WATCH_DEBOUNCE,
+                        help=f'同一文件最后一次变化后等待的秒数，连续写入合并为一次扫描，默认{DEFAULT_WATCH_DEBOUNCE:g}秒')
+    parser.add_argument('--watch-interval', type=float, default=DEFAULT_WATCH_INTERVAL,
+                        help=f'不使用 inotify 时两次增量 stat 扫描之间的间隔（秒），默认{DEFAULT_WATCH_INTERVAL:g}秒')
+    parser.add_argument('--watch-poll', action='store_true',
+                        help='不使用 inotify，只做定期增量 stat 扫描（NFS 等网络文件系统上其他主机的改动 inotify 收不到）')
+    parser.add_argument('--watch-output',
+                        help='监控期间的 JSON Lines 事件追加写入该文件，默认写到标准输出（此时配置信息、扫描进度、初次报告与状态信息都写到标准错误）')
+
+    # 常驻扫描服务
+    parser.add_argument('--serve', metavar='[HOST:]PORT|unix:PATH',
+                        help='以常驻服务运行：不扫描 -d 目录，而是在本地 HTTP 端口（HOST 默认 127.0.0.1）或 Unix 套接字上'
+                             '接受扫描请求（文件路径、目录或原始内容），黑名单自动机与编译好的模式常驻内存；'
+                             '其余扫描选项作为服务的默认设置')
+    parser.add_argument('--serve-workers', type=int, default=DEFAULT_SERVE_WORKERS,
+                        help=f'扫描服务同时执行的请求数，默认{DEFAULT_SERVE_WORKERS}（目录请求中的文件再按 -t 并行扫描）')
+    parser.add_argument('--serve-queue', type=int, default=DEFAULT_SERVE_QUEUE,
+                        help=f'扫描服务排队等待的请求数上限，超过时返回 503（不读取请求正文），默认{DEFAULT_SERVE_QUEUE}')
+    parser.add_argument('--serve-connections', type=int, default=DEFAULT_SERVE_CONNECTIONS,
+                        help=f'扫描服务同时处理的连接数（处理线程数）上限，超过时直接返回 503，默认{DEFAULT_SERVE_CONNECTIONS}')
+    parser.add_argument('--serve-max-body', type=float, default=DEFAULT_SERVE_MAX_BODY / 1024 / 1024,
+                        help=f'扫描服务请求正文大小上限（MB），超过时返回 413，默认{DEFAULT_SERVE_MAX_BODY // 1024 // 1024}MB')
+    parser.add_argument('--serve-root', metavar='DIR',
+                        help='扫描服务的 path 请求只能访问该目录之内的文件与目录（按真实路径判断），其余返回 403；'
+                             '默认不限制（服务进程能读的文件都可以请求扫描）')
+    parser.add_argument('--serve-allow-remote', action='store_true',
+                        help='允许 --serve 监听非回环地址。服务没有认证，任何能连上端口的主机都能提交请求，'
+                             '请配合 --serve-root 与防火墙使用')
+
+    # 分片分布式扫描
+    shard_group = parser.add_mutually_exclusive_group()
+    shard_group.add_argument('--shard-plan', metavar='QUEUE',
+                             help='协调节点：遍历目录，按路径哈希把文件分成 --shards 个分片，写入放在共享存储上的分片队列'
+                                  '（SQLite 文件）后退出；扫描相关选项随计划保存，各工作节点沿用')
+    shard_group.add_argument('--shard-worker', metavar='QUEUE',
+                             help='工作节点：从分片队列租用分片并扫描，直到全部分片完成；崩溃节点的租约过期后分片会被重新租用，'
+                                  '-d 可指定本节点上的挂载路径')
+    shard_group.add_argument('--shard-merge', metavar='QUEUE',
+                             help='合并各分片的扫描结果，之后照常进行HTTP探测并生成报告')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARD_COUNT,
+                        help=f'--shard-plan 划分的分片数，默认{DEFAULT_SHARD_COUNT}（分片数不变时重新制定计划会沿用各分片的进度，增量扫描）')
+    parser.add_argument('--shard-lease', type=float, default=DEFAULT_SHARD_LEASE,
+                        help=f'工作节点的分片租约有效期（秒），持有期间每隔三分之一有效期续租一次，'
+                             f'节点崩溃后超过有效期分片被重新租用，默认{DEFAULT_SHARD_LEASE:g}秒')
+
+    # 性能剖析与指标导出
+    parser.add_argument('--profile', action='store_true',
+                        help='开启性能剖析，结束时输出各阶段耗时、文件/字节吞吐、各链接模式耗时、最慢的文件、'
+                             '进度库提交延迟、HTTP探测延迟分布与按主机的探测失败数')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_PROFILE_TOP,
+                        help=f'剖析报告中列出的最慢文件 / 链接模式 / 失败主机数量，默认{DEFAULT_PROFILE_TOP}')
+    parser.add_argument('--metrics-file',
+                        help='将剖析指标以 Prometheus 文本格式写入该文件（可供 node_exporter textfile collector 采集），'
+                             '每个阶段结束时原子更新；指定后自动开启剖析')
+    parser.add_argument('--metrics-listen', metavar='[HOST:]PORT',
+                        help='运行期间在该地址提供 Prometheus 抓取端点 /metrics（HOST 默认 127.0.0.1）；指定后自动开启剖析')
 
     args = parser.parse_args()
 
-    target_dir = os.path.abspath(args.directory)
+    report_formats = []
+    for fmt in args.format.split(','):
+        fmt = fmt.strip().lower()
+        if fmt not in REPORT_FORMATS:
+            parser.error(f"未知的报告格式: {fmt}（可选 {', '.join(REPORT_FORMATS)}）")
+        if fmt not in report_formats:
+            report_formats.append(fmt)
+    try:
+        probe_cache_ttl = parse_probe_cache_ttl(args.probe_cache_ttl)
+    except ValueError as e:
+        parser.error(f"--probe-cache-ttl 格式错误: {e}")
+    metrics_address = None
+    if args.metrics_listen:
+        try:
+            metrics_address = parse_listen_address(args.metrics_listen)
+        except ValueError as e:
+            parser.error(f"--metrics-listen 格式错误: {e}")
+
+    if args.watch and (args.shard_plan or args.shard_worker or args.shard_merge):
+        parser.error("--watch 不能与分片扫描选项同时使用")
+    serve_address = None
+    if args.serve:
+        if args.watch or args.shard_plan or args.shard_worker or args.shard_merge:
+            parser.error("--serve 不能与 --watch 或分片扫描选项同时使用")
+        try:
+            serve_address = parse_serve_address(args.serve)
+        except ValueError as e:
+            parser.error(f"--serve 格式错误: {e}")
+        if (not isinstance(serve_address, str) and not is_loopback_host(serve_address[0])
+                and not args.serve_allow_remote):
+            parser.error(f"--serve 监听的 {serve_address[0]} 不是回环地址：服务没有认证，"
+                         f"确需对外提供时请加上 --serve-allow-remote（并建议用 --serve-root 限制可扫描的路径）")
+        if args.serve_root and not os.path.isdir(args.serve_root):
+            parser.error(f"--serve-root 不是目录: {args.serve_root}")
+    elif args.serve_root or args.serve_allow_remote:
+        parser.error("--serve-root 与 --serve-allow-remote 只能与 --serve 一起使用")
+
+    # --watch 的事件默认写到标准输出：此时配置信息、扫描进度与初次报告都改写到标准错误，
+    # 标准输出只留给 JSON Lines 事件（`--watch > alerts.jsonl` 得到的文件可以直接逐行解析）
+    watch_stream = None
+    if args.watch and not args.watch_output:
+        watch_stream = sys.stdout
+        sys.stdout = sys.stderr
+
+    # 工作节点与合并时以分片计划中的扫描选项为准，保证各节点的结果一致、可以合并
+    shard_plan = None
+    if args.shard_worker or args.shard_merge:
+        try:
+            shard_plan = ShardQueue(args.shard_worker or args.shard_merge).load_plan()
+        except (ValueError, sqlite3.Error) as e:
+            parser.error(str(e))
+        vars(args).update(shard_plan['options'])
+        args.blacklist = None
+        args.tld_file = None
+
+    target_dir = os.path.abspath(args.directory or (shard_plan['root'] if shard_plan else '.'))
 
     # 输出文件名
     if args.output:
         output_file = args.output
     else:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        ext = REPORT_FORMATS[report_formats[0]]
         if args.no_timestamp:
-            output_file = 'url_extraction_results.txt'
+            output_file = f'url_extraction_results{ext}'
         else:
-            output_file = f'url_extraction_results_{timestamp}.txt'
+            output_file = f'url_extraction_results_{timestamp}{ext}'
     output_file = os.path.abspath(output_file)
+    output_paths = report_output_paths(output_file, report_formats)
 
     # 进度文件路径
     if args.progress_file:
         progress_file = os.path.abspath(args.progress_file)
     else:
-        progress_file = os.path.join(target_dir, '.url_extraction_progress.jsonl')
+        progress_file = os.path.join(target_dir, DEFAULT_PROGRESS_FILE)
 
     # 线程数限制
     if args.threads < 1:
@@ -808,6 +6220,13 @@ def main():
         print(f"警告：线程数 {args.threads} 过大，已限制为 32")
         args.threads = 32
 
+    # 流式扫描窗口
+    window_size = max(1, int(args.window_size * 1024 * 1024))
+    window_overlap = max(0, args.window_overlap * 1024)
+
+    # 排除模式
+    exclude_globs = [p.strip() for value in args.exclude for p in value.split(',') if p.strip()]
+
     # 递归开关
     recursive = args.recursive and not args.no_recursive
 
@@ -822,25 +6241,50 @@ def main():
     elif args.all:
         scan_all = True
 
-    # 黑名单合并
-    black_patterns = list(BLACKLINK_KEYWORDS)
+    # 黑名单合并（分片计划中保存的是合并后的完整黑名单）
+    black_patterns = list(shard_plan['black_patterns'] if shard_plan else BLACKLINK_KEYWORDS)
     if args.blacklist:
+        seen_patterns = {p.lower() for p in black_patterns}
         try:
             with open(args.blacklist, 'r', encoding='utf-8') as f:
                 for line in f:
                     line = line.strip()
                     if line and not line.startswith('#'):
                         lp = line.lower()
-                        if lp not in [p.lower() for p in black_patterns]:
+                        if lp not in seen_patterns:
+                            seen_patterns.add(lp)
                             black_patterns.append(lp)
         except Exception as e:
             print(f"读取黑名单文件失败: {e}")
 
+    # 黑名单匹配自动机：每次运行只构建一次，文件扫描与 HTTP 探测共用
+    black_matcher = BlackPatternMatcher(black_patterns)
+
+    # TLD 列表
+    if shard_plan:
+        set_tld_list(shard_plan['tlds'])
+    elif args.tld_file:
+        try:
+            set_tld_list(load_tld_file(args.tld_file))
+        except Exception as e:
+            print(f"读取TLD列表文件失败: {e}")
+
     # 配置信息
     print("=" * 60)
     print("URL提取工具 - 配置信息")
     print("=" * 60)
-    print(f"目标目录: {target_dir}")
+    if serve_address is None:
+        print(f"目标目录: {target_dir}")
+    else:
+        serve_desc = (UNIX_SOCKET_PREFIX + serve_address if isinstance(serve_address, str)
+                      else f"http://{serve_address[0]}:{serve_address[1]}")
+        print(f"扫描服务: {serve_desc}（同时执行 {max(1, args.serve_workers)} 个请求，排队上限 {max(0, args.serve_queue)}，"
+              f"请求正文上限 {args.serve_max_body:g} MB，同时处理的连接上限 {max(1, args.serve_connections)}；"
+              f"以下为请求的默认扫描选项）")
+        print(f"可扫描路径: {os.path.realpath(args.serve_root) if args.serve_root else '不限制'}")
+        if not isinstance(serve_address, str) and not is_loopback_host(serve_address[0]):
+            print("[!] 扫描服务监听在非回环地址上且没有认证，能连上该端口的主机都可以提交扫描请求"
+                  + ("" if args.serve_root else "，并可读取本进程能读的任意文件"))
     print(f"递归扫描: {'是' if recursive else '否'}")
 
     if scan_all and not extensions:
@@ -850,48 +6294,272 @@ def main():
     else:
         print("扫描模式: 扫描所有文件（当前未指定扩展名）")
 
-    print(f"线程数量: {args.threads}")
-    print(f"输出文件: {output_file}")
-    print(f"进度文件: {progress_file}")
+    if exclude_globs:
+        print(f"排除模式: {', '.join(exclude_globs)}")
+    print(f"扫描引擎: {'多进程' if args.engine == 'process' else '多线程'}")
+    print(f"{'进程' if args.engine == 'process' else '线程'}数量: {args.threads}")
+    print(f"流式扫描窗口: {window_size / 1024 / 1024:g} MB（重叠 {window_overlap // 1024} KB）")
+    if args.max_file_size:
+        print(f"文件大小上限: {args.max_file_size:g} MB")
+    print(f"跳过二进制文件: {'是' if args.skip_binary else '否'}")
+    if args.scan_archives:
+        print(f"压缩包扫描: 开启（嵌套最多 {max(1, args.archive_depth)} 层，单个压缩包解压上限 "
+              f"{f'{args.archive_max_size:g} MB' if args.archive_max_size else '不限'}）")
+    if args.hidden_detector == HIDDEN_DETECTOR_HTML:
+        print(f"暗链检测: HTML词法分析（单个文件上限 {args.hidden_timeout:g} 秒）")
+    else:
+        print("暗链检测: 正则匹配")
+    if args.byte_scan:
+        print(f"扫描方式: 字节级（黑名单关键字按 {'/'.join(BYTE_SCAN_ENCODINGS).upper()} 编码匹配）")
+    else:
+        print("扫描方式: 按UTF-8解码后扫描")
+    print(f"内容哈希比对: {'是' if args.hash_check else '否（仅比对 mtime/size）'}")
+    if args.watch:
+        watch_mode = (f"每 {args.watch_interval:g} 秒增量 stat 扫描" if args.watch_poll
+                      else f"inotify，合并 {args.watch_debounce:g} 秒内的连续变化")
+        print(f"实时监控: 开启（{watch_mode}，事件输出到 "
+              f"{os.path.abspath(args.watch_output) if args.watch_output else '标准输出'}）")
+    result_cache = None
+    if args.result_cache:
+        try:
+            result_cache = ResultCache(args.result_cache, int(args.result_cache_size * 1024 * 1024))
+            entries, cache_bytes = result_cache.stats()
+            print(f"结果缓存: {result_cache.path}（{entries} 条，{cache_bytes / 1024 / 1024:.1f} MB，"
+                  f"上限 {args.result_cache_size:g} MB）")
+        except (OSError, sqlite3.Error) as e:
+            print(f"结果缓存不可用，将不使用缓存: {e}")
+    if args.shard_plan:
+        print(f"分片计划: {os.path.abspath(args.shard_plan)}（{max(1, args.shards)} 个分片）")
+    elif args.shard_worker:
+        print(f"分片工作节点: {os.path.abspath(args.shard_worker)}（租约有效期 {args.shard_lease:g} 秒，扫描选项以计划为准）")
+    elif args.shard_merge:
+        print(f"合并分片结果: {os.path.abspath(args.shard_merge)}（扫描选项以计划为准）")
+    if not (args.shard_plan or args.shard_worker or serve_address):
+        for fmt, path in output_paths.items():
+            print(f"输出文件（{fmt}）: {path}")
+    if not (args.shard_plan or args.shard_merge or serve_address):
+        print(f"进度库: {args.shard_worker + '.shards/' if args.shard_worker else progress_file}"
+              f"（每批 {args.progress_batch} 条 / 最长 {args.progress_flush:g} 秒提交，落盘策略 {args.progress_sync}）")
     if args.base_domain:
         print(f"基础域名: {args.base_domain}")
     print(f"内置黑链关键词数量: {len(BLACKLINK_KEYWORDS)}")
     if args.blacklist:
         print(f"外部黑名单文件: {os.path.abspath(args.blacklist)}")
     print(f"总黑名单关键字/域名片段数量（合并后）: {len(black_patterns)}")
+    if args.tld_file:
+        print(f"TLD列表文件: {os.path.abspath(args.tld_file)}")
+    print(f"TLD数量: {len(_TLD_RANK)}")
     print(f"HTTP探测: {'开启' if args.probe else '关闭'}")
     if args.probe:
-        print(f"  探测线程数: {args.probe_workers}")
+        if args.probe_engine == 'async':
+            print(f"  探测引擎: 异步（全局并发 {args.probe_concurrency}，单主机 {args.probe_per_host}）")
+        else:
+            print(f"  探测线程数: {args.probe_workers}")
         print(f"  探测超时时间: {args.probe_timeout} 秒")
+        print(f"  协议尝试: {'http/https 同时请求（赛跑）' if args.probe_race else '先 http，失败后再 https'}")
+        print(f"  正文读取上限: {args.probe_max_body:g} KB（非文本类型不下载正文"
+              f"{'，全部关键词命中后提前停止' if args.probe_early_stop else ''}）")
+        if not args.dns_precheck:
+            print("  DNS预解析: 关闭")
+        else:
+            resolver_desc = (f"hosts文件 {args.dns_hosts}" if args.dns_hosts
+                             else f"DNS服务器 {args.dns_server}" if args.dns_server else "系统解析器")
+            print(f"  DNS预解析: {resolver_desc}（超时 {args.dns_timeout:g} 秒，并发 {args.dns_workers}）")
+    probe_cache = None
+    if args.probe and args.probe_cache:
+        try:
+            probe_cache = ProbeCache(args.probe_cache, int(args.probe_cache_size * 1024 * 1024), probe_cache_ttl)
+            entries, cache_bytes = probe_cache.stats()
+            ttl_desc = ', '.join(f"{kind}={ttl:g}s" for kind, ttl in probe_cache.ttl.items())
+            print(f"  探测缓存: {probe_cache.path}（{entries} 条，{cache_bytes / 1024 / 1024:.1f} MB，"
+                  f"上限 {args.probe_cache_size:g} MB，有效期 {ttl_desc}）")
+        except (OSError, sqlite3.Error) as e:
+            print(f"  探测缓存不可用，将不使用缓存: {e}")
+    profiler = None
+    metrics_server = None
+    if args.profile or args.metrics_file or metrics_address:
+        profiler = enable_profiler(max(1, args.profile_top))
+        print(f"性能剖析: 开启{'（结束时输出剖析报告）' if args.profile else ''}")
+        if args.metrics_file:
+            print(f"  指标文件: {os.path.abspath(args.metrics_file)}")
+        if metrics_address:
+            try:
+                metrics_server = serve_metrics(profiler, *metrics_address)
+                host, port = metrics_server.server_address[:2]
+                print(f"  指标端点: http://{host}:{port}/metrics")
+            except OSError as e:
+                print(f"  指标端点启动失败: {e}")
     print("=" * 60)
     print()
 
+    def export_metrics():
+        if profiler is None or not args.metrics_file:
+            return
+        try:
+            profiler.write_textfile(args.metrics_file)
+        except OSError as e:
+            print(f"[!] 写入指标文件失败: {e}")
+
     # 执行扫描
-    all_results = process_directory(
-        target_dir,
+    skip_stats = {}
+    if args.shard_plan:
+        counts = plan_shards(
+            args.shard_plan,
+            target_dir,
+            shard_count=max(1, args.shards),
+            plan_options={key: getattr(args, key) for key in SHARD_PLAN_OPTIONS},
+            black_patterns=black_patterns,
+            recursive=recursive,
+            extensions=extensions,
+            scan_all=scan_all,
+            exclude_paths=[progress_file],
+            exclude_globs=exclude_globs,
+            walk_workers=max(1, args.walk_workers),
+            archives=args.scan_archives,
+        )
+        print(f"[+] 已将 {sum(counts)} 个文件分为 {len(counts)} 个分片（最大分片 {max(counts)} 个文件），"
+              f"在各节点上运行 --shard-worker {args.shard_plan} 开始扫描")
+        return
+
+    scan_options = dict(
         base_domain=args.base_domain,
         recursive=recursive,
         extensions=extensions,
         scan_all=scan_all,
         max_workers=args.threads,
-        black_patterns=black_patterns,
-        progress_file=progress_file
+        black_patterns=black_matcher,
+        engine=args.engine,
+        window_size=window_size,
+        window_overlap=window_overlap,
+        max_file_size=int(args.max_file_size * 1024 * 1024),
+        skip_binary=args.skip_binary,
+        hash_check=args.hash_check,
+        result_cache=result_cache,
+        exclude_globs=exclude_globs,
+        walk_workers=max(1, args.walk_workers),
+        hidden_detector=args.hidden_detector,
+        hidden_timeout=args.hidden_timeout,
+        archives=args.scan_archives,
+        archive_depth=max(1, args.archive_depth),
+        archive_max_size=int(args.archive_max_size * 1024 * 1024),
+        byte_scan=args.byte_scan,
+        progress_options={
+            'batch_size': args.progress_batch,
+            'flush_interval': args.progress_flush,
+            'sync': args.progress_sync,
+        }
     )
+    if serve_address is not None:
+        service = ScanService(workers=max(1, args.serve_workers), queue_size=max(0, args.serve_queue),
+                              max_body=int(args.serve_max_body * 1024 * 1024), root=args.serve_root, **scan_options)
+        try:
+            server = make_scan_server(service, serve_address, max_connections=args.serve_connections)
+        except OSError as e:
+            print(f"[!] 扫描服务启动失败: {e}")
+            server = None
+        try:
+            if server is not None:
+                print(f"[+] 扫描服务已启动: {describe_server_address(server)}（Ctrl+C 停止）")
+                server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n[+] 收到中断信号，停止扫描服务")
+        finally:
+            if server is not None:
+                server.server_close()
+                if isinstance(serve_address, str):
+                    with contextlib.suppress(OSError):
+                        os.remove(serve_address)
+            service.close()
+            if result_cache is not None:
+                result_cache.close()
+            if probe_cache is not None:
+                probe_cache.close()
+            export_metrics()
+            if metrics_server is not None:
+                metrics_server.shutdown()
+                metrics_server.server_close()
+        return
 
-    probe_results = None
-    if all_results and args.probe:
-        probe_results = probe_suspicious_links(
-            all_results,
-            black_patterns,
-            max_workers=args.probe_workers,
-            timeout=args.probe_timeout
-        )
+    with profile_phase('scan'):
+        if args.shard_worker:
+            try:
+                finished = run_shard_worker(args.shard_worker, target_dir, lease_seconds=max(1.0, args.shard_lease),
+                                            **scan_options)
+                print(f"\n[+] 全部分片均已完成，本节点完成 {finished} 个分片；"
+                      f"运行 --shard-merge {args.shard_worker} 合并结果并生成报告")
+            except (ValueError, sqlite3.Error) as e:
+                print(f"[!] 分片扫描失败: {e}")
+            all_results = None
+        elif args.shard_merge:
+            all_results = merge_shards(args.shard_merge, target_dir, skip_stats)
+        else:
+            all_results = process_directory(target_dir, progress_file=progress_file, skip_stats=skip_stats,
+                                            **scan_options)
+    if result_cache is not None:
+        result_cache.close()
+    export_metrics()
 
-    if all_results:
-        print_results(all_results, probe_results)
-        save_results_to_file(all_results, output_file, probe_results)
-    else:
-        print("未找到任何文件进行处理")
+    try:
+        probe_results = None
+        if all_results and args.probe:
+            with profile_phase('probe'):
+                probe_results = probe_suspicious_links(
+                    all_results,
+                    black_matcher,
+                    max_workers=args.probe_workers,
+                    timeout=args.probe_timeout,
+                    engine=args.probe_engine,
+                    concurrency=max(1, args.probe_concurrency),
+                    per_host=max(1, args.probe_per_host),
+                    resolver=make_resolver(args.dns_server, args.dns_hosts, args.dns_timeout),
+                    dns_workers=max(1, args.dns_workers),
+                    dns_precheck=args.dns_precheck,
+                    probe_cache=probe_cache,
+                    max_body=max(1, int(args.probe_max_body * 1024)),
+                    early_stop=args.probe_early_stop,
+                    race=args.probe_race
+                )
+            export_metrics()
+
+        if all_results:
+            with profile_phase('report'):
+                save_reports(all_results, output_paths, probe_results, skip_stats)
+        elif all_results is not None:
+            print("未找到任何文件进行处理")
+
+        if args.watch and all_results is not None:
+            watch_output = open(args.watch_output, 'a', encoding='utf-8') if args.watch_output else watch_stream
+            try:
+                watch_log("初次扫描完成，开始监控目录变化（Ctrl+C 停止）")
+                DirectoryWatcher(
+                    target_dir, all_results, watch_output,
+                    debounce=max(0.0, args.watch_debounce),
+                    interval=max(1.0, args.watch_interval),
+                    use_inotify=not args.watch_poll,
+                    # 事件输出文件与报告放在被监控的目录里时不能当作改动的源文件扫描（否则会反复报告自己写出的链接）
+                    exclude_paths=[progress_file, *output_paths.values(), *([args.watch_output] if args.watch_output else [])],
+                    **{key: value for key, value in scan_options.items() if key != 'progress_options'}
+                ).run()
+            finally:
+                if watch_output is not watch_stream:
+                    watch_output.close()
+
+        if profiler is not None:
+            export_metrics()
+            if args.profile:
+                print()
+                for line in profiler.iter_summary_lines():
+                    print(line)
+    finally:
+        if all_results is not None:
+            all_results.close()
+        if probe_cache is not None:
+            probe_cache.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        if watch_stream is not None:
+            sys.stdout = watch_stream
 
 
 if __name__ == "__main__":